@@ -0,0 +1,123 @@
+"""api_cache.py: an on-disk cache of hpasubc api responses, used by api_client.py
+
+The data for a given HPA version never changes, so responses are cached indefinitely under a key made from the hpa_version, the api endpoint and a hash of the request payload; a new HPA version simply gets new keys.  The cache is a single SQLite file with a size limit: when it grows past max_bytes, the least recently used responses are evicted.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+
+default_cache_file = 'hpasubc_api_cache.db'
+default_max_bytes = 512*1024*1024
+
+def cache_key(hpa_version,endpoint,payload):
+	'''a stable key for a request; payload is anything json serializable'''
+	s = json.dumps([hpa_version,endpoint,payload],sort_keys=True)
+	return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+class ResponseCache(object):
+	'''a size limited, least recently used cache of api responses; safe to share between threads'''
+
+	def __init__(self,path=default_cache_file,max_bytes=default_max_bytes):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.lock = threading.Lock()
+		self.db = sqlite3.connect(path,check_same_thread=False)
+		self.db.execute('PRAGMA journal_mode=WAL')
+		self.db.execute('PRAGMA synchronous=NORMAL')
+		self.db.execute('''CREATE TABLE IF NOT EXISTS responses (
+			key TEXT PRIMARY KEY,
+			hpa_version INTEGER,
+			endpoint TEXT,
+			value BLOB,
+			size INTEGER,
+			last_used REAL)''')
+		self.db.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+		self.db.commit()
+
+	def get(self,hpa_version,endpoint,payload):
+		'''returns the cached response, or None if it is not cached'''
+		return self.get_many(hpa_version,endpoint,[payload])[0]
+
+	def get_many(self,hpa_version,endpoint,payloads):
+		'''returns a list of cached responses (or None) in the order of payloads'''
+		keys = [cache_key(hpa_version,endpoint,x) for x in payloads]
+		found = {}
+		with self.lock:
+			# sqlite limits the number of parameters in a query
+			for i in range(0,len(keys),500):
+				chunk = keys[i:i+500]
+				sql = 'SELECT key,value FROM responses WHERE key IN (%s)' % ','.join('?'*len(chunk))
+				for key,value in self.db.execute(sql,chunk):
+					found[key] = value
+			if found:
+				now = time.time()
+				self.db.executemany('UPDATE responses SET last_used=? WHERE key=?',[(now,x) for x in found])
+				self.db.commit()
+		return [decode(found[x]) if x in found else None for x in keys]
+
+	def put(self,hpa_version,endpoint,payload,response):
+		self.put_many(hpa_version,endpoint,[(payload,response)])
+
+	def put_many(self,hpa_version,endpoint,items):
+		'''caches a list of (payload,response) pairs'''
+		now = time.time()
+		rows = []
+		for payload,response in items:
+			value = encode(response)
+			rows.append((cache_key(hpa_version,endpoint,payload),hpa_version,endpoint,value,len(value),now))
+		with self.lock:
+			self.db.executemany('''INSERT OR REPLACE INTO responses (key,hpa_version,endpoint,value,size,last_used)
+				VALUES (?,?,?,?,?,?)''',rows)
+			self._evict()
+			self.db.commit()
+
+	def invalidate(self,hpa_version=None):
+		'''removes the responses for one hpa_version, or everything'''
+		with self.lock:
+			if hpa_version is None:
+				self.db.execute('DELETE FROM responses')
+			else:
+				self.db.execute('DELETE FROM responses WHERE hpa_version=?',(hpa_version,))
+			self.db.commit()
+
+	def _evict(self):
+		total = self.db.execute('SELECT COALESCE(SUM(size),0) FROM responses').fetchone()[0]
+		if total <= self.max_bytes:
+			return
+		# drop the least recently used responses until we are back under the limit
+		excess = total - self.max_bytes
+		keys = []
+		for key,size in self.db.execute('SELECT key,size FROM responses ORDER BY last_used'):
+			keys.append((key,))
+			excess -= size
+			if excess <= 0:
+				break
+		self.db.executemany('DELETE FROM responses WHERE key=?',keys)
+
+	def close(self):
+		with self.lock:
+			self.db.close()
+
+def encode(response):
+	return sqlite3.Binary(zlib.compress(json.dumps(response).encode('utf-8')))
+
+def decode(value):
+	return json.loads(zlib.decompress(bytes(value)).decode('utf-8'))
@@ -2,9 +2,20 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
 import requests, json
+import threading
+from collections import deque
+from multiprocessing.dummy import Pool as ThreadPool
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from api_cache import ResponseCache
 
 # CHANGE LOG:
 # 08-26-2020 TC rewrote to target multiple versions of HPA
+# 10-18-2026 TC added ApiClient, a shared session with connection pooling, timeouts and retries
+# 10-18-2026 TC added iter_images/iter_image_batches to query large gene lists in concurrent batches
+# 10-18-2026 TC genes, tissues and images are cached on disk by api_cache (per gene for images)
+# 10-18-2026 TC retry backoff has jitter where urllib3 supports it
+# 10-18-2026 TC added iter_query_batches, to run the image queries of several tissues/versions in one pool
 
 ip_address = '138.197.13.129'
 #ip_address = '127.0.0.1:5000' # localhost, for testing
@@ -14,40 +25,194 @@ def main():
 	ensg_ids = ['ENSG00000000003',]
 	print(get_images(18,ensg_ids,tissues))
 
+class ApiClient(object):
+	'''a requests Session with a pool of keep-alive connections, shared by the api calls and
+	the image downloads.
+
+	pool_size is the number of connections kept open per host (use at least the number of
+	download workers), timeout is (connect, read) in seconds, and failed requests are retried
+	up to retries times with an exponential backoff of backoff_factor * 2^attempt seconds.'''
+
+	def __init__(self,pool_size=10,timeout=(10,120),retries=3,backoff_factor=0.5):
+		self.timeout = timeout
+		retry = make_retry(retries,backoff_factor)
+		adapter = HTTPAdapter(pool_connections=pool_size,pool_maxsize=pool_size,max_retries=retry)
+		self.session = requests.Session()
+		self.session.mount('http://',adapter)
+		self.session.mount('https://',adapter)
+
+	def get(self,url,**kwargs):
+		kwargs.setdefault('timeout',self.timeout)
+		return self.session.get(url,**kwargs)
+
+	def post(self,url,**kwargs):
+		kwargs.setdefault('timeout',self.timeout)
+		return self.session.post(url,**kwargs)
+
+	def close(self):
+		self.session.close()
+
+def make_retry(retries,backoff_factor):
+	# the api POSTs are queries, so it is safe to retry them as well
+	kwargs = dict(total=retries,backoff_factor=backoff_factor,status_forcelist=[429,500,502,503,504],raise_on_status=False)
+	try:
+		# jitter spreads out the retries of many workers that failed together
+		return Retry(allowed_methods=False,backoff_jitter=backoff_factor,**kwargs)
+	except TypeError: # urllib3 < 2.0
+		pass
+	try:
+		return Retry(allowed_methods=False,**kwargs)
+	except TypeError: # urllib3 < 1.26
+		return Retry(method_whitelist=False,**kwargs)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+	'''returns the shared ApiClient, creating one with the default settings if needed'''
+	global _client
+	with _client_lock:
+		if _client is None:
+			_client = ApiClient()
+		return _client
+
+def configure(**kwargs):
+	'''replaces the shared ApiClient with one using the given settings (see ApiClient)'''
+	global _client
+	with _client_lock:
+		if _client is not None:
+			_client.close()
+		_client = ApiClient(**kwargs)
+		return _client
+
+_cache = None
+_cache_settings = {}
+
+def get_cache():
+	'''returns the shared ResponseCache, or None if caching has been turned off'''
+	global _cache
+	with _client_lock:
+		if _cache is None and _cache_settings is not None:
+			_cache = ResponseCache(**_cache_settings)
+		return _cache
+
+def configure_cache(path=None,max_bytes=None,enabled=True):
+	'''sets the file and size limit of the response cache (see ResponseCache), or turns it off'''
+	global _cache, _cache_settings
+	with _client_lock:
+		if _cache is not None:
+			_cache.close()
+		_cache = None
+		_cache_settings = None
+		if enabled:
+			_cache_settings = dict((k,v) for k,v in (('path',path),('max_bytes',max_bytes)) if v is not None)
+
 def get_genes(hpa_version):
+	cache = get_cache()
+	genes = cache.get(hpa_version,'genes',None) if cache else None
+	if genes is not None:
+		return genes
 	url = 'http://%s/hpasubc/api_v1/hpa_v%s/genes' % (ip_address,hpa_version)
-	response = requests.get(url)
+	response = get_client().get(url)
 	genes = []
 	if(response.ok):
 		json_data = json.loads(response.content)
 		genes = [x['ensg_id'] for x in json_data['data']]
+		if cache:
+			cache.put(hpa_version,'genes',None,genes)
 	else:
 		print('Error: %s' % response.status_code)
 	return genes
 
 def get_tissues(hpa_version):
+	cache = get_cache()
+	tissues = cache.get(hpa_version,'tissues',None) if cache else None
+	if tissues is not None:
+		return tissues
 	url = 'http://%s/hpasubc/api_v1/hpa_v%s/tissues' % (ip_address,hpa_version)
-	response = requests.get(url)
+	response = get_client().get(url)
 	tissues = []
 	if(response.ok):
 		json_data = json.loads(response.content)
 		tissues = [x['name'] for x in json_data['data']]
+		if cache:
+			cache.put(hpa_version,'tissues',None,tissues)
 	else:
 		print('Error: %s' % response.status_code)
 	return tissues
 
 def get_images(hpa_version,ensg_ids,tissues):
-	url = 'http://%s/hpasubc/api_v1/hpa_v%s/images' % (ip_address,hpa_version)
-	payload = {'ensg_ids':ensg_ids,'tissues':tissues}
-	response = requests.post(url,json=payload)
-	images = []
-	if(response.ok):
-		json_data = json.loads(response.content)
-		images = [x for x in json_data['data']]
+	# images are cached per gene, so only genes that have not been seen before are queried
+	cache = get_cache()
+	tissues = sorted(tissues)
+	if cache:
+		cached = cache.get_many(hpa_version,'images',[[x,tissues] for x in ensg_ids])
 	else:
-		print('Error: %s' % response.status_code)
-		print(response.content)
+		cached = [None]*len(ensg_ids)
+	by_gene = dict((x,c) for x,c in zip(ensg_ids,cached) if c is not None)
+	missing = [x for x,c in zip(ensg_ids,cached) if c is None]
+
+	if missing:
+		url = 'http://%s/hpasubc/api_v1/hpa_v%s/images' % (ip_address,hpa_version)
+		payload = {'ensg_ids':missing,'tissues':tissues}
+		response = get_client().post(url,json=payload)
+		if(response.ok):
+			json_data = json.loads(response.content)
+			fetched = dict((x,[]) for x in missing) # a gene may have no images
+			for x in json_data['data']:
+				fetched.setdefault(x['ensg_id'],[]).append(x)
+			if cache:
+				cache.put_many(hpa_version,'images',[([x,tissues],fetched[x]) for x in missing])
+			by_gene.update(fetched)
+		else:
+			print('Error: %s' % response.status_code)
+			print(response.content)
+
+	# keep the images in the order of ensg_ids
+	images = []
+	for ensg_id in ensg_ids:
+		images.extend(by_gene.get(ensg_id,[]))
 	return images
 
+def iter_image_batches(hpa_version,ensg_ids,tissues,batch_size=500,max_workers=4):
+	'''yields the images for ensg_ids as lists, one per query of batch_size genes.
+
+	Up to max_workers queries run at once, and no more than max_workers batches are held in
+	memory; the batches are yielded in the order of ensg_ids.'''
+	for index,batch in iter_query_batches([(hpa_version,ensg_ids,tissues)],batch_size,max_workers):
+		yield batch
+
+def iter_query_batches(queries,batch_size=500,max_workers=4):
+	'''like iter_image_batches, for a list of (hpa_version, ensg_ids, tissues) queries at once;
+	yields (index of the query, images) for each batch of batch_size genes.
+
+	The queries share the max_workers queries that run at once. Their batches are taken in
+	turn (the first batch of every query, then the second, ...), so every query has images
+	early on, and are yielded in that order.'''
+	order = []
+	for i in range(0,max([len(x[1]) for x in queries] or [0]),batch_size):
+		for index,(hpa_version,ensg_ids,tissues) in enumerate(queries):
+			if i < len(ensg_ids):
+				order.append((index,(hpa_version,ensg_ids[i:i+batch_size],tissues)))
+	pool = ThreadPool(max_workers)
+	pending = deque()
+	try:
+		for index,args in order:
+			pending.append((index,pool.apply_async(get_images,args)))
+			if len(pending) >= max_workers:
+				index,result = pending.popleft()
+				yield index,result.get()
+		while pending:
+			index,result = pending.popleft()
+			yield index,result.get()
+	finally:
+		pool.close()
+
+def iter_images(hpa_version,ensg_ids,tissues,batch_size=500,max_workers=4):
+	'''like get_images, but yields the images one at a time as the batched queries complete'''
+	for batch in iter_image_batches(hpa_version,ensg_ids,tissues,batch_size,max_workers):
+		for image in batch:
+			yield image
+
 if __name__ == '__main__':
-	main()
\ No newline at end of file
+	main()
@@ -0,0 +1,119 @@
+"""async_downloader.py: an asyncio download engine for download_images_from_gene_list.py
+
+Instead of one blocking urlopen() per thread, a fixed number of coroutines pull images from a shared iterator and fetch them over a small pool of keep-alive connections.  The number of requests in flight and the number of connections per host are both bounded, so thousands of image fetches can be streamed without thousands of sockets or threads.
+
+Writing the image to disk is left to the caller: each response body is streamed chunk by chunk into a writer object supplied by the caller, so memory per download is bounded by the chunk size. The writer is opened, written to and checked in a small pool of threads, as is the callback that each completed download is handed to, so that the disk (and whatever else the writer does, e.g. adding the Exif data) never stalls the event loop.
+
+This module requires python 3 and aiohttp; it is only imported when the asyncio engine is requested.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created asyncio download engine
+# 10-18-2026 TC stream response bodies to a writer instead of reading them into memory
+# 10-18-2026 TC pull images from the iterator in a thread, so it may block (e.g. waiting on the api)
+# 10-18-2026 TC retries back off exponentially with jitter instead of waiting 1 second
+# 10-18-2026 TC a response shorter (or longer) than its Content-Length is retried
+# 10-18-2026 TC an image that fails the writer's check() is retried
+# 10-18-2026 TC the writer is opened, written and checked in the disk threads, not on the event loop
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from download_throttle import backoffDelay
+
+logger = logging.getLogger(__name__)
+
+class AsyncDownloader(object):
+	'''downloads a stream of images with bounded concurrency.
+
+	maxInFlight is the maximum number of requests outstanding at one time, perHost is the
+	maximum number of open (keep-alive) connections to any one host.'''
+
+	def __init__(self,maxInFlight=64,perHost=8,timeout=120,maxAttempts=10,diskWorkers=4,chunkSize=64*1024):
+		self.maxInFlight = maxInFlight
+		self.perHost = perHost
+		self.timeout = timeout
+		self.maxAttempts = maxAttempts
+		self.diskWorkers = diskWorkers
+		self.chunkSize = chunkSize
+
+	def run(self,images,openWriter,onFetched,onFailed):
+		'''fetch every image in images (any iterable of image dicts with an image_url).
+
+		openWriter(image) returns an object with write(chunk), check() and abort() methods that
+		the image is streamed into; check() raises if the image received is not whole. onFetched(image,writer) is called when the download is
+		complete, onFailed(image,exception) once all attempts for an image have failed.'''
+		loop = asyncio.new_event_loop()
+		executor = ThreadPoolExecutor(self.diskWorkers)
+		# a single thread serializes next() on the iterator, which may block
+		feeder = ThreadPoolExecutor(1)
+		try:
+			loop.run_until_complete(self._run(iter(images),openWriter,onFetched,onFailed,executor,feeder))
+		finally:
+			feeder.shutdown(wait=True)
+			executor.shutdown(wait=True)
+			loop.close()
+
+	async def _run(self,images,openWriter,onFetched,onFailed,executor,feeder):
+		connector = aiohttp.TCPConnector(limit=self.maxInFlight,limit_per_host=self.perHost)
+		timeout = aiohttp.ClientTimeout(total=self.timeout)
+		async with aiohttp.ClientSession(connector=connector,timeout=timeout) as session:
+			workers = [self._worker(session,images,openWriter,onFetched,onFailed,executor,feeder)
+				for x in range(self.maxInFlight)]
+			await asyncio.gather(*workers)
+
+	async def _worker(self,session,images,openWriter,onFetched,onFailed,executor,feeder):
+		loop = asyncio.get_running_loop()
+		# the iterator is shared by all workers
+		while True:
+			image = await loop.run_in_executor(feeder,next,images,None)
+			if image is None:
+				break
+			try:
+				writer = await self._fetch(session,image,openWriter,executor)
+				await loop.run_in_executor(executor,onFetched,image,writer)
+			except Exception as e: # catch any errors & pass them on
+				await loop.run_in_executor(executor,onFailed,image,e)
+
+	async def _fetch(self,session,image,openWriter,executor):
+		loop = asyncio.get_running_loop()
+		imageUrl = image['image_url']
+		attempts = 0
+		while True:
+			writer = None
+			try:
+				attempts += 1
+				async with session.get(imageUrl) as response:
+					response.raise_for_status()
+					writer = await loop.run_in_executor(executor,openWriter,image)
+					received = 0
+					async for chunk in response.content.iter_chunked(self.chunkSize):
+						await loop.run_in_executor(executor,writer.write,chunk)
+						received += len(chunk)
+					expected = response.content_length
+					if expected is not None and 'Content-Encoding' not in response.headers and received != expected:
+						raise IOError('received %s of %s bytes' % (received,expected))
+					# e.g. a JPEG without its end of image marker; retried like any other failed attempt
+					await loop.run_in_executor(executor,writer.check)
+				return writer
+			except Exception as e:
+				if writer is not None:
+					await loop.run_in_executor(executor,writer.abort)
+				if attempts >= self.maxAttempts:
+					raise
+				logger.info('Attempt %s failed for %s: %s',attempts,imageUrl,str(e))
+				await asyncio.sleep(backoffDelay(attempts))
@@ -0,0 +1,1189 @@
+#!/usr/bin/env python
+
+"""benchmarks.py: benchmarks for the HPASubC scripts, run against local data so that no HPA (or api) server is needed.
+
+Each benchmark is a sub-command:
+
+	download: downloads synthetic images from a local stand-in HTTP server with the thread pool engine and the asyncio engine and reports images/sec for each
+	exif: compares writing an image and then adding the Exif user comment (write, piexif.load, piexif.insert) with splicing the user comment in as the image is written
+	manifest: measures the startup time of resuming a download from a large manifest
+	viewer: steps through a folder of large images (headless) and reports the latency of each step with and without background prefetching
+	metadata: compares reading the Exif metadata of a folder serially with building and then reusing the metadata index
+	exifread: compares piexif.load with the header-only reader for the UserComment of each image in a folder (synthetic, or --dir for a folder of real downloaded images)
+	results: compares opening the output csv for every result (the old behavior) with a ResultWriter
+	scores: measures the startup cost of resuming a scoring session from output files of increasing size
+	pyramid: compares zooming and panning a large image by scaling the whole decoded image with drawing the view from a tiled image pyramid
+	previews: measures making previews with a PreviewMaker, and compares the time and memory to decode a full size image with its preview
+	grid: measures how long a page of the image_viewer.py contact sheet takes to load with one thumbnail thread and with several, and how long flipping to a page that has been prefetched takes
+	move: moves a folder of small files into another folder one file at a time with shutil.move (the old behavior of move_images_by_selected.py) and with a BulkMover, on the same filesystem and (if --other_dir is on another filesystem) across filesystems
+	sort: sorts a folder of small files into TRUE, FALSE, OTHER and NONE folders with move_images_by_selected.py, with one run per value and with one run with the value ALL
+	store: downloads the same images for a second tissue run and for another HPA version, with and without an image store, and reports the downloads and disk space used
+	tissues: downloads several tissues from the local stand-in server (with a stand-in for the api that takes api_latency per query), with a run of download_images_from_gene_list.py for each tissue and with one run for all of them
+	schedule: downloads the images of a number of genes, the first of which has many more images than the others, from the local stand-in server in each DownloadScheduler order, and reports how soon every gene has an image
+	pipeline: passes download results to the output file through a multiprocessing.Manager queue and a listener in a pool slot (the old behavior) and through a ResultListener, and reports the startup time and the time per result
+	adaptive: downloads from a stand-in server that serves a limited number of requests at once (rate limiting the rest) and fails some at random, with several fixed numbers of workers and with --adaptive, and reports images/sec and the errors caused
+	keystroke: measures the latency from a score keystroke to the next image being shown in image_scorer.py (headless), with the old animation and output file handling and with the current ones
+
+usage: benchmarks.py download [-n images] [-w workers] [--max_in_flight n] [--per_host n] [--latency seconds] [--size pixels]
+       benchmarks.py exif [-n images] [--size pixels]
+       benchmarks.py manifest [-n images]
+       benchmarks.py viewer [-n images] [--size pixels] [--dwell seconds]
+       benchmarks.py metadata [-n images] [--size pixels]
+       benchmarks.py exifread [-n images] [--size pixels] [--dir input_dir]
+       benchmarks.py results [-n results]
+       benchmarks.py scores [-n results]
+       benchmarks.py keystroke [-n images] [--size pixels] [--dwell seconds]
+       benchmarks.py pyramid [--size pixels] [--window pixels]
+       benchmarks.py previews [-n images] [--size pixels]
+       benchmarks.py grid [-n images] [--size pixels] [-w workers]
+       benchmarks.py move [-n files] [--kb size] [-w workers] [--other_dir dir]
+       benchmarks.py sort [-n files]
+       benchmarks.py store [-n images] [--size pixels]
+       benchmarks.py adaptive [-n images] [--capacity n] [--latency seconds] [--error_rate fraction] [--size pixels]
+       benchmarks.py pipeline [-n results] [-w workers]
+       benchmarks.py schedule [-g genes] [-n images] [--big images] [-w workers] [--latency seconds] [--size pixels]
+       benchmarks.py tissues [-t tissues] [-n images] [-w workers] [--latency seconds] [--api_latency seconds] [--size pixels]
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created, download engine benchmark with local stand-in server
+# 10-18-2026 TC added exif benchmark
+# 10-18-2026 TC added manifest benchmark
+# 10-18-2026 TC added viewer benchmark
+# 10-18-2026 TC added metadata benchmark
+# 10-18-2026 TC added exifread benchmark
+# 10-18-2026 TC added results benchmark
+# 10-18-2026 TC added scores benchmark
+# 10-18-2026 TC added keystroke benchmark
+# 10-18-2026 TC added pyramid benchmark
+# 10-18-2026 TC added previews benchmark
+# 10-18-2026 TC added grid benchmark
+# 10-18-2026 TC added move benchmark
+# 10-18-2026 TC added sort benchmark
+# 10-18-2026 TC added store benchmark
+# 10-18-2026 TC added adaptive benchmark
+# 10-18-2026 TC added pipeline benchmark; the downloader's ErrorCount replaces Counter
+# 10-18-2026 TC added tissues benchmark
+# 10-18-2026 TC added schedule benchmark
+
+__author__ = "Toby Cornish"
+__copyright__ = "Copyright 2026"
+__credits__ = ["Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import os
+import sys
+import csv
+import time
+import queue
+import random
+import shutil
+import argparse
+import multiprocessing as mp
+import tempfile
+import threading
+from itertools import repeat
+from multiprocessing.dummy import Pool as ThreadPool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import download_images_from_gene_list as downloader
+from download_manifest import DownloadManifest
+
+class StandInServer(object):
+	'''a local HTTP/1.1 (keep-alive) server that serves the same JPEG for every image path.
+
+	latency is added to every response to mimic the round trip to the image host. With a
+	capacity, only that many requests are served at once and the rest wait their turn; when
+	as many are waiting, further requests get a 429 (rate limited). errorRate is the fraction
+	of requests that get a 503.'''
+
+	def __init__(self,image_data,latency=0.0,capacity=None,errorRate=0.0):
+		self.image_data = image_data
+		self.latency = latency
+		self.capacity = capacity
+		self.errorRate = errorRate
+		self.requests = 0
+		self.errors = 0
+		self.lock = threading.Lock()
+		self.active = 0
+		self.slots = threading.Semaphore(capacity or 1)
+		server = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = 'HTTP/1.1'
+
+			def do_GET(self):
+				server.requests += 1
+				if server.errorRate and random.random() < server.errorRate:
+					return self.fail(503)
+				if not server.capacity:
+					return self.serve()
+				with server.lock:
+					full = server.active >= 2 * server.capacity
+					if not full:
+						server.active += 1
+				if full:
+					return self.fail(429)
+				try:
+					with server.slots:
+						self.serve()
+				finally:
+					with server.lock:
+						server.active -= 1
+
+			def serve(self):
+				if server.latency:
+					time.sleep(server.latency)
+				self.send_response(200)
+				self.send_header('Content-Type','image/jpeg')
+				self.send_header('Content-Length',str(len(server.image_data)))
+				self.end_headers()
+				self.wfile.write(server.image_data)
+
+			def fail(self,status):
+				with server.lock:
+					server.errors += 1
+				self.send_response(status)
+				self.send_header('Content-Length','0')
+				self.end_headers()
+
+			def log_message(self,format,*args):
+				pass # keep the benchmark output readable
+
+		self.httpd = ThreadingHTTPServer(('127.0.0.1',0),Handler)
+		self.httpd.daemon_threads = True
+		self.thread = threading.Thread(target=self.httpd.serve_forever)
+		self.thread.daemon = True
+
+	def __enter__(self):
+		self.thread.start()
+		return self
+
+	def __exit__(self,*exc):
+		self.httpd.shutdown()
+		self.httpd.server_close()
+
+	def url(self,path):
+		return 'http://127.0.0.1:%s/%s' % (self.httpd.server_address[1],path)
+
+def makeJpeg(size):
+	'''returns the bytes of a noisy size x size JPEG (noise keeps the file size realistic)'''
+	os.environ.setdefault('SDL_VIDEODRIVER','dummy')
+	import pygame
+	surf = pygame.Surface((size,size))
+	for y in range(0,size,8):
+		for x in range(0,size,8):
+			c = bytearray(os.urandom(3))
+			surf.fill((c[0],c[1],c[2]),(x,y,8,8))
+	path = os.path.join(tempfile.mkdtemp(),'synthetic.jpg')
+	pygame.image.save(surf,path)
+	with open(path,'rb') as f:
+		data = f.read()
+	shutil.rmtree(os.path.dirname(path))
+	return data
+
+def makeImages(n,server=None):
+	'''api-style image records pointing at the stand-in server (or at HPA if there is none)'''
+	images = []
+	for i in range(n):
+		image_file = '%s_%s_A_1_1.jpg' % (10000+i,i)
+		images.append({
+			'version' : 19,
+			'ensg_id' : 'ENSG%011d' % i,
+			'tissue_or_cancer' : 'heart muscle',
+			'antibody_id' : 'HPA%06d' % i,
+			'image_file' : image_file,
+			'image_url' : server.url('images/%s' % image_file) if server else 'http://www.proteinatlas.org/images/%s' % image_file,
+			})
+	return images
+
+def drain(outQ):
+	rows = 0
+	while not outQ.empty():
+		outQ.get()
+		rows += 1
+	return rows
+
+def runThreads(images,outdir,workers):
+	outQ = queue.Queue()
+	errorCount = downloader.ErrorCount()
+	pool = ThreadPool(workers)
+	pool.map(downloader.worker,list(zip(images,repeat(outdir),repeat(outQ),repeat(errorCount),repeat(None),repeat(None),repeat(None),repeat(None))))
+	pool.close()
+	return drain(outQ),errorCount.value
+
+def runAsync(images,outdir,maxInFlight,perHost):
+	outQ = queue.Queue()
+	errorCount = downloader.ErrorCount()
+	job = downloader.DownloadJob(None,None,None,outdir)
+	job.outQ = outQ
+	downloader.downloadImagesAsync([(job,x) for x in images],errorCount,maxInFlight,perHost)
+	return drain(outQ),errorCount.value
+
+def timed(label,n,func,*args):
+	outdir = tempfile.mkdtemp()
+	try:
+		start = time.time()
+		rows,errors = func(*(args[:1]+(outdir,)+args[1:]))
+		elapsed = time.time() - start
+	finally:
+		shutil.rmtree(outdir)
+	print('%-28s %6s images in %7.2f s  %8.1f images/sec  (%s errors)' % (label,rows,elapsed,n/elapsed,errors))
+
+def benchDownload(args):
+	# the downloader logs every image; that is not what we are measuring
+	downloader.logger.setLevel('WARNING')
+	image_data = makeJpeg(args.size)
+	print('Serving a %s byte JPEG with %.0f ms latency per request' % (len(image_data),args.latency*1000))
+	with StandInServer(image_data,args.latency) as server:
+		images = makeImages(args.images,server)
+		timed('threads (%s workers)' % args.workers,args.images,runThreads,images,args.workers)
+		timed('asyncio (%s in flight)' % args.max_in_flight,args.images,runAsync,images,args.max_in_flight,args.per_host)
+
+def diskIO():
+	'''bytes read and written by this process so far (linux only, otherwise None)'''
+	try:
+		with open('/proc/self/io','r') as f:
+			counters = dict(line.split(': ') for line in f.read().splitlines())
+		return int(counters['rchar']) + int(counters['wchar'])
+	except (IOError, OSError):
+		return None
+
+def writeThenInsert(image_data,imagePath,userComment):
+	with open(imagePath,'wb') as f:
+		f.write(image_data)
+	downloader.writeExifUserComment(imagePath,userComment)
+
+def writeSpliced(image_data,imagePath,userComment):
+	writer = downloader.ImageWriter(imagePath,userComment)
+	for i in range(0,len(image_data),downloader.chunkSize):
+		writer.write(image_data[i:i+downloader.chunkSize])
+	writer.commit()
+
+def benchExif(args):
+	image_data = makeJpeg(args.size)
+	userComment = downloader.buildResult(makeImages(1)[0])
+	print('Writing %s images of %s bytes' % (args.images,len(image_data)))
+	outdir = tempfile.mkdtemp()
+	try:
+		outputs = []
+		for label,func in (('write, load, insert',writeThenInsert),('spliced while writing',writeSpliced)):
+			before = diskIO()
+			start = time.time()
+			for i in range(args.images):
+				func(image_data,os.path.join(outdir,'%s.jpg' % i),userComment)
+			elapsed = time.time() - start
+			volume = ''
+			if before is not None:
+				volume = '%8.1f KB I/O per image' % ((diskIO() - before)/args.images/1024)
+			print('%-24s %7.2f ms per image  %s' % (label,elapsed*1000/args.images,volume))
+			with open(os.path.join(outdir,'0.jpg'),'rb') as f:
+				outputs.append(f.read())
+		print('Output files are identical: %s' % (outputs[0] == outputs[1]))
+	finally:
+		shutil.rmtree(outdir)
+
+def benchManifest(args):
+	downloader.logger.setLevel('WARNING')
+	outdir = tempfile.mkdtemp()
+	try:
+		print('Creating a manifest of %s images (half of them done)...' % args.images)
+		images = makeImages(args.images)
+		path = os.path.join(outdir,'manifest.db')
+		manifest = DownloadManifest(path)
+		manifest.queue(images)
+		for image in images[::2]:
+			with open(os.path.join(outdir,image['image_file']),'wb') as f:
+				f.write(b'x')
+		manifest.db.executemany('UPDATE images SET state=?,bytes=?,checksum=? WHERE image_file=?',
+			[('done',1,'',x['image_file']) for x in images[::2]])
+		manifest.db.commit()
+		manifest.close()
+
+		start = time.time()
+		manifest = DownloadManifest(path)
+		entries = manifest.load()
+		loaded = time.time()
+		pending = downloader.resumeImages(images,entries,outdir)
+		resumed = time.time()
+		manifest.queue(pending)
+		manifest.close()
+		queued = time.time()
+		print('  load manifest       %6.2f s' % (loaded - start))
+		print('  check images        %6.2f s' % (resumed - loaded))
+		print('  queue %7s images %6.2f s' % (len(pending),queued - resumed))
+		print('  total startup       %6.2f s' % (queued - start))
+	finally:
+		shutil.rmtree(outdir)
+
+def makeImageDir(n,size):
+	'''a temporary folder of n different size x size JPEGs'''
+	indir = tempfile.mkdtemp()
+	image_data = makeJpeg(size)
+	for i in range(n):
+		# identical pixels decode just as slowly, and the file names keep them distinct
+		with open(os.path.join(indir,'%05d.jpg' % i),'wb') as f:
+			f.write(image_data)
+	return indir
+
+class DirectLoader(object):
+	'''loads each image when it is needed, as the viewer did before image_cache'''
+	def __init__(self,paths):
+		self.paths = paths
+	def get(self,i):
+		import pygame
+		return pygame.image.load(self.paths[i]).convert()
+	def stop(self):
+		pass
+
+def stepThrough(viewer,images,loader,dwell):
+	'''returns the latency of each step forward, pausing dwell seconds on each image'''
+	latencies = []
+	fullImage,i = viewer.prevImage(images,0,loader)
+	for step in range(len(images)-1):
+		time.sleep(dwell)
+		start = time.time()
+		fullImage,i = viewer.nextImage(images,i,loader)
+		latencies.append(time.time() - start)
+	loader.stop()
+	return latencies
+
+def benchViewer(args):
+	os.environ['SDL_VIDEODRIVER'] = 'dummy'
+	import pygame
+	import image_viewer
+	from image_cache import ImagePrefetcher
+	pygame.init()
+	image_viewer.reset_screen((200,200))
+	print('Creating %s images of %s x %s pixels...' % (args.images,args.size,args.size))
+	indir = makeImageDir(args.images,args.size)
+	try:
+		paths = sorted(os.path.join(indir,x) for x in os.listdir(indir))
+		images = [{'image_file':os.path.basename(x),'image_path':x} for x in paths]
+		stdout = sys.stdout
+		for label,loader in (('without prefetch',DirectLoader(paths)),
+				('with prefetch',ImagePrefetcher(paths,image_viewer.prefetchAhead,image_viewer.prefetchBehind,image_viewer.cacheMegabytes*1024*1024))):
+			sys.stdout = open(os.devnull,'w') # nextImage prints every step
+			try:
+				latencies = sorted(stepThrough(image_viewer,images,loader,args.dwell))
+			finally:
+				sys.stdout.close()
+				sys.stdout = stdout
+			print('%-18s per step: mean %6.1f ms  median %6.1f ms  max %6.1f ms' % (label,
+				1000*sum(latencies)/len(latencies),1000*latencies[len(latencies)//2],1000*latencies[-1]))
+	finally:
+		shutil.rmtree(indir)
+
+def makeDownloadedImageDir(n,size):
+	'''a temporary folder of n JPEGs with metadata, as written by the downloader'''
+	indir = tempfile.mkdtemp()
+	image_data = makeJpeg(size)
+	for image in makeImages(n):
+		writeSpliced(image_data,os.path.join(indir,image['image_file']),downloader.buildResult(image))
+	return indir
+
+def benchMetadata(args):
+	import image_metadata
+	print('Creating %s images with metadata...' % args.images)
+	indir = makeDownloadedImageDir(args.images,args.size)
+	try:
+		files = [os.path.join(indir,x) for x in os.listdir(indir)]
+		start = time.time()
+		serial = [image_metadata.readExifUserComment(x) for x in files]
+		print('%-28s %6.2f s' % ('serial piexif.load',time.time() - start))
+		for label in ('first run (builds index)','second run (uses index)'):
+			start = time.time()
+			indexed = image_metadata.readMetadata(files)
+			print('%-28s %6.2f s' % (label,time.time() - start))
+		print('Same metadata: %s' % (serial == indexed))
+	finally:
+		shutil.rmtree(indir)
+
+def benchExifRead(args):
+	import image_metadata
+	if args.dir:
+		indir = args.dir
+	else:
+		print('Creating %s images with metadata...' % args.images)
+		indir = makeDownloadedImageDir(args.images,args.size)
+	try:
+		files = [os.path.join(indir,x) for x in os.listdir(indir) if os.path.splitext(x)[1] in ('.jpg','.JPG')]
+		results = []
+		for label,func in (('piexif.load',image_metadata.readExifUserComment),
+				('header only',image_metadata.readExifUserCommentFast)):
+			start = time.time()
+			results.append([func(x) for x in files])
+			elapsed = time.time() - start
+			print('%-14s %6s images in %6.2f s  %8.0f images/sec' % (label,len(files),elapsed,len(files)/elapsed))
+		print('Same metadata: %s' % (results[0] == results[1]))
+	finally:
+		if not args.dir:
+			shutil.rmtree(indir)
+
+def writeResultReopen(outfile,fieldnames,row,sync=False):
+	'''how image_viewer.py and image_scorer.py used to write each result'''
+	mode = 'a' if os.path.exists(outfile) else 'w'
+	f = open(outfile,mode,newline='\n')
+	writer = csv.DictWriter(f, dialect='excel',fieldnames=fieldnames,extrasaction='ignore')
+	if mode == 'w':
+		writer.writeheader()
+	writer.writerow(row)
+	if sync:
+		f.flush()
+		os.fsync(f.fileno())
+	f.close()
+
+def benchResults(args):
+	from result_writer import ResultWriter
+	import image_scorer
+	fieldnames = image_scorer.fieldnames
+	rows = [dict(downloader.buildResult(x),score='1') for x in makeImages(args.results)]
+	outdir = tempfile.mkdtemp()
+	try:
+		outputs = []
+		for label,sync in (('open, write, close',False),('open, write, fsync, close',True)):
+			path = os.path.join(outdir,'reopen%s.csv' % sync)
+			start = time.time()
+			for row in rows:
+				writeResultReopen(path,fieldnames,row,sync)
+			elapsed = time.time() - start
+			print('%-26s %8.1f us per result' % (label,elapsed*1e6/len(rows)))
+			outputs.append(path)
+
+		for syncEachRow in (False,True):
+			path = os.path.join(outdir,'writer%s.csv' % syncEachRow)
+			start = time.time()
+			results = ResultWriter(path,fieldnames,syncEachRow=syncEachRow)
+			for row in rows:
+				results.write(row)
+			results.close()
+			elapsed = time.time() - start
+			print('%-26s %8.1f us per result (%s)' % ('ResultWriter',elapsed*1e6/len(rows),
+				'every row synced to the journal' if syncEachRow else 'journal synced with the csv'))
+			outputs.append(path)
+
+		contents = []
+		for path in outputs:
+			with open(path,'rb') as f:
+				contents.append(f.read())
+		print('Output files are identical: %s' % all(x == contents[0] for x in contents))
+	finally:
+		shutil.rmtree(outdir)
+
+def benchScores(args):
+	import image_scorer
+	outdir = tempfile.mkdtemp()
+	try:
+		for n in (args.results//4,args.results//2,args.results):
+			images = [dict(downloader.buildResult(x),score='') for x in makeImages(n)]
+			path = os.path.join(outdir,'%s.csv' % n)
+			with open(path,'w',newline='\n') as f:
+				writer = csv.DictWriter(f, dialect='excel',fieldnames=image_scorer.fieldnames,extrasaction='ignore')
+				writer.writeheader()
+				writer.writerows(dict(x,score='1') for x in images[:-1]) # all but the last image scored
+			start = time.time()
+			numScored = image_scorer.loadScores(path,images)
+			i = image_scorer.firstUnscored(images)
+			elapsed = time.time() - start
+			print('%7s scores loaded, resume at %7s in %6.3f s  %5.2f us per score' % (numScored,i+1,elapsed,elapsed*1e6/n))
+	finally:
+		shutil.rmtree(outdir)
+
+def animateTextOld(fullImage,title,scale,animateString):
+	'''how image_viewer.py and image_scorer.py used to animate a selection or score'''
+	import pygame
+	from image_render import scaleTuple
+	scaledImage = pygame.transform.scale(fullImage, scaleTuple(fullImage.get_size(),scale))
+	scaledH = scaledImage.get_height()
+	scaledW = scaledImage.get_width()
+	font = pygame.font.Font(None, 36)
+	text = font.render(title, 1, (255, 0, 0))
+	textpos = text.get_rect()
+	textpos.centerx = scaledImage.get_rect().centerx
+	scaledImage.blit(text, textpos)
+	startSize = int(round(36*scale))
+	endSize = int(round(scaledH))
+	stepSize = int(round((endSize - startSize)/20))
+	for size in range(startSize,endSize,stepSize):
+		screen = pygame.display.set_mode((scaledW,scaledH))
+		screen.blit(scaledImage, (0,0))
+		font = pygame.font.Font(None, size)
+		text = font.render(str(animateString), 1, (255, 0, 0))
+		textpos = text.get_rect()
+		if textpos.width >= scaledW:
+			break
+		textpos.center = scaledImage.get_rect().center
+		screen.blit(text, textpos)
+		pygame.display.flip()
+		pygame.time.delay(1)
+
+def benchKeystroke(args):
+	os.environ['SDL_VIDEODRIVER'] = 'dummy'
+	import pygame
+	import image_scorer
+	from image_cache import ImagePrefetcher
+	from image_render import ImageRenderer
+	from result_writer import ResultWriter
+	pygame.init()
+	image_scorer.reset_screen((200,200))
+	print('Creating %s images of %s x %s pixels...' % (args.images,args.size,args.size))
+	indir = makeImageDir(args.images,args.size)
+	try:
+		paths = sorted(os.path.join(indir,x) for x in os.listdir(indir))
+		stdout = sys.stdout
+		for label,current in (('before',False),('after',True)):
+			images = [{'image_file':os.path.basename(x),'image_path':x,'score':''} for x in paths]
+			outfile = os.path.join(indir,'%s.csv' % label)
+			prefetcher = ImagePrefetcher(paths,image_scorer.prefetchAhead,image_scorer.prefetchBehind,image_scorer.cacheMegabytes*1024*1024)
+			renderer = ImageRenderer('pyview')
+			results = ResultWriter(outfile,image_scorer.fieldnames) if current else None
+			scale = image_scorer.defaultScale
+			fullImage = prefetcher.get(0)
+			latencies = []
+			sys.stdout = open(os.devnull,'w') # the scorer prints every step
+			try:
+				for i in range(len(images)-1):
+					title = '%s of %s : %s : %.2f%%' % (i+1,len(images),images[i]['image_file'],scale*100)
+					image_scorer.showImage(renderer,fullImage,title,scale)
+					time.sleep(args.dwell) # looking at the image; the next one is prefetched meanwhile
+					start = time.time()
+					if current:
+						image_scorer.animateText(renderer,fullImage,title,scale,'3')
+						renderer.invalidate()
+						image_scorer.writeResult(results,images,i,'3')
+					else:
+						animateTextOld(fullImage,title,scale,'3')
+						renderer.invalidate()
+						images[i]['score'] = '3'
+						writeResultReopen(outfile,image_scorer.fieldnames,images[i])
+					fullImage,i = image_scorer.nextImage(images,i,prefetcher)
+					title = '%s of %s : %s : %.2f%%' % (i+1,len(images),images[i]['image_file'],scale*100)
+					image_scorer.showImage(renderer,fullImage,title,scale)
+					latencies.append(time.time() - start)
+			finally:
+				sys.stdout.close()
+				sys.stdout = stdout
+				prefetcher.stop()
+				if results is not None:
+					results.close()
+			latencies.sort()
+			mean = sum(latencies)/len(latencies)
+			print('%-7s keystroke to next image: mean %6.1f ms  median %6.1f ms  max %6.1f ms  (at most %5.0f images/minute)' % (label,
+				1000*mean,1000*latencies[len(latencies)//2],1000*latencies[-1],60/mean))
+	finally:
+		shutil.rmtree(indir)
+
+def benchPyramid(args):
+	os.environ['SDL_VIDEODRIVER'] = 'dummy'
+	import pygame
+	from image_cache import SurfaceCache, surfaceBytes
+	from image_pyramid import ImagePyramid, TiledImage
+	pygame.init()
+	pygame.display.set_mode((200,200))
+	zooms = [0.1,0.15,0.22,0.33,0.5,0.75,1.0]
+	print('Creating a %s x %s image...' % (args.size,args.size))
+	indir = makeImageDir(1,args.size)
+	try:
+		path = os.path.join(indir,os.listdir(indir)[0])
+
+		start = time.time()
+		fullImage = pygame.image.load(path).convert()
+		print('whole image: decode %6.1f ms, %5.1f MB decoded' % (1000*(time.time() - start),surfaceBytes(fullImage)/1024/1024))
+		for zoom in zooms:
+			start = time.time()
+			pygame.transform.scale(fullImage,(int(args.size*zoom),int(args.size*zoom)))
+			print('  zoom %4.0f%%: scale %6.1f ms' % (100*zoom,1000*(time.time() - start)))
+		del fullImage
+
+		start = time.time()
+		pyramid = ImagePyramid(path)
+		pyramid.build()
+		built = time.time() - start
+		onDisk = sum(os.path.getsize(os.path.join(pyramid.dir,x)) for x in os.listdir(pyramid.dir))
+		print('pyramid: built in %6.1f ms (once per image), %s levels, %.1f MB on disk' % (1000*built,pyramid.levels(),onDisk/1024/1024))
+		cache = SurfaceCache(512*1024*1024)
+		def loadTile(tilePath):
+			surf = cache.get(tilePath)
+			if surf is None:
+				surf = pygame.image.load(tilePath).convert()
+				cache.put(tilePath,surf)
+			return surf
+		tiled = TiledImage(pyramid,loadTile)
+		for zoom in zooms:
+			size = int(args.size*zoom)
+			view = pygame.Rect(0,0,min(size,args.window),min(size,args.window))
+			times = []
+			for attempt in ('cold','warm'):
+				start = time.time()
+				tiled.render(zoom,view)
+				times.append(1000*(time.time() - start))
+			# pan across the image in steps of 100 pixels
+			pans = []
+			while view.right + 100 <= size:
+				view.move_ip(100,0)
+				start = time.time()
+				tiled.render(zoom,view)
+				pans.append(1000*(time.time() - start))
+			panned = ''
+			if pans:
+				panned = 'pan %6.1f ms per step' % (sum(pans)/len(pans))
+			print('  zoom %4.0f%%: view %6.1f ms (tiles decoded) %6.1f ms (cached)  %s' % (100*zoom,times[0],times[1],panned))
+		print('  %5.1f MB of tiles decoded in all' % (cache.bytes/1024/1024))
+	finally:
+		shutil.rmtree(indir)
+
+def benchPreviews(args):
+	os.environ['SDL_VIDEODRIVER'] = 'dummy'
+	import pygame
+	from image_cache import surfaceBytes
+	from image_preview import PreviewMaker, previewPath
+	print('Creating %s images of %s x %s pixels...' % (args.images,args.size,args.size))
+	indir = makeImageDir(args.images,args.size)
+	try:
+		paths = sorted(os.path.join(indir,x) for x in os.listdir(indir))
+		start = time.time()
+		previews = PreviewMaker()
+		previews.addMissing(indir)
+		previews.close()
+		elapsed = time.time() - start
+		print('Made %s previews in %.2f s, %.1f previews/sec (%s processes)' % (previews.made,elapsed,previews.made/elapsed,mp.cpu_count()))
+
+		pygame.init()
+		pygame.display.set_mode((200,200))
+		for label,images in (('full size',paths),('preview',[previewPath(x) for x in paths])):
+			start = time.time()
+			surfs = [pygame.image.load(x).convert() for x in images]
+			elapsed = time.time() - start
+			print('%-10s decode %6.1f ms per image  %6.1f MB per image' % (label,1000*elapsed/len(images),surfaceBytes(surfs[0])/1024/1024))
+			del surfs
+	finally:
+		shutil.rmtree(indir)
+
+def benchGrid(args):
+	os.environ['SDL_VIDEODRIVER'] = 'dummy'
+	import pygame
+	from image_grid import ThumbnailLoader, ContactSheet, thumbnailEvent
+	print('Creating %s images of %s x %s pixels...' % (args.images,args.size,args.size))
+	indir = makeImageDir(args.images,args.size)
+	try:
+		paths = sorted(os.path.join(indir,x) for x in os.listdir(indir))
+		pygame.init()
+		pygame.display.set_mode((200,200))
+		sheet = ContactSheet('grid',6,4,200)
+		perPage = min(sheet.perPage(),len(paths))
+
+		def waitForPage(loader,first):
+			while any(loader.get(i) is None for i in range(first,first+perPage)):
+				pygame.event.wait()
+
+		for workers in (1,args.workers):
+			pygame.event.clear()
+			loader = ThumbnailLoader(paths,200,workers)
+			start = time.time()
+			loader.request(range(perPage))
+			waitForPage(loader,0)
+			elapsed = time.time() - start
+			print('%2s threads: first page of %s thumbnails in %6.1f ms' % (workers,perPage,1000*elapsed))
+			loader.close()
+
+		# the viewer asks for the next page while the current one is shown
+		loader = ThumbnailLoader(paths,200,args.workers)
+		loader.request(range(len(paths)))
+		for first in range(0,len(paths) - perPage + 1,perPage):
+			waitForPage(loader,first)
+		flips = []
+		for first in range(0,len(paths) - perPage + 1,perPage):
+			start = time.time()
+			sheet.invalidate()
+			sheet.show(loader,first,perPage,first,set(),'page')
+			flips.append(time.time() - start)
+		print('flip to a prefetched page: %6.1f ms' % (1000*sum(flips)/len(flips)))
+		loader.close()
+	finally:
+		shutil.rmtree(indir)
+
+def makeFileDir(n,kb):
+	indir = tempfile.mkdtemp()
+	data = os.urandom(kb*1024)
+	for i in range(n):
+		with open(os.path.join(indir,'%06d.jpg' % i),'wb') as f:
+			f.write(data)
+	return indir
+
+def moveOneByOne(indir,outdir,names):
+	# the old moveFileList, printing each file (to nowhere)
+	with open(os.devnull,'w') as out:
+		for name in names:
+			src = os.path.join(indir,name)
+			dest = os.path.join(outdir,name)
+			print('Moving %s to %s ...' % (src,dest),file=out)
+			shutil.move(src,dest)
+
+def benchMove(args):
+	from file_mover import BulkMover, moveLogPath, sameFilesystem
+	print('Creating %s files of %s KB...' % (args.files,args.kb))
+	indir = makeFileDir(args.files,args.kb)
+	targets = [('same filesystem',tempfile.mkdtemp())]
+	if args.other_dir:
+		if sameFilesystem(indir,args.other_dir):
+			print('%s is on the same filesystem as %s; skipping the copy benchmark' % (args.other_dir,indir))
+		else:
+			targets.append(('other filesystem',tempfile.mkdtemp(dir=args.other_dir)))
+	try:
+		for label,outdir in targets:
+			names = sorted(os.listdir(indir))
+			start = time.time()
+			moveOneByOne(indir,outdir,names)
+			elapsed = time.time() - start
+			print('%-16s shutil.move: %6.2f s, %7.0f files/sec' % (label,elapsed,len(names)/elapsed))
+			# and back again
+			mover = BulkMover(moveLogPath(outdir),args.workers)
+			mover.move([(os.path.join(outdir,x),os.path.join(indir,x)) for x in names])
+			mover = BulkMover(moveLogPath(indir),args.workers)
+			mover.move([(os.path.join(indir,x),os.path.join(outdir,x)) for x in names])
+			print('%-16s BulkMover:   %6.2f s, %7.0f files/sec (%s renamed, %s copied)' % (
+				label,mover.elapsed,mover.rate(),mover.counts['renamed'],mover.counts['copied']))
+			mover = BulkMover(moveLogPath(outdir),args.workers)
+			mover.move([(os.path.join(outdir,x),os.path.join(indir,x)) for x in names])
+	finally:
+		shutil.rmtree(indir)
+		for label,outdir in targets:
+			shutil.rmtree(outdir)
+
+def runMoveScript(indir,outdir,inputFile,value):
+	import move_images_by_selected as mover
+	stdout = sys.stdout
+	sys.stdout = open(os.devnull,'w')
+	try:
+		mover.main(indir,outdir,inputFile,value)
+	except SystemExit:
+		pass
+	finally:
+		sys.stdout.close()
+		sys.stdout = stdout
+
+def benchSort(args):
+	print('Creating %s files...' % args.files)
+	indir = makeFileDir(args.files,1)
+	outdir = tempfile.mkdtemp()
+	inputFile = os.path.join(outdir,'selected.csv')
+	names = sorted(os.listdir(indir))
+	with open(inputFile,'w') as f:
+		writer = csv.writer(f)
+		writer.writerow(['image_file','selected'])
+		for i,name in enumerate(names[:len(names)*9//10]): # a tenth are not in the file
+			writer.writerow([name,['TRUE','FALSE','maybe'][i % 3]])
+	try:
+		start = time.time()
+		for value in ('TRUE','FALSE','OTHER','NONE'):
+			bucketDir = os.path.join(outdir,value)
+			os.makedirs(bucketDir)
+			runMoveScript(indir,bucketDir,inputFile,value)
+		elapsed = time.time() - start
+		print('one run per value: %6.2f s, %7.0f files/sec' % (elapsed,len(names)/elapsed))
+		for value in ('TRUE','FALSE','OTHER','NONE'):
+			bucketDir = os.path.join(outdir,value)
+			for name in os.listdir(bucketDir):
+				os.rename(os.path.join(bucketDir,name),os.path.join(indir,name))
+		start = time.time()
+		runMoveScript(indir,outdir,inputFile,'ALL')
+		elapsed = time.time() - start
+		print('one run, ALL:      %6.2f s, %7.0f files/sec' % (elapsed,len(names)/elapsed))
+		if os.listdir(indir):
+			print('  %s files were not moved!' % len(os.listdir(indir)))
+	finally:
+		shutil.rmtree(indir)
+		shutil.rmtree(outdir)
+
+def diskUsage(dirs):
+	'''bytes used by the files in dirs (and their sub-folders), counting linked files once'''
+	seen = {}
+	for top in dirs:
+		for root,folders,files in os.walk(top):
+			for name in files:
+				st = os.stat(os.path.join(root,name))
+				seen[(st.st_dev,st.st_ino)] = st.st_size
+	return sum(seen.values())
+
+def runStoreThreads(images,outdir,store,workers):
+	outQ = queue.Queue()
+	errorCount = downloader.ErrorCount()
+	counts = {'stored' : 0}
+	if store:
+		images = downloader.takeFromStore(images,store,outdir,outQ,None,None,counts)
+	pool = ThreadPool(workers)
+	pool.map(downloader.worker,[(x,outdir,outQ,errorCount,None,None,store,None) for x in images])
+	pool.close()
+	return drain(outQ),errorCount.value
+
+def benchStore(args):
+	from image_store import ImageStore
+	downloader.logger.setLevel('WARNING')
+	image_data = makeJpeg(args.size)
+	with StandInServer(image_data) as server:
+		images = makeImages(args.images,server)
+		for i,image in enumerate(images):
+			# different images, as the server sends the same bytes for every url
+			image['image_url'] = server.url('images/%s?%s' % (image['image_file'],i))
+		otherVersion = [dict(x,version=18) for x in images]
+		runs = (('tissue',images),('same tissue again',images),('another version',otherVersion))
+		for label,storeDir in (('without a store',None),('with a store',tempfile.mkdtemp())):
+			store = ImageStore(storeDir) if storeDir else None
+			outdirs = []
+			start = time.time()
+			for run,runImages in runs:
+				outdir = tempfile.mkdtemp()
+				outdirs.append(outdir)
+				before = server.requests
+				rows,errors = runStoreThreads(runImages,outdir,store,8)
+				print('%-16s %-18s %5s images, %5s downloaded (%s errors)' % (label,run,rows,server.requests - before,errors))
+			elapsed = time.time() - start
+			used = diskUsage(outdirs + ([storeDir] if storeDir else []))
+			print('%-16s %.2f s, %.1f MB on disk\n' % (label,elapsed,used/1024/1024))
+			if store:
+				store.close()
+			for outdir in outdirs + ([storeDir] if storeDir else []):
+				shutil.rmtree(outdir)
+
+def runLimited(images,outdir,workers,limiter):
+	outQ = queue.Queue()
+	errorCount = downloader.ErrorCount()
+	pool = ThreadPool(workers)
+	pool.map(downloader.worker,[(x,outdir,outQ,errorCount,None,None,None,limiter) for x in images],chunksize=1)
+	pool.close()
+	return drain(outQ),errorCount.value
+
+def benchAdaptive(args):
+	from api_client import configure
+	from download_throttle import AdaptiveLimit
+	downloader.logger.setLevel('CRITICAL')
+	image_data = makeJpeg(args.size)
+	print('Serving a %s byte JPEG with %.0f ms latency, %s requests at a time (best %.0f images/sec), %.0f%% random errors\n' % (
+		len(image_data),args.latency*1000,args.capacity,args.capacity/args.latency,100*args.error_rate))
+	runs = [('%s workers' % x,x,None) for x in (2,args.capacity,2*args.capacity,4*args.capacity)]
+	runs.append(('adaptive from 2 (max 64)',64,AdaptiveLimit(2,1,64)))
+	for label,workers,limiter in runs:
+		configure(pool_size=max(workers,10),timeout=(10,30))
+		with StandInServer(image_data,args.latency,args.capacity,args.error_rate) as server:
+			images = makeImages(args.images,server)
+			limits = []
+			sampling = [True]
+			def sample():
+				while sampling[0]:
+					limits.append(limiter.limit)
+					time.sleep(0.1)
+			if limiter:
+				sampler = threading.Thread(target=sample)
+				sampler.start()
+			outdir = tempfile.mkdtemp()
+			try:
+				start = time.time()
+				rows,errors = runLimited(images,outdir,workers,limiter)
+				elapsed = time.time() - start
+			finally:
+				sampling[0] = False
+				shutil.rmtree(outdir)
+			print('%-26s %7.1f images/sec  %5s requests for %s images (%s rejected), %s failed' % (
+				label,rows/elapsed,server.requests,rows,server.errors,errors))
+			if limiter:
+				sampler.join()
+				later = limits[len(limits)//2:] or [limiter.limit]
+				print('%-26s limit %.1f on average over the second half of the run (%.1f to %.1f), ended at %.1f' % (
+					'',sum(later)/len(later),min(later),max(later),limiter.limit))
+
+def oldResultListener(q,filepath,fieldnames):
+	'''how the downloader used to write its output file, from a multiprocessing.Manager queue'''
+	f = open(filepath,'a',newline='\n')
+	writer = csv.DictWriter(f, dialect='excel',fieldnames=fieldnames,extrasaction='ignore')
+	while 1:
+		result = q.get()
+		if result == 'kill':
+			break
+		writer.writerow(result)
+	f.close()
+
+def benchPipeline(args):
+	fieldnames = ['hpa_version','image_file','ensg_id','tissue_or_cancer','antibody','protein_url','image_url','sha1']
+	rows = [dict(downloader.buildResult(x),sha1='%040x' % i) for i,x in enumerate(makeImages(args.results))]
+	outdir = tempfile.mkdtemp()
+	try:
+		outputs = []
+		for label in ('Manager queue','ResultListener'):
+			path = os.path.join(outdir,'%s.csv' % label.replace(' ','_'))
+			pool = ThreadPool(args.workers)
+			start = time.time()
+			if label == 'Manager queue':
+				manager = mp.Manager()
+				outQ = manager.Queue()
+				errorCount = manager.Value('i',0)
+				pool.apply_async(oldResultListener,(outQ,path,fieldnames))
+				slots = args.workers - 1
+				def count():
+					errorCount.value += 1
+			else:
+				outQ = downloader.ResultListener(path,fieldnames)
+				outQ.start()
+				errorCount = downloader.ErrorCount()
+				slots = args.workers
+				count = errorCount.add
+			startup = time.time() - start
+
+			# each worker puts its result, and (as if every image failed once) counts an error
+			start = time.time()
+			pool.map(lambda row: (outQ.put(row),count()),rows,chunksize=1)
+			if label == 'Manager queue':
+				outQ.put('kill')
+				pool.close()
+				pool.join()
+			else:
+				outQ.close()
+				pool.close()
+			elapsed = time.time() - start
+			print('%-16s startup %6.1f ms  %6.1f us per result  %s of %s pool threads downloading  (%s errors counted)' % (
+				label,startup*1000,elapsed*1e6/len(rows),slots,args.workers,errorCount.value))
+			if label == 'Manager queue':
+				manager.shutdown()
+			outputs.append(path)
+
+		contents = []
+		for path in outputs:
+			with open(path,'r') as f:
+				contents.append(sorted(f.readlines()))
+		print('Output files have the same rows: %s (%s rows)' % (contents[0] == contents[1],len(contents[1])))
+	finally:
+		shutil.rmtree(outdir)
+
+def benchTissues(args):
+	import io
+	import contextlib
+	import api_client
+	# the downloader logs every image; that is not what we are measuring
+	downloader.logger.setLevel('WARNING')
+	image_data = makeJpeg(args.size)
+	tissues = ['Tissue %s' % (i+1) for i in range(args.tissues)]
+	print('%s tissues of %s images; %.0f ms latency per image, %.0f ms per api query, %s workers' % (
+		args.tissues,args.images,args.latency*1000,args.api_latency*1000,args.workers))
+	with StandInServer(image_data,args.latency) as server:
+		byTissue = {}
+		for tissue in tissues:
+			images = makeImages(args.images,server)
+			for x in images:
+				x['tissue_or_cancer'] = tissue
+				x['image_file'] = '%s_%s' % (tissue.replace(' ',''),x['image_file'])
+				x['image_url'] = server.url('images/%s' % x['image_file'])
+			byTissue[tissue] = images
+
+		def getImages(hpa_version,ensg_ids,tissues):
+			time.sleep(args.api_latency)
+			return [dict(x) for t in tissues for x in byTissue[t]]
+
+		realGetImages = api_client.get_images
+		api_client.get_images = getImages
+		workdir = tempfile.mkdtemp()
+		try:
+			infile = os.path.join(workdir,'genes.txt')
+			with open(infile,'w') as f:
+				f.write('ENSG00000000003\n')
+			for label in ('one run per tissue','one run for all'):
+				outdir = os.path.join(workdir,label.replace(' ','_'))
+				os.makedirs(outdir)
+				outfile = os.path.join(outdir,'results.csv')
+				start = time.time()
+				with contextlib.redirect_stdout(io.StringIO()):
+					if label == 'one run per tissue':
+						for tissue in tissues:
+							tissueOutfile,tissueOutdir = downloader.jobPaths(outfile,outdir,19,tissue,True)
+							downloader.main(19,infile,tissueOutfile,tissue,tissueOutdir,True,[],args.workers)
+					else:
+						downloader.main(19,infile,outfile,tissues,outdir,True,[],args.workers)
+				elapsed = time.time() - start
+				rows = 0
+				for tissue in tissues:
+					with open(downloader.jobPaths(outfile,outdir,19,tissue,True)[0],'r') as f:
+						rows += len(f.readlines()) - 1
+				print('%-20s %7.2f s  %7.1f images/sec  (%s rows in %s output files)' % (
+					label,elapsed,args.tissues*args.images/elapsed,rows,len(tissues)))
+		finally:
+			api_client.get_images = realGetImages
+			shutil.rmtree(workdir)
+
+def benchSchedule(args):
+	from download_scheduler import DownloadScheduler
+	# the downloader logs every image; that is not what we are measuring
+	downloader.logger.setLevel('WARNING')
+	image_data = makeJpeg(args.size)
+	genes = ['ENSG%011d' % g for g in range(args.genes)]
+	print('%s genes: the first with %s images, the others with %s; %.0f ms latency per image, %s workers' % (
+		args.genes,args.big,args.images,args.latency*1000,args.workers))
+	with StandInServer(image_data,args.latency) as server:
+		images = []
+		for g,gene in enumerate(genes):
+			for i in range(args.big if g == 0 else args.images):
+				image_file = '%s_%s_A_1_1.jpg' % (10000+g,i)
+				images.append({
+					'version' : 19,
+					'ensg_id' : gene,
+					'tissue_or_cancer' : 'heart muscle',
+					'antibody_id' : 'HPA%06d' % g,
+					'image_file' : image_file,
+					'image_url' : server.url('images/%s' % image_file),
+					})
+		for label,order,firstN in (('api','api',None),('genes','genes',None),('genes, first 2','genes',2),('interleave','interleave',None)):
+			outdir = tempfile.mkdtemp()
+			job = downloader.DownloadJob(None,None,None,outdir)
+			job.outQ = queue.Queue()
+			errorCount = downloader.ErrorCount()
+			scheduler = DownloadScheduler(genes,order,firstN,progressSeconds=1e9)
+			lock = threading.Lock()
+			firstImage = {} # gene -> seconds until its first image
+			downloads = [0,None] # so far, genes with an image after a quarter of them
+			start = time.time()
+
+			def download(item):
+				job,image = item
+				ok = downloader.worker((image,outdir,job.outQ,errorCount,None,None,None,None))
+				scheduler.finished(job,image,ok)
+				with lock:
+					downloads[0] += 1
+					firstImage.setdefault(image['ensg_id'],time.time() - start)
+					if downloads[0] == len(images) // 4:
+						downloads[1] = len(firstImage)
+
+			pool = ThreadPool(args.workers)
+			try:
+				downloader.boundedMap(pool,download,scheduler.schedule((job,x) for x in images),args.workers*2)
+				elapsed = time.time() - start
+			finally:
+				pool.close()
+				shutil.rmtree(outdir)
+			print('%-16s %6.2f s in all; every gene had an image after %6.2f s; %3s of %s genes had one after a quarter of the images' % (
+				label,elapsed,max(firstImage.values()),downloads[1],len(genes)))
+
+def parse_args():
+	parser = argparse.ArgumentParser()
+	subparsers = parser.add_subparsers(dest='benchmark')
+	subparsers.required = True
+
+	download = subparsers.add_parser('download',help='thread pool vs asyncio download engines')
+	download.add_argument('-n','--images',help='Number of images to download, defaults to 500',type=int,default=500)
+	download.add_argument('-w','--workers',help='Number of thread pool workers, defaults to 3',type=int,default=3)
+	download.add_argument('--max_in_flight',help='asyncio downloads in flight, defaults to 64',type=int,default=64)
+	download.add_argument('--per_host',help='asyncio connections per host, defaults to 8',type=int,default=8)
+	download.add_argument('--latency',help='Seconds of latency per request, defaults to 0.05',type=float,default=0.05)
+	download.add_argument('--size',help='Width/height of the synthetic image in pixels, defaults to 1000',type=int,default=1000)
+	download.set_defaults(func=benchDownload)
+
+	exif = subparsers.add_parser('exif',help='write then insert Exif vs splice Exif while writing')
+	exif.add_argument('-n','--images',help='Number of images to write, defaults to 200',type=int,default=200)
+	exif.add_argument('--size',help='Width/height of the synthetic image in pixels, defaults to 1000',type=int,default=1000)
+	exif.set_defaults(func=benchExif)
+
+	manifest = subparsers.add_parser('manifest',help='startup time when resuming from a manifest')
+	manifest.add_argument('-n','--images',help='Number of images in the manifest, defaults to 100000',type=int,default=100000)
+	manifest.set_defaults(func=benchManifest)
+
+	viewer = subparsers.add_parser('viewer',help='per step latency of image_viewer with and without prefetch')
+	viewer.add_argument('-n','--images',help='Number of images to step through, defaults to 20',type=int,default=20)
+	viewer.add_argument('--size',help='Width/height of the images in pixels, defaults to 3000',type=int,default=3000)
+	viewer.add_argument('--dwell',help='Seconds spent looking at each image, defaults to 0.3',type=float,default=0.3)
+	viewer.set_defaults(func=benchViewer)
+
+	metadata = subparsers.add_parser('metadata',help='serial metadata reads vs the metadata index')
+	metadata.add_argument('-n','--images',help='Number of images in the folder, defaults to 5000',type=int,default=5000)
+	metadata.add_argument('--size',help='Width/height of the images in pixels, defaults to 100',type=int,default=100)
+	metadata.set_defaults(func=benchMetadata)
+
+	exifread = subparsers.add_parser('exifread',help='piexif.load vs the header-only UserComment reader')
+	exifread.add_argument('-n','--images',help='Number of synthetic images, defaults to 5000',type=int,default=5000)
+	exifread.add_argument('--size',help='Width/height of the synthetic images in pixels, defaults to 100',type=int,default=100)
+	exifread.add_argument('--dir',help='A folder of downloaded images to use instead of synthetic ones',type=str,default=None)
+	exifread.set_defaults(func=benchExifRead)
+
+	results = subparsers.add_parser('results',help='reopening the output csv per result vs a ResultWriter')
+	results.add_argument('-n','--results',help='Number of results to write, defaults to 10000',type=int,default=10000)
+	results.set_defaults(func=benchResults)
+
+	scores = subparsers.add_parser('scores',help='startup cost of resuming a scoring session')
+	scores.add_argument('-n','--results',help='Number of scores in the largest output file, defaults to 200000',type=int,default=200000)
+	scores.set_defaults(func=benchScores)
+
+	keystroke = subparsers.add_parser('keystroke',help='latency from a score keystroke to the next image in image_scorer.py')
+	keystroke.add_argument('-n','--images',help='Number of images to score, defaults to 20',type=int,default=20)
+	keystroke.add_argument('--size',help='Width/height of the images in pixels, defaults to 3000',type=int,default=3000)
+	keystroke.add_argument('--dwell',help='Seconds spent looking at each image before scoring it, defaults to 0.3',type=float,default=0.3)
+	keystroke.set_defaults(func=benchKeystroke)
+
+	pyramid = subparsers.add_parser('pyramid',help='zoom and pan by scaling the whole image vs a tiled pyramid')
+	pyramid.add_argument('--size',help='Width/height of the image in pixels, defaults to 3000',type=int,default=3000)
+	pyramid.add_argument('--window',help='Width/height of the window in pixels, defaults to 1000',type=int,default=1000)
+	pyramid.set_defaults(func=benchPyramid)
+
+	previews = subparsers.add_parser('previews',help='making previews, and decoding previews vs full size images')
+	previews.add_argument('-n','--images',help='Number of images, defaults to 20',type=int,default=20)
+	previews.add_argument('--size',help='Width/height of the images in pixels, defaults to 3000',type=int,default=3000)
+	previews.set_defaults(func=benchPreviews)
+
+	grid = subparsers.add_parser('grid',help='contact sheet page load and page flip times')
+	grid.add_argument('-n','--images',help='Number of images, defaults to 48',type=int,default=48)
+	grid.add_argument('--size',help='Width/height of the images in pixels, defaults to 1000',type=int,default=1000)
+	grid.add_argument('-w','--workers',help='Number of thumbnail threads, defaults to 4',type=int,default=4)
+	grid.set_defaults(func=benchGrid)
+
+	move = subparsers.add_parser('move',help='moving files one by one vs a BulkMover')
+	move.add_argument('-n','--files',help='Number of files to move, defaults to 50000',type=int,default=50000)
+	move.add_argument('--kb',help='Size of each file in KB, defaults to 4',type=int,default=4)
+	move.add_argument('-w','--workers',help='Number of copy threads, defaults to 8',type=int,default=8)
+	move.add_argument('--other_dir',help='A folder on another filesystem, to time moves that have to copy',type=str,default=None)
+	move.set_defaults(func=benchMove)
+
+	sort = subparsers.add_parser('sort',help='one move_images_by_selected.py run per value vs one run with ALL')
+	sort.add_argument('-n','--files',help='Number of files to sort, defaults to 50000',type=int,default=50000)
+	sort.set_defaults(func=benchSort)
+
+	store = subparsers.add_parser('store',help='downloads and disk space with and without an image store')
+	store.add_argument('-n','--images',help='Number of images per run, defaults to 200',type=int,default=200)
+	store.add_argument('--size',help='Width/height of the synthetic image in pixels, defaults to 1000',type=int,default=1000)
+	store.set_defaults(func=benchStore)
+
+	adaptive = subparsers.add_parser('adaptive',help='fixed numbers of workers vs adaptive concurrency against a rate limiting server')
+	adaptive.add_argument('-n','--images',help='Number of images to download, defaults to 1500',type=int,default=1500)
+	adaptive.add_argument('--capacity',help='Requests the server handles at once, defaults to 8',type=int,default=8)
+	adaptive.add_argument('--latency',help='Seconds the server takes per request, defaults to 0.05',type=float,default=0.05)
+	adaptive.add_argument('--error_rate',help='Fraction of requests that fail at random, defaults to 0.01',type=float,default=0.01)
+	adaptive.add_argument('--size',help='Width/height of the synthetic image in pixels, defaults to 200',type=int,default=200)
+	adaptive.set_defaults(func=benchAdaptive)
+
+	pipeline = subparsers.add_parser('pipeline',help='download results through a Manager queue vs a ResultListener')
+	pipeline.add_argument('-n','--results',help='Number of results, defaults to 20000',type=int,default=20000)
+	pipeline.add_argument('-w','--workers',help='Number of pool threads, defaults to 8',type=int,default=8)
+	pipeline.set_defaults(func=benchPipeline)
+
+	schedule = subparsers.add_parser('schedule',help='how soon every gene has an image, for each download order')
+	schedule.add_argument('-g','--genes',help='Number of genes, defaults to 20',type=int,default=20)
+	schedule.add_argument('-n','--images',help='Number of images of each gene but the first, defaults to 10',type=int,default=10)
+	schedule.add_argument('--big',help='Number of images of the first gene, defaults to 300',type=int,default=300)
+	schedule.add_argument('-w','--workers',help='Number of download workers, defaults to 8',type=int,default=8)
+	schedule.add_argument('--latency',help='Seconds of latency per image request, defaults to 0.05',type=float,default=0.05)
+	schedule.add_argument('--size',help='Width/height of the synthetic image in pixels, defaults to 200',type=int,default=200)
+	schedule.set_defaults(func=benchSchedule)
+
+	tissues = subparsers.add_parser('tissues',help='a download run per tissue vs one run for all the tissues')
+	tissues.add_argument('-t','--tissues',help='Number of tissues, defaults to 10',type=int,default=10)
+	tissues.add_argument('-n','--images',help='Number of images per tissue, defaults to 50',type=int,default=50)
+	tissues.add_argument('-w','--workers',help='Number of download workers, defaults to 8',type=int,default=8)
+	tissues.add_argument('--latency',help='Seconds of latency per image request, defaults to 0.05',type=float,default=0.05)
+	tissues.add_argument('--api_latency',help='Seconds per api query for the image list, defaults to 0.5',type=float,default=0.5)
+	tissues.add_argument('--size',help='Width/height of the synthetic image in pixels, defaults to 200',type=int,default=200)
+	tissues.set_defaults(func=benchTissues)
+
+	return parser.parse_args()
+
+if __name__ == '__main__':
+	args = parse_args()
+	args.func(args)
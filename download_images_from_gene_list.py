@@ -10,6 +10,7 @@
 	protein_url: deprecated
 	image_url: the HPA url the image was downloaded from
 	workers: the number of workers to use, default (and minimum) is 4
+	sha1: with --checksums, the sha1 of the image file as written (see verify_images.py)
 
 Known tissue (and cancer) types are listed in the APPENDICES of the README file
 
@@ -17,7 +18,21 @@ This script also embeds the above information as json in the Exif.UserComment ta
 
 Currently supported hpa_versions are 18 and 19; if omitted, it defaults to 19
 
-usage: download_images_from_gene_list_multi.py <input_file> <output_file> <tissue> <output_dir> [-v hpa_version] [-w workers]
+More than one tissue, and more than one hpa_version, can be given. Every tissue of every version is then downloaded in the same run, by the same pool of workers, into an output file and a folder of its own: for the output file results.csv and the output_dir images, the tissue Heart muscle of version 19 goes to results_Heart_muscle_v19.csv and images/Heart_muscle_v19. The image lists of all of them are queried from the api together.
+
+Images are downloaded by a pool of threads (the default), or optionally by an asyncio engine (-e asyncio) that streams the downloads over a small number of keep-alive connections. The asyncio engine requires python 3 and aiohttp.
+
+Each download is checked before it is accepted: the number of bytes received must match the Content-Length sent by the server, and the image must start and end with the JPEG start and end of image markers. A download that fails these checks is retried.
+
+The images are downloaded in an order that interleaves the genes (see download_scheduler.py): the first image of every gene in the input file, then the second, and so on, so that a run that is only part way through already has images of every gene. --order genes downloads them gene by gene, in the order of the input file, and --first_n n downloads the first n images of every gene before any others. The progress of each gene is logged as the run goes on and written to <output file>.progress.csv.
+
+With --adaptive, the thread engine adjusts the number of downloads in flight to how the image host is responding (see download_throttle.py), between 1 and --max_in_flight, starting from --workers. Failed downloads are retried with an exponential backoff with jitter.
+
+With --store, each image is also kept in a content-addressed store shared by every run (see image_store.py), and the file in the output directory is a hard link to it; images that an earlier run already downloaded are taken from the store instead of downloaded again. Within a run of several tissues or versions, an image with the same url in more than one of them is downloaded once, and written from the store for the others.
+
+With --previews, a reduced size preview of each image (see image_preview.py) is also made by a pool of processes as the images are downloaded, for image_viewer.py and image_scorer.py to show instead of decoding the full size image. Making previews requires pygame.
+
+usage: download_images_from_gene_list_multi.py <input_file> <output_file> <tissue> [tissue ...] <output_dir> [-v hpa_version [hpa_version ...]] [-w workers] [-e engine] [--adaptive] [--max_in_flight n] [--per_host n] [--order order] [--first_n n] [--store dir] [--checksums] [--previews]
 """
 from __future__ import print_function
 from __future__ import division
@@ -30,10 +45,34 @@ from __future__ import absolute_import
 # 12-19-2017 TC rewrote to source image url data from hpasubc REST api
 # 08-26-2020 TC rewrote to address work with the api_client that now targets multiple versions of HPA
 # 08-26-2020 TC changed argument parsing to use argparse  
+# 10-18-2026 TC added optional asyncio download engine
+# 10-18-2026 TC images are streamed to a temporary file and renamed when complete
+# 10-18-2026 TC the Exif user comment is spliced into the image as it is downloaded, so each image is written once
+# 10-18-2026 TC added a download manifest to resume interrupted runs; removed readProgress
+# 10-18-2026 TC images are downloaded with the pooled api_client session instead of urllib
+# 10-18-2026 TC the image list is fetched in concurrent batches and downloads start with the first batch
+# 10-18-2026 TC api responses are cached on disk; added --cache_size and --no_cache
+# 10-18-2026 TC added --previews
+# 10-18-2026 TC added --store, a content-addressed image store shared between runs
+# 10-18-2026 TC added --adaptive (AIMD concurrency for the thread engine); retries back off exponentially with jitter
+# 10-18-2026 TC downloads are checked against the Content-Length and for the JPEG start/end markers; added --checksums
+# 10-18-2026 TC the output file is written in batches by a ResultListener thread, and errors are counted by an ErrorCount,
+#               instead of through a multiprocessing Manager; every pool worker now downloads
+# 10-18-2026 TC accepts several tissues and HPA versions, downloaded together by one pool into an output file and
+#               folder for each (DownloadJob); their image lists are queried together
+# 10-18-2026 TC images are downloaded in the order of a DownloadScheduler, interleaved across genes by default, with
+#               the progress of each gene in a progress file; added --order and --first_n
+# 10-18-2026 TC images are marked done in the manifest by the ResultListener, once their rows are written and synced
+# 10-18-2026 TC --adaptive measures the time to the response headers, and frees the slot before the image is committed
+# 10-18-2026 TC moved ImageWriter and the JPEG and Exif helpers to image_writer.py
+# 10-18-2026 TC --timeout is passed to the asyncio engine too
+# 10-18-2026 TC with --store, an image url shared by several jobs of one run is downloaded once (SharedImages)
+# 10-18-2026 TC the log file handler is on the root logger, so the other modules' messages are logged too
+# 10-18-2026 TC --adaptive with --engine asyncio is an error instead of being ignored
+# 10-18-2026 TC removed unused imports
 
 from future import standard_library
 standard_library.install_aliases()
-from builtins import zip
 from builtins import input
 from builtins import str
 
@@ -46,22 +85,23 @@ __maintainer__ = "Toby C. Cornish"
 __email__ = "tcornish@gmail.com"
 
 import logging
-import urllib.request, urllib.error, urllib.parse
 import csv
 import time
 import sys
 import os
+import threading
 import argparse
 import re
-import datetime
 import traceback
-import json
-import piexif
-import piexif.helper
-from itertools import repeat
-import multiprocessing as mp
+import queue
+import requests
 from multiprocessing.dummy import Pool as ThreadPool
-from api_client import get_tissues, get_genes, get_images
+from api_client import get_tissues, get_genes, iter_query_batches, get_client, configure, configure_cache
+from download_manifest import DownloadManifest, manifestPath, isComplete
+from download_throttle import AdaptiveLimit, backoffDelay, isThrottled
+from download_scheduler import DownloadScheduler, scheduleOrders
+from result_writer import syncFile
+from image_writer import ImageWriter, checkContentLength, writeExifUserComment, partialSuffix
 
 #configure logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -76,29 +116,28 @@ handler.setLevel(logging.INFO)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
 
-# add the handlers to the logger
-logger.addHandler(handler)
+# add the handlers to the root logger, so the log file also gets the messages of the modules used here
+# (the scheduler's progress, the asyncio engine's retries, ...)
+logging.getLogger().addHandler(handler)
 
 valid_hpa_versions = [18,19] #restricts valid commandline arguments
-
-def main(hpa_version,infile,outfile,tissue,outdir,create,skip,numWorkers):
-
-	fieldnames = ['hpa_version','image_file','ensg_id','tissue_or_cancer','antibody','protein_url','image_url']
-
-	if os.path.exists(outfile):
-		mode = 'a' # append if already exists
-	else:
-		mode = 'w' # make a new file if not
-	
-	# there are some 2 v. 3 differences here to avoid extra blank lines
-	if (sys.version_info > (3, 0)):	
-		f = open(outfile,mode,newline='\n')
-	else:
-		f = open(outfile,mode+'b')
-	writer = csv.DictWriter(f, dialect='excel',fieldnames=fieldnames,extrasaction='ignore')
-	if mode == 'w':
-		writer.writeheader()
-	f.close()
+valid_engines = ['threads','asyncio']
+chunkSize = 64*1024 # bytes held in memory per download in flight
+resultBatchSize = 500 # rows written to the output file at once
+resultBatchSeconds = 1.0 # longest time a row waits to be written
+
+def main(hpa_version,infile,outfile,tissue,outdir,create,skip,numWorkers,engine='threads',maxInFlight=64,perHost=8,timeout=120,retries=3,batchSize=500,apiWorkers=4,makePreviews=False,storeDir=None,adaptive=False,checksums=False,order='interleave',firstN=None):
+	'''hpa_version and tissue may each be a list; every tissue of every version is then a DownloadJob
+	with its own output file and folder (see jobPaths), and all of them share one pool of workers'''
+
+	hpa_versions = hpa_version if isinstance(hpa_version,(list,tuple)) else [hpa_version,]
+	tissues = tissue if isinstance(tissue,(list,tuple)) else [tissue,]
+	several = len(hpa_versions) * len(tissues) > 1
+	jobs = []
+	for version in hpa_versions:
+		for t in tissues:
+			jobOutfile,jobOutdir = jobPaths(outfile,outdir,version,t,several)
+			jobs.append(DownloadJob(version,t,jobOutfile,jobOutdir))
 
 	geneList = []
 	skipList = []
@@ -113,139 +152,548 @@ def main(hpa_version,infile,outfile,tissue,outdir,create,skip,numWorkers):
 
 	print('\nSkipping a total of %s ensg_ids' % len(skipList))
 	print('Processing a total of %s ensg_ids' % len(geneList))
+	if several:
+		print('Downloading %s tissues for %s HPA versions, %s downloads in all' % (len(tissues),len(hpa_versions),len(jobs)))
+
+	#previews are made by a pool of processes, started before any threads
+	previews = None
+	if makePreviews:
+		from image_preview import PreviewMaker
+		previews = PreviewMaker()
+
+	#with --adaptive, there is a thread for the most downloads allowed in flight, and the limit decides how many run
+	limiter = None
+	if adaptive and engine == 'asyncio':
+		logger.warning('adaptive is ignored by the asyncio engine, which is limited by maxInFlight and perHost')
+	elif adaptive:
+		limiter = AdaptiveLimit(numWorkers,1,max(numWorkers,maxInFlight))
+		numWorkers = limiter.maximum
 
 	#create a pool of workers
 	print('Creating a pool of %s workers.\n' % numWorkers)
 	pool = ThreadPool(numWorkers)
 
-	#create shared queue to handle writing to our output FILE
-	manager = mp.Manager()
-	outQ = manager.Queue()
-
-	#use a shared variable to keep a count of errors
-	errorCount = manager.Value('i',0)
-
-	logger.info('Getting image list...')
-	images = get_images(hpa_version,geneList,[tissue,])
-	print('  done.')
-	logger.info('Found a total of %s images on HPA' % len(images))
-
-	#find duplicate images
-	duplicate_images = [x ['image_file'] for x in images if os.path.exists(os.path.join(outdir,x['image_file']))]
-
-	#if any of the images already exist in the outdir, query if we should overwrite 
-	if duplicate_images:
-		logger.info('%s images with duplicate names found in output directory "%s".',len(duplicate_images),outdir)
-		overwrite_images = query_yes_no('Duplicate images found. Overwrite images?',default="no")
+	#keep one pooled connection per worker open for the api and image requests
+	configure(pool_size=max(numWorkers,10),timeout=(10,timeout),retries=retries)
+
+	#the workers share a count of errors
+	errorCount = ErrorCount()
+
+	#images downloaded by any earlier run are taken from the store
+	store = None
+	if storeDir:
+		from image_store import ImageStore
+		store = ImageStore(storeDir)
+
+	#each job writes its own output FILE, manifest and folder
+	for job in jobs:
+		job.open(checksums)
+		#images already in the outdir get previews too
+		if previews:
+			previews.addMissing(job.outdir)
+
+	#if any images already exist in the outdirs, query if we should overwrite ones with the same name
+	duplicates = sum(len(job.duplicates) for job in jobs)
+	if duplicates:
+		for job in jobs:
+			if job.duplicates:
+				logger.info('%s images not from this download found in output directory "%s".',len(job.duplicates),job.outdir)
+		overwrite_images = query_yes_no('Existing images found. Overwrite images with duplicate names?',default="no")
 		if overwrite_images:
-			logger.info('Will overwrite %s duplicate images.' % len(duplicate_images))
+			logger.info('Will overwrite duplicate images.')
 		else:
-			logger.info('Will skip %s duplicate images.' % len(duplicate_images))
+			logger.info('Will skip duplicate images.')
 	else:
 		overwrite_images = True
 
-	# remove duplicate_images from list of images
-	if not overwrite_images:
-		images = [x for x in images if x['image_file'] not in duplicate_images]
-	logger.info('Queuing %s images for download' % len(images))
-
-	#zip together the data into an array of tuples so that we can use a map function
-	data = list(zip(images,repeat(outdir),repeat(outQ),repeat(errorCount)))
-
-	#start the listener threads for the file writing queues
-	pool.apply_async(resultListener, (outQ,outfile,fieldnames))
-
-	#map our data to a pool of workers, i.e. do the work
-	pool.map(worker, data)
-
-	#kill off the queue listeners and close the pool
-	outQ.put('kill')
+	#the image lists of all the jobs arrive from the api in batches, queried together; downloads start as soon as the first batch arrives
+	logger.info('Getting image list in batches of %s genes...' % batchSize)
+	batches = iter_query_batches([(job.hpa_version,geneList,[job.tissue,]) for job in jobs],batchSize,apiWorkers)
+	#the workers are given the images best first (see download_scheduler.py), and the progress of each gene is kept
+	scheduler = DownloadScheduler(geneList,order,firstN)
+	#with a store, an image url that several jobs share is downloaded once, and written from the store for the others
+	shared = SharedImages() if store else None
+	images = scheduler.schedule(scheduleImages(jobs,batches,overwrite_images,store,previews,shared))
+
+	def finished(job,image,ok):
+		scheduler.finished(job,image,ok)
+		if shared:
+			finishShared(shared,image,ok,store,errorCount,previews,limiter)
+
+	if engine == 'asyncio':
+		downloadImagesAsync(images,errorCount,maxInFlight,perHost,previews,store,finished,timeout)
+	else:
+		def download(item):
+			job,image = item
+			ok = worker((image,job.outdir,job.outQ,errorCount,job.manifest,previews,store,limiter))
+			finished(job,image,ok)
+
+		#map our data to a pool of workers, i.e. do the work
+		boundedMap(pool,download,images,numWorkers*2)
+	scheduler.report()
+
+	#write the last rows of each job
+	for job in jobs:
+		counts = job.counts
+		logger.info('%sFound a total of %s images on HPA, queued %s for download' % (
+			'%s (v%s): ' % (job.tissue,job.hpa_version) if several else '',counts['found'],counts['queued']))
+		job.close()
+	if store:
+		logger.info('Took %s images from the store; %s new images stored, %s MB saved by links' % (
+			sum(job.counts['stored'] for job in jobs),store.added,store.bytesSaved//(1024*1024)))
+		if store.copied:
+			logger.info('%s images were copied into the store; keep the store on the same filesystem as the output directory to link them instead' % store.copied)
+		store.close()
+	if limiter:
+		logger.info('Adaptive concurrency: ended at %.1f downloads in flight, after %s throttled responses' % (
+			limiter.limit,limiter.congestions))
+
+	#close the pool
 	pool.close()
 
+	if previews:
+		logger.info('Waiting for the previews to be made...')
+		previews.close()
+		logger.info('Made %s previews' % previews.made)
+		for imagePath,message in previews.failed:
+			logger.error('Could not make a preview of %s: %s' % (imagePath,message))
+
 	logger.info("Finished")
 	if errorCount.value > 0:
 		print("There were %s errors.\n\nPlease check the log file: %s" % (errorCount.value,log_file))
 
-def resultListener(q,filepath,fieldnames):
-	'''listens for messages on the q, writes to file using a csv writer. '''
+def jobPaths(outfile,outdir,hpa_version,tissue,several):
+	'''the output file and folder of one tissue and version; when there are several, they are
+	<output file>_<tissue>_v<version>.csv and a folder <tissue>_v<version> in outdir'''
+	if not several:
+		return outfile,outdir
+	name = '%s_v%s' % (re.sub(r'[^A-Za-z0-9]+','_',tissue).strip('_'),hpa_version)
+	base,ext = os.path.splitext(outfile)
+	return '%s_%s%s' % (base,name,ext or '.csv'),os.path.join(outdir,name)
+
+def prepareOutputFile(outfile,checksums=False):
+	'''writes the header of a new output file; returns its columns'''
+	fieldnames = ['hpa_version','image_file','ensg_id','tissue_or_cancer','antibody','protein_url','image_url']
 
+	if os.path.exists(outfile):
+		mode = 'a' # append if already exists
+		# keep the columns of the existing file
+		if checksums and 'sha1' not in readHeader(outfile):
+			logger.info('The output file %s has no sha1 column; checksums will not be recorded.' % outfile)
+			checksums = False
+	else:
+		mode = 'w' # make a new file if not
+	if checksums:
+		fieldnames.append('sha1')
+	
 	# there are some 2 v. 3 differences here to avoid extra blank lines
-	mode = 'a'
 	if (sys.version_info > (3, 0)):	
-		f = open(filepath,mode,newline='\n')
+		f = open(outfile,mode,newline='\n')
 	else:
-		f = open(filepath,mode+'b')
+		f = open(outfile,mode+'b')
 	writer = csv.DictWriter(f, dialect='excel',fieldnames=fieldnames,extrasaction='ignore')
-	while 1:
-		result = q.get()
-		if result == 'kill':
-			break
-		writer.writerow(result)
+	if mode == 'w':
+		writer.writeheader()
 	f.close()
+	return fieldnames
+
+class DownloadJob(object):
+	'''the images of one tissue in one HPA version, with their own output file, folder and manifest'''
+
+	def __init__(self,hpa_version,tissue,outfile,outdir):
+		self.hpa_version = hpa_version
+		self.tissue = tissue
+		self.outfile = outfile
+		self.outdir = outdir
+		self.outQ = None
+		self.manifest = None
+		self.entries = {}
+		self.duplicates = set()
+		self.counts = {'found' : 0, 'queued' : 0, 'stored' : 0}
+
+	def open(self,checksums=False):
+		if not os.path.exists(self.outdir):
+			os.makedirs(self.outdir)
+
+		#partial downloads left by an interrupted run are never complete images
+		removePartialImages(self.outdir)
+
+		#images that a previous run already finished will be skipped
+		self.manifest = DownloadManifest(manifestPath(self.outfile))
+		self.entries = self.manifest.load()
+
+		#the workers put their rows on a queue; a thread of its own writes them to the output FILE,
+		#and only then marks the images done in the manifest
+		self.outQ = ResultListener(self.outfile,prepareOutputFile(self.outfile,checksums),self.manifest)
+		self.outQ.start()
+
+		#find images in the outdir that are not from this download; those in the manifest that a previous
+		#run did not finish are downloaded again without asking (only files: the outdir may also hold
+		#the previews folder)
+		self.duplicates = set(x for x in os.listdir(self.outdir)
+			if os.path.isfile(os.path.join(self.outdir,x)) and x not in self.entries)
+
+	def close(self):
+		self.outQ.close()
+		self.manifest.close()
+
+class ResultListener(threading.Thread):
+	'''a queue of rows for the output file (put(row)), appended to it in batches by this thread;
+	call close() to write the last rows. With a manifest, each row (which must have the bytes and
+	sha1 of its image) is marked done once its batch is written and synced, so an image is never
+	done in the manifest without a row in the output file.'''
+
+	def __init__(self,filepath,fieldnames,manifest=None,batchSize=resultBatchSize,batchSeconds=resultBatchSeconds):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.filepath = filepath
+		self.fieldnames = fieldnames
+		self.manifest = manifest
+		self.batchSize = batchSize
+		self.batchSeconds = batchSeconds
+		self.q = queue.Queue()
+		self.rows = 0
+
+	def put(self,result):
+		self.q.put(result)
+
+	def close(self):
+		self.q.put(None)
+		self.join()
+
+	def run(self):
+		# there are some 2 v. 3 differences here to avoid extra blank lines
+		mode = 'a'
+		if (sys.version_info > (3, 0)):	
+			f = open(self.filepath,mode,newline='\n')
+		else:
+			f = open(self.filepath,mode+'b')
+		writer = csv.DictWriter(f, dialect='excel',fieldnames=self.fieldnames,extrasaction='ignore')
+		done = False
+		while not done:
+			# wait for a row, then take whatever else has arrived (up to a batch) before writing
+			batch = [self.q.get()]
+			deadline = time.time() + self.batchSeconds
+			while len(batch) < self.batchSize and batch[-1] is not None:
+				try:
+					batch.append(self.q.get(timeout=max(0,deadline - time.time())))
+				except queue.Empty:
+					break
+			if batch[-1] is None:
+				batch.pop()
+				done = True
+			writer.writerows(batch)
+			syncFile(f)
+			if self.manifest:
+				self.manifest.doneMany([(x['image_file'],x['bytes'],x['sha1']) for x in batch])
+			self.rows += len(batch)
+		f.close()
 
+class ErrorCount(object):
+	'''a count of errors shared by the threads of a pool'''
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.value = 0
+
+	def add(self):
+		with self.lock:
+			self.value += 1
+
+
+def queueImages(batches,entries,outdir,duplicate_images,overwrite_images,manifest,counts):
+	'''yields the images of each batch that need downloading, recording them in the manifest'''
+	for batch in batches:
+		counts['found'] += len(batch)
+		batch = resumeImages(batch,entries,outdir)
+		if not overwrite_images:
+			batch = [x for x in batch if x['image_file'] not in duplicate_images]
+		manifest.queue(batch)
+		counts['queued'] += len(batch)
+		logger.info('Queuing %s images for download' % len(batch))
+		for image in batch:
+			yield image
+
+def scheduleImages(jobs,batches,overwrite_images,store=None,previews=None,shared=None):
+	'''yields (job, image) for the images that need downloading, from (index of the job, images) batches;
+	with shared, images whose url another job is already downloading are held back (see SharedImages)'''
+	for index,batch in batches:
+		job = jobs[index]
+		images = queueImages([batch,],job.entries,job.outdir,job.duplicates,overwrite_images,job.manifest,job.counts)
+		if store:
+			images = takeFromStore(images,store,job.outdir,job.outQ,job.manifest,previews,job.counts)
+		for image in images:
+			if shared and not shared.claim(job,image):
+				continue
+			yield job,image
+
+class SharedImages(object):
+	'''the image urls being downloaded by this run, each with the (job, image) pairs of the other jobs
+	(e.g. another HPA version) that want the same url; those wait for the one download and are then
+	written from the store. Thread safe.'''
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.waiting = {} # image_url -> [(job, image), ...]
+
+	def claim(self,job,image):
+		'''True if the image is to be downloaded; False if another job is downloading its url, in which
+		case it waits for that download (see release)'''
+		with self.lock:
+			waiting = self.waiting.get(image['image_url'])
+			if waiting is None:
+				self.waiting[image['image_url']] = []
+				return True
+			waiting.append((job,image))
+			return False
+
+	def release(self,image):
+		'''the (job, image) pairs that were waiting for the download of image'''
+		with self.lock:
+			return self.waiting.pop(image['image_url'],[])
+
+def finishShared(shared,image,ok,store,errorCount,previews=None,limiter=None):
+	'''writes the images that waited for the download of image from the store; if that download
+	failed, they are downloaded instead, until one of them succeeds'''
+	waiting = shared.release(image)
+	while waiting and not ok:
+		job,other = waiting.pop(0)
+		ok = worker((other,job.outdir,job.outQ,errorCount,job.manifest,previews,store,limiter))
+	for job,other in waiting:
+		# takeFromStore yields the image back if it can not be taken from the store
+		for missing in takeFromStore([other,],store,job.outdir,job.outQ,job.manifest,previews,job.counts):
+			worker((missing,job.outdir,job.outQ,errorCount,job.manifest,previews,store,limiter))
+
+def readHeader(filepath):
+	with open(filepath,'r') as f:
+		return next(csv.reader(f),[])
+
+def takeFromStore(images,store,outdir,outQ,manifest,previews,counts):
+	'''yields the images that are not in the store; the others are made from the stored copy'''
+	for image in images:
+		imageWriter = None
+		try:
+			imageWriter = copyFromStore(store,image,outdir,manifest)
+		except Exception as e: # download it instead
+			logger.error('Could not take %s from the store: %s' % (image['image_file'],str(e)))
+		if imageWriter is None:
+			yield image
+			continue
+		counts['stored'] += 1
+		# the row is marked done in the manifest once it is in the output file
+		imageWriter.userComment['sha1'] = imageWriter.checksum()
+		imageWriter.userComment['bytes'] = imageWriter.bytes
+		outQ.put(imageWriter.userComment)
+		if previews:
+			previews.add(os.path.join(outdir,image['image_file']))
+
+def copyFromStore(store,image,outdir,manifest=None):
+	'''writes the image from the copy in the store, with this run's Exif user comment; returns
+	the ImageWriter, or None if the image has not been stored'''
+	blob = store.find(image['image_url'])
+	if blob is None:
+		return None
+	if manifest:
+		manifest.downloading(image['image_file'])
+	imageWriter = ImageWriter(os.path.join(outdir,image['image_file']),buildResult(image))
+	try:
+		with open(blob,'rb') as f:
+			for chunk in iter(lambda: f.read(chunkSize),b''):
+				imageWriter.write(chunk)
+		imageWriter.commit()
+	except Exception:
+		imageWriter.abort()
+		raise
+	# the same bytes as the stored copy (e.g. the same tissue again) become a link to it
+	store.add(imageWriter.imagePath,imageWriter.checksum(),image['image_url'])
+	return imageWriter
+
+def boundedMap(pool,func,iterable,limit):
+	'''like pool.imap_unordered, but takes no more than limit items from iterable ahead of the workers'''
+	slots = threading.BoundedSemaphore(limit)
+
+	def throttled():
+		for item in iterable:
+			slots.acquire()
+			yield item
+
+	def run(item):
+		try:
+			return func(item)
+		finally:
+			slots.release()
+
+	for x in pool.imap_unordered(run,throttled()):
+		pass
+
+def resumeImages(images,entries,outdir):
+	'''returns the images that still need downloading, given the manifest entries of previous runs'''
+	pending = [x for x in images if not isComplete(entries.get(x['image_file']),os.path.join(outdir,x['image_file']))]
+	if len(pending) < len(images):
+		logger.info('Resuming: %s images were already downloaded' % (len(images) - len(pending)))
+	return pending
 
 def worker(xxx_todo_changeme):
-	(image,outdir,outQ,errorCount) = xxx_todo_changeme
+	(image,outdir,outQ,errorCount,manifest,previews,store,limiter) = xxx_todo_changeme
 	logger.info('Downloading %s (%s)' % (image['image_url']
 		,image['ensg_id']))
 	try:
-		result = {}
-		result['hpa_version'] = image['version']
-		result['ensg_id'] = image['ensg_id']
-		result['tissue_or_cancer'] = image['tissue_or_cancer']
-		result['protein_url'] = 'deprecated'
-		result['image_url'] = image['image_url']
-		result['antibody'] = image['antibody_id']
-		result['image_file'] = image['image_file']
-		# download the image
-		downloadImage(image['image_url'],image['image_file'],outdir)
-		imagePath = os.path.join(outdir,result['image_file'])
-		# add the exif data to it
-		writeExifUserComment(imagePath,result)
-		# write the row to our output file
+		result = buildResult(image)
+		if manifest:
+			manifest.downloading(image['image_file'])
+		# download the image, adding the exif data to it on the way to disk
+		imageWriter = downloadImage(image['image_url'],image['image_file'],outdir,result,limiter)
+		if store:
+			store.add(imageWriter.imagePath,imageWriter.checksum(),image['image_url'])
+		# write the row to our output file; the ResultListener then marks it done in the manifest
+		result['sha1'] = imageWriter.checksum()
+		result['bytes'] = imageWriter.bytes
 		outQ.put(result)
+		if previews:
+			previews.add(os.path.join(outdir,image['image_file']))
+		return True
 
 	except KeyboardInterrupt: #handle a ctrl-c
 		print('Exiting')
 		sys.exit()
 	except Exception as e: # catch any errors & pass on the message
-		errorCount.value += 1
+		errorCount.add()
+		if manifest:
+			manifest.failed(image['image_file'])
 		message = '%s %s %s' % (image['ensg_id'],image['image_url'],str(e))
 		logger.error('Caught Exception: %s' % str(e))
 		logger.error(traceback.format_exc())
+		return False
 
-def downloadImage(imageUrl,image_name,outdir):
+def downloadImagesAsync(images,errorCount,maxInFlight,perHost,previews=None,store=None,onFinished=None,timeout=120):
+	'''downloads the (job, image) pairs in images using the asyncio engine; the results are the same as worker().
+	onFinished(job,image,ok) is called as each download ends.'''
+	# imported here so that the thread engine still works without python 3/aiohttp
+	from async_downloader import AsyncDownloader
+
+	# the downloader only sees the images; each is looked up here to find its job
+	jobOf = {}
+	lock = threading.Lock()
+
+	def imagesOnly():
+		for job,image in images:
+			with lock:
+				jobOf[id(image)] = job
+			yield image
+
+	def openWriter(image):
+		job = jobOf[id(image)]
+		if job.manifest:
+			job.manifest.downloading(image['image_file'])
+		return ImageWriter(os.path.join(job.outdir,image['image_file']),buildResult(image))
+
+	def fetched(image,imageWriter):
+		with lock:
+			job = jobOf.pop(id(image))
+		imageWriter.commit()
+		logger.info('Downloaded %s (%s)' % (image['image_url'],image['ensg_id']))
+		if store:
+			store.add(imageWriter.imagePath,imageWriter.checksum(),image['image_url'])
+		imageWriter.userComment['sha1'] = imageWriter.checksum()
+		imageWriter.userComment['bytes'] = imageWriter.bytes
+		job.outQ.put(imageWriter.userComment)
+		if previews:
+			previews.add(os.path.join(job.outdir,image['image_file']))
+		if onFinished:
+			onFinished(job,image,True)
+
+	def failed(image,e):
+		with lock:
+			job = jobOf.pop(id(image))
+		errorCount.add()
+		if job.manifest:
+			job.manifest.failed(image['image_file'])
+		logger.error('Caught Exception: %s for %s',str(e),image['image_url'])
+		if onFinished:
+			onFinished(job,image,False)
+
+	downloader = AsyncDownloader(maxInFlight=maxInFlight,perHost=perHost,timeout=timeout)
+	downloader.run(imagesOnly(),openWriter,fetched,failed)
+
+def buildResult(image):
+	'''maps the api image record to a row of the output file (and the Exif user comment)'''
+	result = {}
+	result['hpa_version'] = image['version']
+	result['ensg_id'] = image['ensg_id']
+	result['tissue_or_cancer'] = image['tissue_or_cancer']
+	result['protein_url'] = 'deprecated'
+	result['image_url'] = image['image_url']
+	result['antibody'] = image['antibody_id']
+	result['image_file'] = image['image_file']
+	return result
+
+def removePartialImages(outdir):
+	for file in os.listdir(outdir):
+		if file.endswith(partialSuffix):
+			logger.info('Removing partial download %s',file)
+			os.remove(os.path.join(outdir,file))
+
+def downloadImage(imageUrl,image_name,outdir,userComment=None,limiter=None):
 	MAX_ATTEMPTS = 10
 	attempts = 0
 	while attempts < MAX_ATTEMPTS:
 		try:
 			attempts += 1
-			image_data = urllib.request.urlopen(imageUrl).read()
-			# Open output file in binary mode, write, and close.
-			imagePath = os.path.join(outdir,image_name)
-			with open(imagePath,'wb') as fout:
-				fout.write(image_data)
+			imageWriter = ImageWriter(os.path.join(outdir,image_name),userComment)
+			try:
+				if limiter:
+					limiter.acquire()
+				try:
+					# stream the image to disk one chunk at a time
+					response = get_client().get(imageUrl,stream=True)
+					try:
+						response.raise_for_status()
+						for chunk in response.iter_content(chunkSize):
+							imageWriter.write(chunk)
+						checkContentLength(response,imageWriter.received)
+					finally:
+						response.close() # returns the connection to the pool
+					if limiter:
+						if wasThrottled(response):
+							limiter.congested()
+						else:
+							# the time to the response headers: how long the host kept the request
+							# waiting, whatever the size of the image
+							limiter.success(response.elapsed.total_seconds())
+				except Exception as e:
+					if limiter and isCongestion(e):
+						limiter.congested()
+					raise
+				finally:
+					# the host is done with the request; the commit is local
+					if limiter:
+						limiter.release()
+				imageWriter.commit()
+			except Exception:
+				imageWriter.abort()
+				raise
 			logger.info('Finished download for %s',image_name)
-			break
+			return imageWriter
 		except Exception as e: # catch any errors & pass on the message
 			# write the exception only if this is the last attempt; this may not work
-			print(attempts)
 			if attempts == MAX_ATTEMPTS:
 				logger.error('Caught Exception: %s for %s',str(e),imageUrl)
 				logger.error(traceback.format_exc())
-			time.sleep(1)
-
-def writeExifUserComment(imagePath,userCommentAsDict):
-	# read in the exif data, add the user comment as json, and write it
-	exif_dict = piexif.load(imagePath)
-	# convert the jason to proper encoding	
-	user_comment = piexif.helper.UserComment.dump(json.dumps(userCommentAsDict))
-	# pop it into the exif_dict
-	exif_dict["Exif"][piexif.ExifIFD.UserComment] = user_comment
-	# get the exif as bytes
-	exif_bytes = piexif.dump(exif_dict)
-	# insert the modified exif_bytes
-	piexif.insert(exif_bytes, imagePath)
+				raise
+			logger.info('Attempt %s failed for %s: %s',attempts,imageUrl,str(e))
+			time.sleep(backoffDelay(attempts))
+
+def wasThrottled(response):
+	'''True if the connection pool retried the request because the host was overloaded'''
+	retries = getattr(response.raw,'retries',None)
+	return any(isThrottled(x.status) for x in getattr(retries,'history',()))
+
+def isCongestion(e):
+	'''True if a failed request is a sign that the host is overloaded'''
+	if isinstance(e,(requests.exceptions.Timeout,requests.exceptions.ConnectionError)):
+		return True
+	response = getattr(e,'response',None)
+	return response is not None and isThrottled(response.status_code)
 
 def fileIsWriteable(filePath):
 	exists = os.path.exists(filePath)
@@ -259,20 +707,6 @@ def fileIsWriteable(filePath):
 		print(e)
 		return False
 
-def readProgress(filePath):
-	# open csv file
-	uniqueIds = []
-	with open(filePath, 'r') as f:
-		# get number of columns
-		for line in f.readlines():
-			id = line.split(',')[1]
-			if id not in uniqueIds:
-				uniqueIds.append(id)
-	#remove the last id on the list
-	if len(uniqueIds) > 0:
-		uniqueIds.pop()
-	return uniqueIds
-
 def query_yes_no(question, default="yes"):
 	"""Ask a yes/no question via raw_input() and return their answer.
 	see http://code.activestate.com/recipes/577058/"""
@@ -320,31 +754,67 @@ def parse_args():
 	parser = argparse.ArgumentParser()
 	parser.add_argument('in_file', help='Text file with Ensembl gene ids', type=str)
 	parser.add_argument('out_file', help='CSV file for results', type=str)
-	parser.add_argument('tissue', help='Tissue of interest', type=str)
+	parser.add_argument('tissue', help='Tissue of interest, or several tissues', type=str, nargs='+')
 	parser.add_argument('out_dir', help='Output directory for writing images', type=str)
-	parser.add_argument("-v", "--hpa_version", help='HPA version, valid options are 18 or 19',
-						type=int, choices=valid_hpa_versions, default=max(valid_hpa_versions))
+	parser.add_argument("-v", "--hpa_version", help='HPA version, or several versions, valid options are 18 or 19',
+						type=int, choices=valid_hpa_versions, nargs='+', default=[max(valid_hpa_versions),])
 	parser.add_argument("-w", "--workers", help='Number of workers to use, defaults to 3',
 						type=int, default=3)
-	return parser.parse_args()
+	parser.add_argument("-e", "--engine", help='Download engine, valid options are threads or asyncio, defaults to threads',
+						type=str, choices=valid_engines, default='threads')
+	parser.add_argument("--adaptive", help='threads engine: adjust the number of downloads in flight (from --workers up to --max_in_flight) to the image host',
+						action='store_true')
+	parser.add_argument("--max_in_flight", help='asyncio engine, or threads engine with --adaptive: maximum number of downloads in flight, defaults to 64',
+						type=int, default=64)
+	parser.add_argument("--per_host", help='asyncio engine: maximum number of connections per host, defaults to 8',
+						type=int, default=8)
+	parser.add_argument("--batch_size", help='Number of genes per api query for the image list, defaults to 500',
+						type=int, default=500)
+	parser.add_argument("--api_workers", help='Number of api queries for the image list to run at once, defaults to 4',
+						type=int, default=4)
+	parser.add_argument("--cache_size", help='Maximum size in MB of the on-disk cache of api responses, defaults to 512',
+						type=int, default=512)
+	parser.add_argument("--no_cache", help='Always query the api instead of using cached responses',
+						action='store_true')
+	parser.add_argument("--timeout", help='Seconds to wait for a response from the api or image server, defaults to 120',
+						type=int, default=120)
+	parser.add_argument("--retries", help='Number of times the connection retries a failed request (with backoff), defaults to 3',
+						type=int, default=3)
+	parser.add_argument("--order", help='Order of the downloads: interleave (the first image of every gene, then the second, ...), genes (gene by gene, in the order of the input file) or api, defaults to interleave',
+						type=str, choices=scheduleOrders, default='interleave')
+	parser.add_argument("--first_n", help='Download the first n images of every gene before any others',
+						type=int, default=None)
+	parser.add_argument("--store", help='Folder of a content-addressed image store shared between runs; images already in it are not downloaded again',
+						type=str, default=None)
+	parser.add_argument("--checksums", help='Add a sha1 column to the output file, with the checksum of each image (see verify_images.py)',
+						action='store_true')
+	parser.add_argument("--previews", help='Also make a reduced size preview of each image for the viewer and scorer (requires pygame)',
+						action='store_true')
+	args = parser.parse_args()
+	if args.adaptive and args.engine == 'asyncio':
+		parser.error('--adaptive only works with the threads engine; the asyncio engine is limited by --max_in_flight and --per_host')
+	return args
 
 if __name__ == '__main__':
 	args = parse_args()
 
 	# for convenience, copy these out of args
-	tissue = args.tissue
+	tissues = args.tissue
 	in_file = args.in_file
 	out_file = args.out_file
 	out_dir = args.out_dir
 	workers = args.workers
-	hpa_version = args.hpa_version
-
-	tissues = get_valid_tissues(hpa_version)
-
-	if tissue not in tissues:
-		print('The tissue %s is not a valid option.' % tissue)
-		print('Valid tissues are: %s' % ', '.join(tissues))
-		sys.exit()
+	hpa_versions = args.hpa_version
+	engine = args.engine
+
+	configure_cache(max_bytes=args.cache_size*1024*1024,enabled=not args.no_cache)
+	for hpa_version in hpa_versions:
+		valid_tissues = get_valid_tissues(hpa_version)
+		for tissue in tissues:
+			if tissue not in valid_tissues:
+				print('The tissue %s is not a valid option for HPA version %s.' % (tissue,hpa_version))
+				print('Valid tissues are: %s' % ', '.join(valid_tissues))
+				sys.exit()
 
 	if not os.path.isfile(in_file):
 		print('The input file %s does not exist.' % in_file)
@@ -359,18 +829,28 @@ if __name__ == '__main__':
 		print('Error creating directory %s' % out_dir)
 		sys.exit()
 
-	if not fileIsWriteable(out_file):
-		print('The output file %s is not writable -- is it open?' % out_file)
-		sys.exit()
+	# with more than one tissue or version, each has an output file of its own
+	several = len(tissues) * len(hpa_versions) > 1
+	out_files = [jobPaths(out_file,out_dir,v,t,several)[0] for v in hpa_versions for t in tissues]
+	for path in out_files:
+		if not fileIsWriteable(path):
+			print('The output file %s is not writable -- is it open?' % path)
+			sys.exit()
 
 	create = True
 	skip = []
-	if os.path.exists(out_file):
+	existing = [x for x in out_files if os.path.exists(x)]
+	if existing:
 		create = False
-		print('The output file %s exists.' % out_file)
+		for path in existing:
+			print('The output file %s exists.' % path)
 		overwrite = query_yes_no('Overwrite?',default="no")
 		if overwrite:
-			os.remove(out_file)
+			for path in existing:
+				os.remove(path)
+				# the manifest describes the old file; start over
+				if os.path.exists(manifestPath(path)):
+					os.remove(manifestPath(path))
 			create = True
 		else:
 			append = query_yes_no('Append the file (or n to quit)?',default="yes")
@@ -380,4 +860,4 @@ if __name__ == '__main__':
 
 	#logger.info(hpa_version,in_file,out_file,tissue,out_dir,create,skip,workers)
 	logger.info(in_file)
-	main(hpa_version,in_file,out_file,tissue,out_dir,create,skip,workers)
+	main(hpa_versions,in_file,out_file,tissues,out_dir,create,skip,workers,engine,args.max_in_flight,args.per_host,args.timeout,args.retries,args.batch_size,args.api_workers,args.previews,args.store,args.adaptive,args.checksums,args.order,args.first_n)
@@ -0,0 +1,120 @@
+"""download_manifest.py: a durable record of the state of each image in a download, used by download_images_from_gene_list.py to resume an interrupted run.
+
+The manifest is a SQLite database kept next to the output CSV file with one row per image:
+
+	image_file: the name of the image file
+	image_url: the HPA url the image is downloaded from
+	ensg_id: the Ensembl gene id
+	state: queued, downloading, done or failed
+	bytes: the size of the image file when done
+	checksum: the sha1 of the image file when done
+	attempts: the number of times the image has been started
+
+A restarted run reads the whole manifest once and re-fetches only images that are not done, or whose file is missing or has the wrong size.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+# 10-18-2026 TC added doneMany
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import os
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+
+QUEUED = 'queued'
+DOWNLOADING = 'downloading'
+DONE = 'done'
+FAILED = 'failed'
+
+ManifestEntry = namedtuple('ManifestEntry',['state','bytes','checksum'])
+
+def manifestPath(outfile):
+	'''the manifest for an output CSV file lives next to it'''
+	return outfile + '.manifest.db'
+
+class DownloadManifest(object):
+	'''tracks the state of each image; safe to share between the threads of a pool'''
+
+	def __init__(self,path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.db = sqlite3.connect(path,check_same_thread=False)
+		# the write-ahead log makes each state change an append rather than a page rewrite
+		self.db.execute('PRAGMA journal_mode=WAL')
+		self.db.execute('PRAGMA synchronous=NORMAL')
+		self.db.execute('''CREATE TABLE IF NOT EXISTS images (
+			image_file TEXT PRIMARY KEY,
+			image_url TEXT,
+			ensg_id TEXT,
+			state TEXT,
+			bytes INTEGER,
+			checksum TEXT,
+			attempts INTEGER DEFAULT 0,
+			updated REAL)''')
+		self.db.commit()
+
+	def load(self):
+		'''returns a dict of image_file -> ManifestEntry for every image in the manifest'''
+		with self.lock:
+			rows = self.db.execute('SELECT image_file,state,bytes,checksum FROM images')
+			return dict((row[0],ManifestEntry(row[1],row[2],row[3])) for row in rows)
+
+	def queue(self,images):
+		'''records a list of api image records as queued, in one transaction'''
+		now = time.time()
+		with self.lock:
+			self.db.executemany('''INSERT OR REPLACE INTO images (image_file,image_url,ensg_id,state,updated)
+				VALUES (?,?,?,?,?)''',
+				[(x['image_file'],x['image_url'],x['ensg_id'],QUEUED,now) for x in images])
+			self.db.commit()
+
+	def downloading(self,image_file):
+		self._update('UPDATE images SET state=?,attempts=attempts+1,updated=? WHERE image_file=?',
+			(DOWNLOADING,time.time(),image_file))
+
+	def done(self,image_file,bytes,checksum):
+		self._update('UPDATE images SET state=?,bytes=?,checksum=?,updated=? WHERE image_file=?',
+			(DONE,bytes,checksum,time.time(),image_file))
+
+	def doneMany(self,images):
+		'''records a list of (image_file, bytes, checksum) as done, in one transaction'''
+		now = time.time()
+		with self.lock:
+			self.db.executemany('UPDATE images SET state=?,bytes=?,checksum=?,updated=? WHERE image_file=?',
+				[(DONE,bytes,checksum,now,image_file) for image_file,bytes,checksum in images])
+			self.db.commit()
+
+	def failed(self,image_file):
+		self._update('UPDATE images SET state=?,updated=? WHERE image_file=?',
+			(FAILED,time.time(),image_file))
+
+	def _update(self,sql,params):
+		with self.lock:
+			self.db.execute(sql,params)
+			self.db.commit()
+
+	def close(self):
+		with self.lock:
+			self.db.close()
+
+def isComplete(entry,imagePath):
+	'''True if the manifest says the image is done and the file on disk agrees'''
+	if entry is None or entry.state != DONE:
+		return False
+	try:
+		return os.path.getsize(imagePath) == entry.bytes
+	except OSError: # the file is missing
+		return False
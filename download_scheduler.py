@@ -0,0 +1,195 @@
+"""download_scheduler.py: the order in which download_images_from_gene_list.py downloads images, and its progress per gene
+
+The api returns the images of each batch of genes gene by gene, so downloading them in that order lets a gene with hundreds of images hold up every gene after it, and a run that is stopped part way has all the images of some genes and none of the others. A DownloadScheduler takes the images as they arrive from the api (on a thread of its own, so the api queries are never waiting for the downloads) and hands them to the workers best first, among the images that have arrived so far. No more than window images are held at once; beyond that, the api queries wait for the downloads to catch up, so the order is decided within the window:
+
+	interleave: the first image of every gene (in the order of the input file), then the second image of every gene, and so on (the default)
+	genes: every image of the first gene in the input file, then every image of the second gene, and so on
+	api: in the order they arrive from the api (the old behavior)
+
+With firstN, the first firstN images of every gene come before any other image, in the same order. With more than one tissue or HPA version, the same gene in each is a gene of its own, so they are interleaved too.
+
+The scheduler counts the images of each gene that have been downloaded (or have failed) as the workers finish them, logs the progress every progressSeconds, and writes it to a csv next to each output file (<output file>.progress.csv: ensg_id, images, downloaded, failed, complete), so the genes that are complete can be screened while the run goes on. Only the images downloaded by this run are counted; images already downloaded by an earlier run, or taken from an image store, are not.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+# 10-18-2026 TC no more than window images are taken ahead of the workers
+# 10-18-2026 TC uses replaceFile from image_writer.py
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import os
+import sys
+import csv
+import time
+import heapq
+import logging
+import threading
+
+from image_writer import replaceFile
+
+logger = logging.getLogger(__name__)
+
+scheduleOrders = ['interleave','genes','api']
+progressSuffix = '.progress.csv'
+progressFields = ['ensg_id','images','downloaded','failed','complete']
+scheduleWindow = 5000 # images held for ordering, about ten api batches of 500 genes
+
+def progressPath(outfile):
+	return outfile + progressSuffix
+
+class GeneProgress(object):
+	'''the images of one gene (in one download job) and how many are finished'''
+	def __init__(self):
+		self.images = 0
+		self.downloaded = 0
+		self.failed = 0
+
+	def complete(self):
+		return self.downloaded == self.images
+
+class DownloadScheduler(object):
+	'''orders (job, image) pairs for the workers (see schedule) and keeps the progress of each gene;
+	call finished(job,image,ok) as each download ends. Thread safe.'''
+
+	def __init__(self,geneList,order='interleave',firstN=None,progressSeconds=30.0,window=scheduleWindow):
+		if order not in scheduleOrders:
+			raise ValueError('unknown schedule order %s' % order)
+		self.order = order
+		self.firstN = firstN
+		self.progressSeconds = progressSeconds
+		self.window = window
+		self.rank = {}
+		for gene in geneList:
+			self.rank.setdefault(gene,len(self.rank))
+		self.cond = threading.Condition()
+		self.heap = []
+		self.fed = False # every image has arrived
+		self.closed = False # the workers want no more images
+		self.error = None
+		self.arrived = 0
+		self.jobs = [] # in the order their first image arrived
+		self.genes = {} # job -> {ensg_id : GeneProgress}
+		self.lastReport = time.time()
+
+	def schedule(self,items):
+		'''yields the (job, image) pairs of items, the best first of those that have arrived'''
+		feeder = threading.Thread(target=self._feed,args=(items,))
+		feeder.daemon = True
+		feeder.start()
+		try:
+			while True:
+				with self.cond:
+					while not self.heap and not self.fed:
+						self.cond.wait()
+					if not self.heap:
+						break
+					key,job,image = heapq.heappop(self.heap)
+					self.cond.notify_all() # there is room for another image
+				yield job,image
+		finally:
+			# if the workers stop early, the feeder must not wait for room forever
+			with self.cond:
+				self.closed = True
+				self.cond.notify_all()
+		feeder.join()
+		if self.error is not None:
+			raise self.error
+
+	def finished(self,job,image,ok):
+		with self.cond:
+			progress = self.genes[job][image['ensg_id']]
+			if ok:
+				progress.downloaded += 1
+			else:
+				progress.failed += 1
+			report = time.time() - self.lastReport >= self.progressSeconds
+			if report:
+				self.lastReport = time.time()
+		if report:
+			self.report()
+
+	def report(self):
+		'''logs the progress so far and writes the progress file of each job'''
+		with self.cond:
+			genes = [x for job in self.jobs for x in self.genes[job].values()]
+			images = sum(x.images for x in genes)
+			downloaded = sum(x.downloaded for x in genes)
+			failed = sum(x.failed for x in genes)
+			complete = sum(1 for x in genes if x.complete())
+			started = sum(1 for x in genes if x.downloaded)
+			jobs = [(job,self._rows(job)) for job in self.jobs]
+		logger.info('Progress: %s of %s images downloaded (%s failed); %s of %s genes complete, %s with at least one image' % (
+			downloaded,images,failed,complete,len(genes),started))
+		for job,rows in jobs:
+			if job.outfile:
+				writeProgress(progressPath(job.outfile),rows)
+
+	def _rows(self,job):
+		'''the progress rows of a job, in the order of the gene list; the lock must be held'''
+		genes = sorted(self.genes[job].items(),key=lambda x: (self.rank.get(x[0],len(self.rank)),x[0]))
+		return [{'ensg_id' : gene, 'images' : x.images, 'downloaded' : x.downloaded, 'failed' : x.failed,
+			'complete' : 'TRUE' if x.complete() else 'FALSE'} for gene,x in genes]
+
+	def _feed(self,items):
+		try:
+			for job,image in items:
+				with self.cond:
+					while len(self.heap) >= self.window and not self.closed:
+						self.cond.wait()
+					if self.closed:
+						break
+					if job not in self.genes:
+						self.jobs.append(job)
+						self.genes[job] = {}
+					progress = self.genes[job].setdefault(image['ensg_id'],GeneProgress())
+					heapq.heappush(self.heap,(self._key(job,image,progress.images),job,image))
+					progress.images += 1
+					self.arrived += 1
+					self.cond.notify_all()
+		except Exception as e: # raised to the consumer once the images that did arrive are scheduled
+			self.error = e
+		finally:
+			with self.cond:
+				self.fed = True
+				self.cond.notify_all()
+
+	def _key(self,job,image,index):
+		'''the priority of the index'th image of its gene (the lowest is downloaded first); the
+		arrival number last, so that no two are equal'''
+		gene = self.rank.get(image['ensg_id'],len(self.rank))
+		jobIndex = self.jobs.index(job)
+		if self.order == 'interleave':
+			key = (index,gene,jobIndex,self.arrived)
+		elif self.order == 'genes':
+			key = (gene,jobIndex,index,self.arrived)
+		else:
+			key = (self.arrived,)
+		if self.firstN is not None:
+			key = (index >= self.firstN,) + key
+		return key
+
+def writeProgress(path,rows):
+	'''writes the progress rows to path, replacing it in one step'''
+	tmp = path + '.tmp'
+	# there are some 2 v. 3 differences here to avoid extra blank lines
+	if (sys.version_info > (3, 0)):
+		f = open(tmp,'w',newline='')
+	else:
+		f = open(tmp,'wb')
+	try:
+		writer = csv.DictWriter(f, dialect='excel',fieldnames=progressFields)
+		writer.writeheader()
+		writer.writerows(rows)
+	finally:
+		f.close()
+	replaceFile(tmp,path)
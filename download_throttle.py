@@ -0,0 +1,124 @@
+"""download_throttle.py: adaptive concurrency and retry backoff for download_images_from_gene_list.py
+
+With a fixed number of workers the downloader either leaves bandwidth unused or pushes the image host into errors. With --adaptive, the thread engine runs up to --max_in_flight threads, but each download first takes a slot from an AdaptiveLimit, whose limit is adjusted as the downloads finish in the manner of TCP congestion control (AIMD): until the first sign of congestion each success adds 1 to the limit (doubling it every round of downloads, "slow start"), after that each success adds 1/limit (about one more download in flight per round of downloads). The latency (the time to the response headers, so it does not depend on the size of the image) is compared with the best seen recently, as in TCP Vegas: requests start to queue at the server before it rejects any, so the limit only grows while the latency is below latencyLow times the best, is held up to latencyHigh times, and shrinks by 1 a round of downloads beyond that. A rate limit or server error (429, 5xx), a timeout, or a latency above latencyTolerance times the best multiplies it by decreaseFactor, at most once per round trip.
+
+Failed attempts are retried after backoffDelay, an exponential backoff with full jitter, so that retries from many workers do not arrive at the host together.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+# 10-18-2026 TC the best latency drifts up toward the current one, so one fast start does not set it for the whole run
+# 10-18-2026 TC the limit stops growing once the latency rises a little above the best, before the host rejects requests
+# 10-18-2026 TC a best latency of 0 (e.g. a cached response) no longer divides by zero
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import time
+import random
+import threading
+
+throttleStatuses = (429,500,502,503,504) # responses that mean the host is overloaded
+decreaseFactor = 0.7
+latencyTolerance = 2.0 # latency (smoothed) above this multiple of the best is treated as congestion
+latencyLow = 1.2 # below this multiple of the best latency, the limit grows
+latencyHigh = 1.5 # above this multiple (and up to latencyTolerance), it shrinks by 1 a round of downloads
+latencySmoothing = 0.2 # weight of each new latency in the smoothed latency
+latencyMemory = 30.0 # seconds; the best latency moves toward the smoothed latency over about this long
+
+def backoffDelay(attempt,base=0.5,cap=30.0):
+	'''seconds to wait before retrying after attempt (1, 2, ...) failed: a random time up to
+	base * 2^(attempt-1), capped at cap (exponential backoff with full jitter)'''
+	return random.uniform(0,min(cap,base * 2 ** (attempt - 1)))
+
+def isThrottled(status):
+	return status in throttleStatuses
+
+class AdaptiveLimit(object):
+	'''a semaphore whose limit follows the host's responses (AIMD); use it around each request,
+	then call success(latency) or congested(). Thread safe.'''
+
+	def __init__(self,initial=4,minimum=1,maximum=64):
+		self.minimum = minimum
+		self.maximum = maximum
+		self.limit = float(max(minimum,min(maximum,initial)))
+		self.inFlight = 0
+		self.cond = threading.Condition()
+		self.bestLatency = None
+		self.latency = None # smoothed
+		self.lastSuccess = None
+		self.slowStart = True # until the first sign of congestion
+		self.lastDecrease = 0.0
+		self.successes = 0
+		self.congestions = 0
+		self.decreases = 0
+
+	def acquire(self):
+		with self.cond:
+			while self.inFlight >= int(self.limit):
+				self.cond.wait()
+			self.inFlight += 1
+
+	def release(self):
+		with self.cond:
+			self.inFlight -= 1
+			self.cond.notify()
+
+	def __enter__(self):
+		self.acquire()
+		return self
+
+	def __exit__(self,*exc):
+		self.release()
+
+	def success(self,latency):
+		with self.cond:
+			self.successes += 1
+			if self.latency is None:
+				self.latency = latency
+			else:
+				self.latency += latencySmoothing * (latency - self.latency)
+			now = time.time()
+			if self.bestLatency is None or self.latency < self.bestLatency:
+				self.bestLatency = self.latency
+			else:
+				# the host may simply have become slower; the best latency is only kept for a while
+				self.bestLatency += min(1.0,(now - self.lastSuccess) / latencyMemory) * (self.latency - self.bestLatency)
+			self.lastSuccess = now
+			# requests start to queue at the host before it rejects any, and the latency shows it:
+			# the limit is held where the latency is a little above the best (as in TCP Vegas)
+			ratio = self.latency / max(self.bestLatency,1e-6) # a cached or local response may take no time at all
+			if ratio > latencyTolerance:
+				self._decrease()
+			elif ratio > latencyHigh:
+				self.slowStart = False
+				self.limit = max(self.minimum,self.limit - 1 / self.limit)
+			elif ratio < latencyLow:
+				if self.slowStart:
+					self.limit = min(self.maximum,self.limit + 1)
+				else:
+					self.limit = min(self.maximum,self.limit + 1 / self.limit)
+				self.cond.notify_all()
+
+	def congested(self):
+		with self.cond:
+			self.congestions += 1
+			self._decrease()
+
+	def _decrease(self):
+		now = time.time()
+		# the requests of one round trip all see the same congestion; count it once
+		if now - self.lastDecrease < (self.latency or 0):
+			return
+		self.limit = max(self.minimum,self.limit * decreaseFactor)
+		self.slowStart = False
+		self.lastDecrease = now
+		self.decreases += 1
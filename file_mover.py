@@ -0,0 +1,207 @@
+"""file_mover.py: moves many files at once, with a log so that an interrupted run can be resumed or rolled back
+
+move_images_by_selected.py used to call shutil.move (and print) for one file at a time. A BulkMover first writes the whole list of moves to a move log (.hpasubc_moves.log in the source folder) and syncs it; nothing is moved before the log is safely on disk. Moves within a filesystem are a plain os.rename, which only changes directory entries. Moves to another filesystem are done by a pool of threads, each copying the file to a temporary name in the destination folder, renaming it into place and only then removing the source, so a file is never only half in one place. The log is removed once every move has been done.
+
+If a run is interrupted, the state of each move can be told from the files themselves (source, destination or both), so the log is all that is needed to finish the moves (resume) or to put every file back where it was (rollback). Both first remove the temporary copies left by copies that were cut short.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+# 10-18-2026 TC uses replaceFile from image_writer.py
+# 10-18-2026 TC resume and rollback remove the temporary copies of an interrupted run
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import os
+import json
+import time
+import errno
+import shutil
+import threading
+from multiprocessing.dummy import Pool as ThreadPool
+
+from image_writer import replaceFile
+
+moveLogName = '.hpasubc_moves.log'
+moveLogVersion = 1
+tmpPrefix = '.tmp_'
+
+def moveLogPath(indir):
+	return os.path.join(indir,moveLogName)
+
+def writeMoveLog(path,moves):
+	'''writes the (source, destination) pairs to the move log and syncs it'''
+	tmp = path + '.tmp'
+	with open(tmp,'w') as f:
+		f.write(json.dumps({'version' : moveLogVersion}) + '\n')
+		for src,dest in moves:
+			f.write(json.dumps([src,dest]) + '\n')
+		f.flush()
+		os.fsync(f.fileno())
+	replaceFile(tmp,path)
+
+def readMoveLog(path):
+	'''the (source, destination) pairs in a move log'''
+	with open(path,'r') as f:
+		header = json.loads(f.readline())
+		if header.get('version') != moveLogVersion:
+			raise ValueError('%s was written by a different version of this script' % path)
+		return [tuple(json.loads(line)) for line in f if line.strip()]
+
+def sameFilesystem(a,b):
+	return os.stat(a).st_dev == os.stat(b).st_dev
+
+def tmpPath(dest):
+	destdir,name = os.path.split(dest)
+	return os.path.join(destdir,tmpPrefix + name)
+
+def copyFile(src,dest):
+	'''copies src next to dest, renames it into place, then removes src'''
+	tmp = tmpPath(dest)
+	shutil.copy2(src,tmp)
+	os.rename(tmp,dest)
+	os.remove(src)
+
+def removePartialCopies(moves):
+	'''removes the temporary copies left by copies (in either direction) that were cut short; returns
+	how many there were'''
+	names = {} # folder -> the names in the moves that a copy may have been made to
+	for src,dest in moves:
+		for path in (src,dest):
+			folder,name = os.path.split(path)
+			names.setdefault(folder,set()).add(tmpPrefix + name)
+	removed = 0
+	for folder,tmpNames in names.items():
+		try:
+			found = [x for x in os.listdir(folder) if x in tmpNames]
+		except OSError: # the folder is gone
+			continue
+		for name in found:
+			os.remove(os.path.join(folder,name))
+			removed += 1
+	return removed
+
+def moveFile(src,dest,rename=True,fresh=False):
+	'''moves src to dest, picking up a move that was cut short unless fresh (dest is known not
+	to exist); returns 'renamed', 'copied' or 'finished' '''
+	if not fresh and os.path.exists(dest):
+		if not os.path.exists(src):
+			return 'finished' # done by an earlier run
+		if os.path.getsize(src) != os.path.getsize(dest):
+			raise OSError(errno.EEXIST,'a different file is already there',dest)
+		os.remove(src) # copied by an earlier run, but the source was not removed
+		return 'finished'
+	if rename:
+		try:
+			os.rename(src,dest)
+			return 'renamed'
+		except OSError as e:
+			if e.errno != errno.EXDEV:
+				raise
+	copyFile(src,dest)
+	return 'copied'
+
+class BulkMover(object):
+	'''moves a list of (source, destination) pairs, logged in logPath, using copy threads
+	across filesystems; the destination folders must exist'''
+
+	def __init__(self,logPath,workers=8):
+		self.logPath = logPath
+		self.workers = workers
+		self.lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		self.counts = {'renamed' : 0, 'copied' : 0, 'finished' : 0}
+		self.bytesCopied = 0
+		self.failed = [] # (source, destination, message)
+		self.skipped = [] # (source, destination), the destination already existed
+		self.elapsed = 0.0
+
+	def hasLog(self):
+		return os.path.exists(self.logPath)
+
+	def move(self,moves):
+		'''logs, then makes the moves; a file whose destination already exists is left where it
+		is (see skipped). Returns False if any move failed, and the log is kept.'''
+		self.reset()
+		existing = {} # destination folder -> the names in it, listed once rather than a stat per file
+		todo = []
+		for src,dest in moves:
+			destdir,name = os.path.split(dest)
+			if destdir not in existing:
+				existing[destdir] = set(os.listdir(destdir))
+			if name in existing[destdir]:
+				self.skipped.append((src,dest))
+			else:
+				todo.append((src,dest))
+		if not todo:
+			return True
+		writeMoveLog(self.logPath,todo)
+		return self._run(todo,True)
+
+	def resume(self):
+		'''finishes the moves in the log'''
+		self.reset()
+		moves = readMoveLog(self.logPath)
+		removePartialCopies(moves)
+		return self._run(moves)
+
+	def rollback(self):
+		'''puts every file in the log back where it was'''
+		self.reset()
+		moves = readMoveLog(self.logPath)
+		removePartialCopies(moves)
+		return self._run([(dest,src) for src,dest in moves])
+
+	def rate(self):
+		'''files per second for the last run'''
+		return sum(self.counts.values()) / max(self.elapsed,1e-6)
+
+	def _run(self,moves,fresh=False):
+		start = time.time()
+		local = {} # destination folder -> on the same filesystem as the source?
+		copies = []
+		for src,dest in moves:
+			key = (os.path.dirname(src),os.path.dirname(dest))
+			if key not in local:
+				try:
+					local[key] = sameFilesystem(*key)
+				except OSError:
+					local[key] = False
+			if local[key]:
+				self._move(src,dest,True,fresh)
+			else:
+				copies.append((src,dest))
+		if copies:
+			pool = ThreadPool(self.workers)
+			try:
+				pool.map(lambda pair: self._move(pair[0],pair[1],False,fresh),copies,chunksize=64)
+			finally:
+				pool.close()
+				pool.join()
+		self.elapsed = time.time() - start
+		if not self.failed:
+			os.remove(self.logPath)
+			return True
+		return False
+
+	def _move(self,src,dest,rename,fresh):
+		try:
+			how = moveFile(src,dest,rename,fresh)
+			size = os.path.getsize(dest) if how == 'copied' else 0
+			with self.lock:
+				self.counts[how] += 1
+				self.bytesCopied += size
+		except (OSError, IOError) as e:
+			with self.lock:
+				self.failed.append((src,dest,str(e)))
@@ -0,0 +1,198 @@
+"""image_cache.py: background decoding of images for image_viewer.py and image_scorer.py
+
+Decoding a full size HPA JPEG takes long enough to make each step through a folder stall. An ImagePrefetcher decodes the next few (and previous few) images in a background thread into a SurfaceCache, a least recently used cache of pygame surfaces whose size is limited in bytes, so that stepping to a neighboring image is usually just a cache lookup.
+
+With pyramids=True the prefetcher works with image pyramids (image_pyramid) instead of whole images: the background thread makes the pyramids of the neighboring images if they do not exist yet and decodes the tiles of their first view at the current zoom, and get() returns a TiledImage whose tiles come from the same cache.
+
+With previews=True, images that have a preview (image_preview) are decoded from the preview, which is all that is needed up to the zoom the preview was made at; get() returns a PreviewedImage, which decodes the full size image only when zoomed in further.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+# 10-18-2026 TC added the pyramids option
+# 10-18-2026 TC added the previews option
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import threading
+from collections import OrderedDict
+
+import pygame
+
+from image_pyramid import ImagePyramid, TiledImage, levelFor, levelScale
+from image_preview import PreviewedImage, hasPreview, sourceFor
+
+def surfaceBytes(surf):
+	return surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+def isDisplayFormat(surf):
+	'''True if surf already has the pixel format of the display, i.e. convert() would be a copy'''
+	display = pygame.display.get_surface()
+	return display is not None and surf.get_bitsize() == display.get_bitsize() and surf.get_masks() == display.get_masks()
+
+class SurfaceCache(object):
+	'''a thread safe LRU cache of surfaces keyed by path, holding at most maxBytes of pixels'''
+
+	def __init__(self,maxBytes):
+		self.maxBytes = maxBytes
+		self.bytes = 0
+		self.surfaces = OrderedDict()
+		self.lock = threading.Lock()
+
+	def get(self,key):
+		with self.lock:
+			surf = self.surfaces.pop(key,None)
+			if surf is not None:
+				self.surfaces[key] = surf # most recently used goes to the end
+			return surf
+
+	def __contains__(self,key):
+		with self.lock:
+			return key in self.surfaces
+
+	def put(self,key,surf):
+		with self.lock:
+			old = self.surfaces.pop(key,None)
+			if old is not None:
+				self.bytes -= surfaceBytes(old)
+			self.surfaces[key] = surf
+			self.bytes += surfaceBytes(surf)
+			# evict the least recently used, but never the surface just added
+			while self.bytes > self.maxBytes and len(self.surfaces) > 1:
+				k,evicted = self.surfaces.popitem(last=False)
+				self.bytes -= surfaceBytes(evicted)
+
+class ImagePrefetcher(object):
+	'''decodes the images around the current position in a list of paths in a background thread.
+
+	Call moveTo(i) whenever the current image changes and get(i) to fetch a surface; get()
+	decodes synchronously if the image has not been prefetched yet. The display must be
+	initialized (set_mode) before the prefetcher is created.
+
+	With pyramids=True, get(i) returns a TiledImage instead; set scale to the current zoom
+	so that the right tiles are prefetched, and viewSize to the largest view (window) size.
+	With previews=True, get(i) returns a PreviewedImage for images that have a preview; set
+	scale as well, so that full size images are prefetched when zoomed in.'''
+
+	def __init__(self,paths,ahead=3,behind=1,maxBytes=512*1024*1024,pyramids=False,scale=1.0,viewSize=(1024,1024),previews=False):
+		self.paths = paths
+		self.ahead = ahead
+		self.behind = behind
+		self.cache = SurfaceCache(maxBytes)
+		self.pyramids = pyramids
+		self.previews = previews
+		self.scale = scale
+		self.viewSize = viewSize
+		self.building = threading.Lock() # one pyramid is built at a time, by either thread
+		self.views = {} # path -> TiledImage or PreviewedImage, so the same image is the same object
+		# the background thread converts to the pixel format of this surface, never touching the display
+		self.format = pygame.Surface((1,1)).convert()
+		self.position = 0
+		self.running = True
+		self.changed = threading.Condition()
+		self.thread = threading.Thread(target=self._run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def moveTo(self,i):
+		with self.changed:
+			self.position = i
+			self.changed.notify()
+
+	def get(self,i):
+		'''returns the image at i as a surface converted to the display format'''
+		path = self.paths[i]
+		if self.pyramids or (self.previews and hasPreview(path)):
+			image = self.views.get(path)
+			if image is None:
+				if self.pyramids:
+					image = TiledImage(self.pyramid(path),self.loadSurface)
+				else:
+					image = PreviewedImage(path,self.loadSurface)
+				self.views[path] = image
+			self.moveTo(i)
+			return image
+		surf = self.cache.get(path)
+		if surf is None:
+			surf = pygame.image.load(path)
+		if not isDisplayFormat(surf):
+			# keep the converted copy
+			surf = surf.convert()
+			self.cache.put(path,surf)
+		self.moveTo(i)
+		return surf
+
+	def pyramid(self,path):
+		'''the image's pyramid, built first if need be'''
+		pyramid = ImagePyramid(path)
+		if not pyramid.isBuilt():
+			with self.building:
+				pyramid = ImagePyramid(path) # the other thread may have just built it
+				if not pyramid.isBuilt():
+					pyramid.build()
+		return pyramid
+
+	def loadSurface(self,path):
+		'''the decoded image, tile or preview at path, from the cache if it is there'''
+		surf = self.cache.get(path)
+		if surf is None:
+			surf = pygame.image.load(path).convert(self.format)
+			self.cache.put(path,surf)
+		return surf
+
+	def firstView(self,path):
+		'''the tiles shown when the image at path is first viewed at the current zoom'''
+		pyramid = self.pyramid(path)
+		level = levelFor(self.scale,pyramid.levels())
+		residual = self.scale / levelScale(level)
+		area = pygame.Rect(0,0,int(self.viewSize[0]/residual),int(self.viewSize[1]/residual))
+		return [x[0] for x in pyramid.tilesIn(level,area)]
+
+	def stop(self):
+		with self.changed:
+			self.running = False
+			self.changed.notify()
+
+	def _wanted(self,i):
+		'''the paths to have ready, nearest (and forward) first'''
+		order = [i]
+		for step in range(1,max(self.ahead,self.behind)+1):
+			if step <= self.ahead and i + step < len(self.paths):
+				order.append(i + step)
+			if step <= self.behind and i - step >= 0:
+				order.append(i - step)
+		return [self.paths[x] for x in order]
+
+	def _run(self):
+		while True:
+			with self.changed:
+				if not self.running:
+					return
+				position = self.position
+			for path in self._wanted(position):
+				if self.position != position or not self.running:
+					break # the user moved on; start again from the new position
+				try:
+					if self.pyramids:
+						for tile in self.firstView(path):
+							if tile not in self.cache:
+								self.loadSurface(tile)
+					elif self.previews and hasPreview(path):
+						self.loadSurface(sourceFor(path,self.scale))
+					elif path not in self.cache:
+						self.cache.put(path,pygame.image.load(path).convert(self.format))
+				except Exception as e: # a bad file is reported when it is shown
+					pass
+			else:
+				with self.changed:
+					if self.position == position and self.running:
+						self.changed.wait()
@@ -0,0 +1,158 @@
+"""image_grid.py: the contact sheet (grid) mode of image_viewer.py
+
+For a first pass through thousands of images, image_viewer.py --grid shows a page of columns x rows thumbnails at a time instead of one image. A ThumbnailLoader decodes the thumbnails in a pool of threads (pygame releases the GIL while it decodes and scales) into a SurfaceCache, and is asked for the next and previous pages as well as the current one, so that flipping a page is usually just a matter of drawing. Thumbnails are made from the previews written by the download script (image_preview) where there are any, otherwise from the full size images. A ContactSheet draws a page, marking the selected images and the cursor.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import threading
+from multiprocessing.dummy import Pool as ThreadPool
+
+import pygame
+
+from image_cache import SurfaceCache
+from image_preview import hasPreview, previewPath
+from image_render import getFont, titleColor
+
+thumbnailEvent = pygame.USEREVENT + 1 # posted when a thumbnail has been decoded
+cellMargin = 4
+titleBar = 30 # height of the title above the thumbnails
+labelSize = 24
+cursorColor = (255, 255, 0)
+selectedColor = titleColor
+emptyColor = (40, 40, 40)
+
+def loadThumbnail(path,size,format):
+	'''the image at path (or its preview) scaled to fit in size x size pixels'''
+	if hasPreview(path):
+		path = previewPath(path)
+	image = pygame.image.load(path)
+	(w,h) = image.get_size()
+	factor = min(size/w,size/h)
+	thumbSize = (max(1,int(w*factor)),max(1,int(h*factor)))
+	if image.get_bitsize() in (24,32):
+		thumb = pygame.transform.smoothscale(image,thumbSize)
+	else:
+		thumb = pygame.transform.scale(image,thumbSize)
+	return thumb.convert(format)
+
+class ThumbnailLoader(object):
+	'''decodes the thumbnails of a list of paths in a pool of threads, posting a thumbnailEvent
+	as each one is ready. The display must be initialized before the loader is created.'''
+
+	def __init__(self,paths,size,workers=4,maxBytes=256*1024*1024):
+		self.paths = paths
+		self.size = size
+		self.cache = SurfaceCache(maxBytes)
+		self.pool = ThreadPool(workers)
+		self.lock = threading.Lock()
+		self.pending = set()
+		self.failed = set()
+		# the threads convert to the pixel format of this surface, never touching the display
+		self.format = pygame.Surface((1,1)).convert()
+
+	def request(self,indexes):
+		'''queues the thumbnails at indexes that are not decoded or queued already'''
+		for i in indexes:
+			path = self.paths[i]
+			with self.lock:
+				if path in self.pending or path in self.failed or path in self.cache:
+					continue
+				self.pending.add(path)
+			self.pool.apply_async(self._load,(i,))
+
+	def get(self,i):
+		'''the thumbnail at i, or None if it is not ready (or could not be read)'''
+		return self.cache.get(self.paths[i])
+
+	def close(self):
+		self.pool.terminate()
+
+	def _load(self,i):
+		path = self.paths[i]
+		try:
+			self.cache.put(path,loadThumbnail(path,self.size,self.format))
+		except Exception as e: # shown as an empty cell
+			with self.lock:
+				self.failed.add(path)
+		finally:
+			with self.lock:
+				self.pending.discard(path)
+		try:
+			pygame.event.post(pygame.event.Event(thumbnailEvent,index=i))
+		except pygame.error: # the display has been closed
+			pass
+
+class ContactSheet(object):
+	'''draws pages of columns x rows thumbnails, only when something has changed'''
+
+	def __init__(self,caption,columns,rows,size):
+		self.caption = caption
+		self.columns = columns
+		self.rows = rows
+		self.cell = size + 2*cellMargin
+		self.windowSize = (columns*self.cell,rows*self.cell + titleBar)
+		self.font = getFont(labelSize)
+		self.screen = None
+		self.dirty = True
+
+	def perPage(self):
+		return self.columns * self.rows
+
+	def invalidate(self):
+		self.dirty = True
+
+	def cellRect(self,k):
+		'''the rectangle of the k-th cell of a page'''
+		return pygame.Rect((k % self.columns)*self.cell,titleBar + (k // self.columns)*self.cell,self.cell,self.cell)
+
+	def cellAt(self,pos):
+		'''the cell of a page at a window position, or None'''
+		(x,y) = pos
+		if y < titleBar:
+			return None
+		column = x // self.cell
+		row = (y - titleBar) // self.cell
+		if column >= self.columns or row >= self.rows:
+			return None
+		return row*self.columns + column
+
+	def show(self,loader,first,count,cursor,selected,title):
+		'''draws the count images from first; returns True if it drew'''
+		if self.screen is None or self.screen is not pygame.display.get_surface():
+			self.screen = pygame.display.set_mode(self.windowSize)
+			pygame.display.set_caption(self.caption)
+			self.dirty = True
+		if not self.dirty:
+			return False
+		screen = self.screen
+		screen.fill((0,0,0))
+		for k in range(count):
+			i = first + k
+			rect = self.cellRect(k)
+			thumb = loader.get(i)
+			if thumb is None:
+				screen.fill(emptyColor,rect.inflate(-2*cellMargin,-2*cellMargin))
+			else:
+				screen.blit(thumb,thumb.get_rect(center=rect.center))
+			if i in selected:
+				pygame.draw.rect(screen,selectedColor,rect,cellMargin)
+			if i == cursor:
+				pygame.draw.rect(screen,cursorColor,rect.inflate(-2*cellMargin,-2*cellMargin),2)
+		text = self.font.render(title, 1, titleColor)
+		screen.blit(text,text.get_rect(centerx=screen.get_rect().centerx,centery=titleBar//2))
+		pygame.display.flip()
+		self.dirty = False
+		return True
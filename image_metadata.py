@@ -0,0 +1,199 @@
+"""image_metadata.py: reading the HPA metadata embedded in downloaded images, for image_viewer.py and image_scorer.py
+
+The download script embeds the image metadata (ensg_id, antibody, etc.) as json in each image's Exif.UserComment tag. Reading it from thousands of images takes minutes, so the metadata for a folder is kept in an index, a sidecar file in the folder itself (.hpasubc_index.json) keyed by file name, size and modification time. The first run reads the images in parallel with a pool of processes and writes the index; later runs read only the images that are new or changed since the index was written.
+
+Images are read with readExifUserCommentFast, which reads just the first 64 KB of the file and walks straight to the UserComment tag; files it cannot make sense of are handed to piexif.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created; readExifUserComment moved here from image_viewer.py and image_scorer.py
+# 10-18-2026 TC added readExifUserCommentFast, which parses only the start of the file
+# 10-18-2026 TC uses replaceFile from image_writer.py
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import os
+import sys
+import json
+import struct
+import piexif
+import piexif.helper
+import multiprocessing as mp
+
+from image_writer import replaceFile
+
+indexFile = '.hpasubc_index.json'
+indexVersion = 1 # change this if the contents of the index change
+minParallel = 64 # below this many images a process pool is not worth starting
+headerBytes = 64*1024 # the Exif segment can be no larger than this
+
+def emptyUserComment():
+	return {	'ensg_id' : '',
+				'tissue_or_cancer' : '',
+				'protein_url' : '',
+				'image_url' : '',
+				'antibody' : '',
+				'image_file' : '',
+			}
+
+def readExifUserComment(imagePath):
+	# read in the exif data, convert the user comment from json to dict, return it
+	# use empty values if the data isn't found
+	userComment = emptyUserComment()
+	try:
+		exif_dict = piexif.load(imagePath)
+		#fix exiv encoding issue if found; for python 2 only
+		if sys.version_info[0] == 2 and '\x00\x00\x00\x00\x00\x00\x00\x00' in exif_dict['Exif'][37510]:
+			s = exif_dict['Exif'][37510].replace('\x00\x00\x00\x00\x00\x00\x00\x00','')
+			userComment = json.loads(s)
+		else:
+			userComment = json.loads(piexif.helper.UserComment.load(exif_dict["Exif"][piexif.ExifIFD.UserComment]))
+
+	except Exception as e:
+		# the tag or exif isn't there, return the empty one
+		pass
+	return userComment
+
+def readExifUserCommentFast(imagePath):
+	'''like readExifUserComment, but reads only the start of the file and goes straight to the
+	UserComment tag instead of parsing all of the Exif. Anything unusual is left to piexif.'''
+	if sys.version_info[0] == 2:
+		return readExifUserComment(imagePath) # keeps the python 2 encoding fix in one place
+	try:
+		with open(imagePath,'rb') as f:
+			data = f.read(headerBytes)
+		comment = findUserComment(data)
+	except Exception as e:
+		comment = None
+	if comment is None:
+		return readExifUserComment(imagePath)
+	if comment is False:
+		return emptyUserComment() # the file has no Exif or no UserComment, so piexif would not find one either
+	try:
+		return json.loads(piexif.helper.UserComment.load(comment))
+	except Exception as e:
+		return emptyUserComment()
+
+def findUserComment(data):
+	'''returns the raw UserComment bytes from the start of a JPEG, False if the JPEG
+	definitely has none, or None if it could not tell.'''
+	if data[0:2] != b'\xff\xd8':
+		return None
+	head = 2
+	while True:
+		marker = data[head:head+2]
+		if len(marker) < 2 or marker[0:1] != b'\xff':
+			return None
+		if marker == b'\xff\xda': # start of the image data; there is no Exif segment
+			return False
+		length = struct.unpack('>H',data[head+2:head+4])[0]
+		if marker == b'\xff\xe1' and data[head+4:head+10] == b'Exif\x00\x00':
+			if head + 2 + length > len(data):
+				return None
+			return findTiffUserComment(data[head+10:head+2+length])
+		head += length + 2
+
+def findTiffUserComment(tiff):
+	'''walks IFD0 -> Exif IFD -> UserComment (0x9286) in a TIFF structure'''
+	if tiff[0:2] == b'II':
+		order = '<'
+	elif tiff[0:2] == b'MM':
+		order = '>'
+	else:
+		return None
+	exifPointer = findTag(tiff,order,struct.unpack(order+'L',tiff[4:8])[0],piexif.ImageIFD.ExifTag)
+	if exifPointer is None:
+		return False
+	entry = findTag(tiff,order,exifPointer[2],piexif.ExifIFD.UserComment)
+	if entry is None:
+		return False
+	type,count,value = entry
+	if type != piexif.TYPES.Undefined:
+		return None
+	if count <= 4: # small values are stored in the entry itself
+		return struct.pack(order+'L',value)[:count]
+	if value + count > len(tiff):
+		return None
+	return tiff[value:value+count]
+
+def findTag(tiff,order,offset,tag):
+	'''returns (type, count, value/offset) of tag in the IFD at offset, or None'''
+	count = struct.unpack(order+'H',tiff[offset:offset+2])[0]
+	for i in range(count):
+		entry = offset + 2 + 12*i
+		if struct.unpack(order+'H',tiff[entry:entry+2])[0] == tag:
+			return struct.unpack(order+'HLL',tiff[entry+2:entry+12])
+	return None
+
+def fileSignature(filePath):
+	'''size and mtime; if either changed, the image must be read again'''
+	st = os.stat(filePath)
+	return [st.st_size,st.st_mtime]
+
+def loadIndex(indir):
+	try:
+		with open(os.path.join(indir,indexFile),'r') as f:
+			index = json.load(f)
+		if index.get('version') == indexVersion:
+			return index['images']
+	except (IOError, OSError, ValueError, KeyError, AttributeError):
+		pass # missing, unreadable or out of date; start over
+	return {}
+
+def saveIndex(indir,images):
+	path = os.path.join(indir,indexFile)
+	try:
+		# write a new file and swap it in, so a crash never leaves a truncated index
+		with open(path + '.tmp','w') as f:
+			json.dump({'version' : indexVersion, 'images' : images},f)
+		replaceFile(path + '.tmp',path)
+	except (IOError, OSError) as e:
+		print('Could not save the metadata index in %s: %s' % (indir,e))
+
+def readUserComments(files,processes=None):
+	'''reads the user comment of each file, in parallel if there are many'''
+	if len(files) < minParallel:
+		return [readExifUserCommentFast(x) for x in files]
+	pool = mp.Pool(processes)
+	try:
+		return pool.map(readExifUserCommentFast,files,chunksize=32)
+	finally:
+		pool.close()
+		pool.join()
+
+def readMetadata(files,processes=None):
+	'''returns the user comment dict of each file in files (paths in one folder), using and
+	updating the folder's index'''
+	if not files:
+		return []
+	indir = os.path.dirname(files[0])
+	index = loadIndex(indir)
+	signatures = [fileSignature(x) for x in files]
+	names = [os.path.basename(x) for x in files]
+
+	stale = [i for i,name in enumerate(names)
+		if name not in index or index[name]['signature'] != signatures[i]]
+	if stale:
+		print('Reading metadata from %s new or changed images...' % len(stale))
+		comments = readUserComments([files[i] for i in stale],processes)
+		for i,comment in zip(stale,comments):
+			index[names[i]] = {'signature' : signatures[i], 'comment' : comment}
+
+	# forget images that are no longer in the folder
+	current = set(names)
+	removed = [x for x in index if x not in current]
+	for name in removed:
+		del index[name]
+
+	if stale or removed:
+		saveIndex(indir,index)
+	return [dict(index[name]['comment']) for name in names]
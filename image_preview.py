@@ -0,0 +1,162 @@
+"""image_preview.py: reduced size previews of downloaded images
+
+image_viewer.py and image_scorer.py show images at a zoom of 0.33 by default, yet decode the whole full size image for every image shown. With --previews, download_images_from_gene_list.py also writes a preview of each image at previewScale (the viewers' default zoom) to a folder in the output directory (.hpasubc_previews), using a PreviewMaker, a pool of processes that makes previews as the images finish downloading. The viewers then decode the preview, about a tenth of the pixels, and only decode the full size image when zoomed in past previewScale.
+
+pygame is only needed to make or show previews, so it is imported when a preview is made.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+# 10-18-2026 TC uses replaceFile from image_writer.py
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import os
+import math
+import struct
+import threading
+import multiprocessing as mp
+
+from image_writer import replaceFile
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT','1') # the pool's processes would each print it
+
+previewDir = '.hpasubc_previews'
+previewScale = 0.33 # the default zoom (defaultScale) of image_viewer.py and image_scorer.py
+headerBytes = 256*1024 # the image size is in the JPEG header, after the Exif
+
+def previewPath(imagePath):
+	indir,name = os.path.split(imagePath)
+	return os.path.join(indir,previewDir,name)
+
+def hasPreview(imagePath):
+	'''True if imagePath has a preview made since the image was last written'''
+	try:
+		return os.path.getmtime(previewPath(imagePath)) >= os.path.getmtime(imagePath)
+	except OSError:
+		return False
+
+def sourceFor(imagePath,scale):
+	'''the path of the image to draw imagePath from at scale: its preview, or itself if zoomed in further'''
+	if scale <= previewScale:
+		return previewPath(imagePath)
+	return imagePath
+
+def makePreview(imagePath,scale=previewScale):
+	'''writes the preview of imagePath'''
+	import pygame
+	image = pygame.image.load(imagePath)
+	size = (max(1,int(round(image.get_width()*scale))),max(1,int(round(image.get_height()*scale))))
+	if image.get_bitsize() in (24,32):
+		preview = pygame.transform.smoothscale(image,size)
+	else:
+		preview = pygame.transform.scale(image,size)
+	path = previewPath(imagePath)
+	# write a new file and swap it in, so the viewers never see half a preview
+	tmp = os.path.join(os.path.dirname(path),'.tmp_' + os.path.basename(path))
+	pygame.image.save(preview,tmp)
+	replaceFile(tmp,path)
+	return path
+
+def tryMakePreview(imagePath):
+	'''makePreview for the pool; returns (imagePath, error message or None)'''
+	try:
+		makePreview(imagePath)
+		return imagePath,None
+	except Exception as e:
+		return imagePath,str(e)
+
+def jpegSize(imagePath):
+	'''(width, height) from the JPEG header, without decoding the image; None if not found'''
+	with open(imagePath,'rb') as f:
+		data = f.read(headerBytes)
+	if data[0:2] != b'\xff\xd8':
+		return None
+	head = 2
+	while head + 9 <= len(data):
+		marker = data[head:head+2]
+		if marker[0:1] != b'\xff':
+			return None
+		code = ord(marker[1:2])
+		if 0xc0 <= code <= 0xcf and code not in (0xc4,0xc8,0xcc): # a start of frame
+			(h,w) = struct.unpack('>HH',data[head+5:head+9])
+			return (w,h)
+		if code == 0xda: # start of scan, the frame must come before it
+			return None
+		head += struct.unpack('>H',data[head+2:head+4])[0] + 2
+	return None
+
+class PreviewMaker(object):
+	'''makes the previews of images in a pool of processes; add() is thread safe'''
+
+	def __init__(self,processes=None):
+		self.pool = mp.Pool(processes)
+		self.lock = threading.Lock()
+		self.made = 0
+		self.failed = [] # (imagePath, message)
+
+	def add(self,imagePath):
+		directory = os.path.dirname(previewPath(imagePath))
+		if not os.path.isdir(directory):
+			try:
+				os.makedirs(directory)
+			except OSError: # another thread made it first
+				pass
+		self.pool.apply_async(tryMakePreview,(imagePath,),callback=self._done)
+
+	def addMissing(self,indir):
+		'''makes previews for the JPEGs in indir that do not have an up to date one'''
+		for name in os.listdir(indir):
+			path = os.path.join(indir,name)
+			if os.path.splitext(name)[1] in ('.jpg','.JPG') and not hasPreview(path):
+				self.add(path)
+
+	def close(self):
+		'''waits for all of the previews to be made'''
+		self.pool.close()
+		self.pool.join()
+
+	def _done(self,result):
+		imagePath,error = result
+		with self.lock:
+			if error is None:
+				self.made += 1
+			else:
+				self.failed.append(result)
+
+class PreviewedImage(object):
+	'''an image drawn from its preview when the zoom is no more than previewScale, and from the
+	full size image otherwise; loadSurface(path) returns a decoded image (e.g. from a cache)'''
+
+	def __init__(self,imagePath,loadSurface):
+		self.imagePath = imagePath
+		self.previewPath = previewPath(imagePath)
+		self.loadSurface = loadSurface
+		self.size = jpegSize(imagePath)
+
+	def get_size(self):
+		if self.size is None:
+			(w,h) = self.loadSurface(self.previewPath).get_size()
+			self.size = (int(round(w/previewScale)),int(round(h/previewScale)))
+		return self.size
+
+	def render(self,scale,view):
+		'''returns the part of the image scaled by scale that falls in view, a Rect in scaled pixels'''
+		import pygame
+		source = self.loadSurface(sourceFor(self.imagePath,scale))
+		ratio = source.get_width() / self.get_size()[0] / scale # source pixels per scaled pixel
+		area = pygame.Rect(int(view.left*ratio),int(view.top*ratio),
+			int(math.ceil(view.width*ratio)),int(math.ceil(view.height*ratio))).clip(source.get_rect())
+		region = source.subsurface(area)
+		if region.get_size() == view.size:
+			return region.copy()
+		return pygame.transform.scale(region,view.size)
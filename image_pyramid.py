@@ -0,0 +1,163 @@
+"""image_pyramid.py: multi-resolution, tiled versions of large images for image_viewer.py and image_scorer.py
+
+Scaling a whole full size HPA image (roughly 3000 x 3000 pixels) for every zoom level is slow and needs the whole image decoded in memory. An ImagePyramid keeps each image on disk as a pyramid of levels, each half the size of the one before it, cut into tiles of tileSize x tileSize pixels. The full size level is the image itself: it is not cut into tiles, so zooming in to 100% or more shows exactly the pixels of the downloaded image (decoded once and cached like a tile), and a pyramid is quick to build and small on disk. The smaller levels, which are scaled anyway, are saved as JPEGs where pygame can write them. The pyramids are kept in a folder in the image folder (.hpasubc_pyramid), one sub-folder per image, and are made the first time an image is viewed (or ahead of time by the prefetcher).
+
+A TiledImage draws a view of an image at a given zoom: it picks the nearest level at or above the zoom, decodes only the tiles that fall in the view, and scales that small region by what is left of the zoom. So zooming and panning only ever decode and scale about a window's worth of pixels.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+# 10-18-2026 TC the full size level is the image itself instead of tiles, so it is never compressed again
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import os
+import json
+import math
+import shutil
+
+import pygame
+
+from image_metadata import fileSignature
+
+pyramidDir = '.hpasubc_pyramid'
+pyramidVersion = 3 # change this if the layout of a pyramid changes
+tileSize = 512
+infoFile = 'pyramid.json' # written last, so a pyramid without it is incomplete
+
+def tileExtension():
+	# pygame can only write JPEGs if it was built with the extended image formats
+	if pygame.image.get_extended():
+		return '.jpg'
+	return '.bmp'
+
+def levelScale(level):
+	return 0.5 ** level
+
+def levelFor(scale,levels):
+	'''the smallest level that is at least as large as scale, so the view is never scaled up'''
+	if scale >= 1:
+		return 0
+	return min(levels - 1,int(math.floor(math.log(1/scale,2))))
+
+class ImagePyramid(object):
+	'''the pyramid of tiles for one image, in pyramidDir next to the image'''
+
+	def __init__(self,imagePath):
+		self.imagePath = imagePath
+		indir,name = os.path.split(imagePath)
+		self.dir = os.path.join(indir,pyramidDir,os.path.splitext(name)[0])
+		self.info = self.loadInfo()
+
+	def loadInfo(self):
+		'''the pyramid's description, or None if it is missing, incomplete or older than the image'''
+		try:
+			with open(os.path.join(self.dir,infoFile),'r') as f:
+				info = json.load(f)
+			if info['version'] == pyramidVersion and info['signature'] == fileSignature(self.imagePath):
+				return info
+		except (IOError, OSError, ValueError, KeyError):
+			pass
+		return None
+
+	def isBuilt(self):
+		return self.info is not None
+
+	def build(self,fullImage=None):
+		'''cuts the image (decoded from imagePath if not given) into the tiles of every level but the
+		full size one'''
+		if fullImage is None:
+			fullImage = pygame.image.load(self.imagePath)
+		# build in a new folder and swap it in, so a pyramid is never half written
+		tmp = self.dir + '.tmp'
+		if os.path.exists(tmp):
+			shutil.rmtree(tmp)
+		os.makedirs(tmp)
+		ext = tileExtension()
+		image = fullImage
+		levels = []
+		while True:
+			(w,h) = image.get_size()
+			if levels: # the full size level is the image itself
+				for row in range(0,h,tileSize):
+					for col in range(0,w,tileSize):
+						tile = image.subsurface(pygame.Rect(col,row,min(tileSize,w-col),min(tileSize,h-row)))
+						pygame.image.save(tile,os.path.join(tmp,'%s_%s_%s%s' % (len(levels),row//tileSize,col//tileSize,ext)))
+			levels.append([w,h])
+			if w <= tileSize and h <= tileSize:
+				break
+			size = (max(1,w//2),max(1,h//2))
+			if image.get_bitsize() in (24,32):
+				image = pygame.transform.smoothscale(image,size)
+			else:
+				image = pygame.transform.scale(image,size)
+		info = {	'version' : pyramidVersion,
+					'signature' : fileSignature(self.imagePath),
+					'size' : list(fullImage.get_size()),
+					'levels' : levels,
+					'ext' : ext,
+				}
+		with open(os.path.join(tmp,infoFile),'w') as f:
+			json.dump(info,f)
+		if os.path.exists(self.dir):
+			shutil.rmtree(self.dir)
+		os.rename(tmp,self.dir)
+		self.info = info
+
+	def get_size(self):
+		return tuple(self.info['size'])
+
+	def levels(self):
+		return len(self.info['levels'])
+
+	def levelSize(self,level):
+		return tuple(self.info['levels'][level])
+
+	def tilePath(self,level,row,col):
+		return os.path.join(self.dir,'%s_%s_%s%s' % (level,row,col,self.info['ext']))
+
+	def tilesIn(self,level,rect):
+		'''(path, position) of each tile of level that overlaps rect (in the level's pixels); the
+		full size level is one tile, the image itself'''
+		if level == 0:
+			return [(self.imagePath,(0,0))]
+		(w,h) = self.levelSize(level)
+		rect = rect.clip(pygame.Rect(0,0,w,h))
+		tiles = []
+		for row in range(rect.top//tileSize,(rect.bottom-1)//tileSize+1):
+			for col in range(rect.left//tileSize,(rect.right-1)//tileSize+1):
+				tiles.append((self.tilePath(level,row,col),(col*tileSize,row*tileSize)))
+		return tiles
+
+class TiledImage(object):
+	'''an image drawn from its pyramid; loadTile(path) returns a decoded tile (e.g. from a cache)'''
+
+	def __init__(self,pyramid,loadTile):
+		self.pyramid = pyramid
+		self.loadTile = loadTile
+
+	def get_size(self):
+		return self.pyramid.get_size()
+
+	def render(self,scale,view):
+		'''returns the part of the image scaled by scale that falls in view, a Rect in scaled pixels'''
+		level = levelFor(scale,self.pyramid.levels())
+		residual = scale / levelScale(level) # between 0.5 and 1, except beyond the last level
+		# the same area in the level's pixels
+		area = pygame.Rect(int(view.left/residual),int(view.top/residual),
+			int(math.ceil(view.width/residual)),int(math.ceil(view.height/residual)))
+		region = pygame.Surface(area.size).convert()
+		for path,position in self.pyramid.tilesIn(level,area):
+			region.blit(self.loadTile(path),(position[0]-area.left,position[1]-area.top))
+		if region.get_size() == view.size:
+			return region
+		return pygame.transform.scale(region,view.size)
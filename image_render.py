@@ -0,0 +1,189 @@
+"""image_render.py: drawing of the current image for image_viewer.py and image_scorer.py
+
+An ImageRenderer only does work when something on screen has changed: the scaled image is cached until the image or the zoom changes, the title font and text are created once, the window is only resized when the scaled image changes size, and nothing is redrawn at all while the user is just looking at an image.
+
+The "Selected"/score animation is drawn by the renderer too. Its frames (the label rendered at about 20 increasing sizes) are made once per label and image size and kept, and each frame only redraws the part of the window under the label, so a keystroke no longer creates fonts, resets the display or rescales the image.
+
+The image can also be a TiledImage (image_pyramid) or a PreviewedImage (image_preview), anything with get_size() and render(scale,view). Then the window is at most windowFraction of the desktop, the renderer keeps a view (offset) into the scaled image that can be moved with pan(), and only the part of the image in the view is drawn.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+# 10-18-2026 TC added animate, with cached label frames
+# 10-18-2026 TC added panning views of tiled images
+# 10-18-2026 TC views of previewed images
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import pygame
+
+titleColor = (255, 0, 0)
+titleSize = 36
+animationSteps = 20 # number of frames in the label animation
+windowFraction = 0.9 # the largest window for a tiled image, as a fraction of the desktop
+
+def scaleTuple(tup,scale):
+	return tuple([int(round(scale*i)) for i in tup])
+
+# events that mean the window contents were lost and must be redrawn
+exposeEvents = [getattr(pygame,x) for x in ('VIDEOEXPOSE','WINDOWEXPOSED','WINDOWRESTORED') if hasattr(pygame,x)]
+
+def maxWindowSize():
+	try:
+		(w,h) = pygame.display.get_desktop_sizes()[0]
+	except (AttributeError, IndexError, pygame.error): # pygame 1.x
+		(w,h) = (1024,768)
+	return (int(w*windowFraction),int(h*windowFraction))
+
+fonts = {}
+
+def getFont(size):
+	'''pygame.font.Font(None,size), made once per size'''
+	font = fonts.get(size)
+	if font is None:
+		font = fonts[size] = pygame.font.Font(None, size)
+	return font
+
+def waitForEvents():
+	'''blocks until there is at least one event, then returns all pending events'''
+	return [pygame.event.wait()] + pygame.event.get()
+
+class ImageRenderer(object):
+	'''draws a scaled image with a title into the window, only when it has changed'''
+
+	def __init__(self,caption):
+		self.caption = caption
+		self.font = getFont(titleSize)
+		self.screen = None
+		self.image = None # the full size image that self.scaled was made from
+		self.scale = None
+		self.scaled = None
+		self.title = None
+		self.text = None
+		self.textpos = None
+		self.dirty = True
+		self.frames = {} # label -> (image size, animation frames)
+		self.maxSize = maxWindowSize()
+		self.view = None # the part of a tiled image that is shown, in scaled pixels
+		self.offset = [0,0]
+
+	def invalidate(self):
+		'''forces a redraw, e.g. after something else has drawn on the window'''
+		self.dirty = True
+
+	def scaledImage(self,fullImage,scale):
+		'''returns fullImage scaled by scale, rescaling only if the image or scale changed'''
+		if not isinstance(fullImage,pygame.Surface):
+			return self.viewOf(fullImage,scale)
+		if fullImage is not self.image or scale != self.scale:
+			self.scaled = pygame.transform.scale(fullImage, scaleTuple(fullImage.get_size(),scale))
+			self.image = fullImage
+			self.scale = scale
+			self.view = None
+			self.dirty = True
+		return self.scaled
+
+	def pan(self,dx,dy):
+		'''moves the view of a tiled or previewed image by (dx,dy) scaled pixels; no effect on surfaces'''
+		self.offset[0] += dx
+		self.offset[1] += dy
+
+	def viewOf(self,tiledImage,scale):
+		'''returns the view of a tiled or previewed image scaled by scale, drawing it only if it changed'''
+		(w,h) = scaleTuple(tiledImage.get_size(),scale)
+		size = (min(w,self.maxSize[0]),min(h,self.maxSize[1]))
+		if tiledImage is not self.image or self.view is None:
+			self.offset = [0,0]
+		elif scale != self.scale:
+			# zoom around the center of the view
+			factor = scale / self.scale
+			self.offset = [int((self.offset[0] + self.view.width/2)*factor - size[0]/2),
+				int((self.offset[1] + self.view.height/2)*factor - size[1]/2)]
+		view = pygame.Rect(self.offset,size)
+		view.clamp_ip(pygame.Rect(0,0,w,h))
+		self.offset = list(view.topleft)
+		if tiledImage is not self.image or scale != self.scale or view != self.view:
+			self.scaled = tiledImage.render(scale,view)
+			self.image = tiledImage
+			self.scale = scale
+			self.view = view
+			self.dirty = True
+		return self.scaled
+
+	def titleText(self,title):
+		if title != self.title:
+			self.text = self.font.render(title, 1, titleColor)
+			self.title = title
+			self.dirty = True
+		return self.text
+
+	def resize(self,size):
+		'''returns the window surface, changing the window size only if needed'''
+		if self.screen is None or self.screen.get_size() != size or self.screen is not pygame.display.get_surface():
+			self.screen = pygame.display.set_mode(size)
+			pygame.display.set_caption(self.caption)
+			self.dirty = True
+		return self.screen
+
+	def labelFrames(self,label,size):
+		'''the label rendered at increasing sizes for the animation over an image of size (w,h)'''
+		cached = self.frames.get(label)
+		if cached is not None and cached[0] == size:
+			return cached[1]
+		(w,h) = size
+		# do some calculations to better fit the fontsize to the image size
+		startSize = max(1,int(round(titleSize*self.scale)))
+		stepSize = max(1,int(round((h - startSize)/animationSteps)))
+		frames = []
+		for fontSize in range(startSize,h,stepSize):
+			text = getFont(fontSize).render(str(label), 1, titleColor)
+			if text.get_width() >= w:
+				break # the label has reached the width of the image
+			frames.append(text)
+		self.frames[label] = (size,frames)
+		return frames
+
+	def animate(self,fullImage,title,scale,label):
+		'''shows the image and title, then the label growing from the center of the image'''
+		self.show(fullImage,title,scale)
+		screen = self.screen
+		center = screen.get_rect().center
+		last = pygame.Rect(center,(0,0))
+		for text in self.labelFrames(label,self.scaled.get_size()):
+			textpos = text.get_rect()
+			textpos.center = center
+			# only the area under this frame and the last one needs to be redrawn
+			area = textpos.union(last)
+			screen.set_clip(area)
+			screen.blit(self.scaled, (0,0))
+			screen.blit(self.text, self.textpos)
+			screen.blit(text, textpos)
+			screen.set_clip(None)
+			pygame.display.update(area)
+			last = textpos
+			pygame.time.delay(1)
+		self.dirty = True # the label stays until the next show()
+
+	def show(self,fullImage,title,scale):
+		'''draws the image and title if anything changed; returns True if it drew'''
+		scaled = self.scaledImage(fullImage,scale)
+		text = self.titleText(title)
+		screen = self.resize(scaled.get_size())
+		if not self.dirty:
+			return False
+		screen.blit(scaled, (0,0))
+		self.textpos = text.get_rect()
+		self.textpos.centerx = screen.get_rect().centerx
+		screen.blit(text, self.textpos)
+		pygame.display.flip()
+		self.dirty = False
+		return True
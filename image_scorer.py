@@ -21,7 +21,9 @@ The score will be displayed in an animation, this can be shut off by setting ani
 
 Finally, if the default zoom level (33% or 0.33) is not appropriate for your monitor, you can change that setting in this file as well.
 
-usage: image_scorer.py <input dir> <output file>
+If the output file already has scores in it, the session resumes: the existing scores are loaded and scoring starts at the first image without one. With --hide_scored, images that already have a score are left out altogether.
+
+usage: image_scorer.py <input dir> <output file> [--hide_scored]
 """
 from __future__ import print_function
 from __future__ import division
@@ -33,6 +35,15 @@ from __future__ import absolute_import
 # 07-24-2014 TC refactor code
 # 08-05-2014 TC added exif metadata reading and handling
 # 03-26-2018 TC changed from pvexiv2 to piexif
+# 10-18-2026 TC images are decoded ahead of time in a background thread (image_cache)
+# 10-18-2026 TC only redraw when something changed (image_render); wait for events instead of polling
+# 10-18-2026 TC image metadata is read in parallel and kept in an index in the input dir (image_metadata)
+# 10-18-2026 TC the output file is kept open for the session, with a journal (result_writer)
+# 10-18-2026 TC the score/selected animation is drawn by the renderer from cached frames
+# 10-18-2026 TC optional tiled image pyramids (image_pyramid) for zooming and panning large images
+# 10-18-2026 TC show the previews made by the download script, if there are any (image_preview)
+# 10-18-2026 TC resume from the scores already in the output file; added --hide_scored; changed argument parsing to use argparse
+# 10-18-2026 TC rows without a score column (e.g. from image_viewer.py) do not count as scored
 
 from builtins import str
 from builtins import range
@@ -48,11 +59,14 @@ __email__ = "tcornish@gmail.com"
 import os
 import sys
 import math
-import csv
 import json
+import atexit
+import argparse
 import pygame
-import piexif
-import piexif.helper
+from image_metadata import readMetadata
+from result_writer import ResultWriter, readResults
+from image_cache import ImagePrefetcher
+from image_render import ImageRenderer, waitForEvents, exposeEvents
 
 # KEY_BINDINGS
 nextKey = pygame.K_RIGHT
@@ -60,6 +74,12 @@ prevKey = pygame.K_LEFT
 exitKey = pygame.K_ESCAPE
 zoomInKey = pygame.K_MINUS
 zoomOutKey = pygame.K_EQUALS
+#pan keys move the view of an image that is larger than the window (with usePyramid); dragging with the mouse does too
+panKeys = {	pygame.K_w : (0,-200),
+			pygame.K_s : (0,200),
+			pygame.K_a : (-200,0),
+			pygame.K_d : (200,0),
+		}
 #change the values in this dict to associate a key with a score
 #multiple keys can be associated with a score and "score" could be changed to another string value such as a diagnosis or feature
 scoreKeys = { 	pygame.K_0 : '0',
@@ -75,32 +95,59 @@ scoreKeys = { 	pygame.K_0 : '0',
 defaultScale = 0.33
 imageExtensions = ['.jpg','.JPG',]
 animate = True
-
-def main(indir,outfile):
+cacheMegabytes = 512 # memory used for decoded images; each full size HPA image is roughly 25-35 MB
+prefetchAhead = 3 # number of images after the current one to decode in the background
+prefetchBehind = 1 # number of images before the current one to keep decoded
+usePyramid = False # view images through tiled pyramids of downsampled levels, made on first view and kept in .hpasubc_pyramid in the input dir
+usePreviews = True # show the previews made by the download script (--previews) until zoomed in past them
+fieldnames = ['image_file','ensg_id','tissue_or_cancer','antibody','score','image_url'] # columns of the output file
+flushRows = 20 # the output file is synced to disk every flushRows results...
+flushSeconds = 5 # ...or flushSeconds seconds after a result, whichever comes first
+
+def main(indir,outfile,hideScored=False):
 	#initialize pygame
 	pygame.init()
 	
 	#identify files; quit if no image files found
 	files = getImageFiles(indir,imageExtensions)
-	numImages = len(files)
-	if numImages < 1:
+	if len(files) < 1:
 		print('No image files found in input directory.')
 		sys.exit()
 	
 	images = readAllImageMetadata(files)
+	results = ResultWriter(outfile,fieldnames,flushRows,flushSeconds) # applies any journal left by a crash
+	atexit.register(results.close) # sys.exit() is used to quit, so close it on the way out
+	numScored = loadScores(outfile,images)
+	print('%s of %s images already scored' % (numScored,len(images)))
+	if hideScored:
+		images = [x for x in images if x['score'] == '']
+		if len(images) < 1:
+			print('All of the images have been scored.')
+			sys.exit()
+	numImages = len(images)
 	
 	#initialize variables
 	scale = defaultScale
-	i = 0
+	i = firstUnscored(images)
 	screen = reset_screen((200,200)) #to initialize the pygame screen
-	fullImage = pygame.image.load(images[i]['image_path']).convert()
+	renderer = ImageRenderer("pyview")
+	prefetcher = ImagePrefetcher([x['image_path'] for x in images],prefetchAhead,prefetchBehind,cacheMegabytes*1024*1024,
+		usePyramid,scale,renderer.maxSize,usePreviews)
+	fullImage = prefetcher.get(i)
 	
 	while True: #pygame loop
+		prefetcher.scale = scale # so the tiles for the current zoom are prefetched
 		title = '%s of %s : %s : %.2f%%' % (i+1,numImages,images[i]['image_file'],scale*100)
-		font = pygame.font.Font(None, 36)
-		for e in pygame.event.get() :
+		if images[i]['score'] != '':
+			title += ' : score %s' % images[i]['score']
+		showImage(renderer,fullImage,title,scale) # only draws if something changed
+		for e in waitForEvents() : #sleep until something happens
 			if e.type == pygame.QUIT :
 				sys.exit()
+			if e.type in exposeEvents:
+				renderer.invalidate()
+			if e.type == pygame.MOUSEMOTION and e.buttons[0]: #drag to pan
+				renderer.pan(-e.rel[0],-e.rel[1])
 			if e.type == pygame.KEYDOWN :
 				if e.key == exitKey :
 					sys.exit()
@@ -108,101 +155,43 @@ def main(indir,outfile):
 					scale = scale / 1.5
 				if e.key == zoomOutKey: #zoom in
 					scale = scale * 1.5
+				if e.key in panKeys:
+					renderer.pan(*panKeys[e.key])
 				if e.key in list(scoreKeys.keys()):
 					score = scoreKeys[e.key]
 					print(score)
-					screen = pygame.display.get_surface()
-					animateText(fullImage,title,scale,score)
-					writeResult(outfile,images,i,score)
-					fullImage,i = nextImage(images,i)
-
-		showImage(fullImage,title,scale)
-		pygame.display.flip()
-		pygame.time.delay(25)
+					animateText(renderer,fullImage,title,scale,score)
+					renderer.invalidate()
+					writeResult(results,images,i,score)
+					fullImage,i = nextImage(images,i,prefetcher)
 
-def showImage(fullImage,title,scale):
-	scaledImage = scaleImage(fullImage,scale)
-	screen = reset_screen((scaledImage.get_width(), scaledImage.get_height()))
-	addTextToImage(scaledImage,title)
-	screen.blit(scaledImage, (0,0))
+def showImage(renderer,fullImage,title,scale):
+	return renderer.show(fullImage,title,scale)
 	
-def scaleImage(fullImage,scale):
-	(w,h) = fullImage.get_rect().size
-	(w,h) = scaleTuple(fullImage.get_rect().size,scale)
-	scaledImage = pygame.transform.scale(fullImage, (w,h))
-	return scaledImage
-	
-def addTextToImage(surf,s):
-	font = pygame.font.Font(None, 36)
-	text = font.render(s, 1, (255, 0, 0))
-	textpos = text.get_rect()
-	textpos.centerx = surf.get_rect().centerx
-	surf.blit(text, textpos)
-
-def animateText(fullImage,title,scale,animateString):
+def animateText(renderer,fullImage,title,scale,animateString):
 	if animate:
-		scaledImage = scaleImage(fullImage,scale)
-		scaledH = scaledImage.get_height()
-		scaledW = scaledImage.get_width()
-		addTextToImage(scaledImage,title)
-		#do some calculations to better fit the fontsize to the image size
-		startSize = int(round(36*scale))
-		endSize = int(round(scaledH))
-		stepSize = int(round((endSize - startSize)/20)) #divide into 20 steps
-		for size in range(startSize,endSize,stepSize): # animate the text
-			screen = reset_screen((scaledImage.get_width(), scaledImage.get_height()))
-			screen.blit(scaledImage, (0,0))
-			font = pygame.font.Font(None, size)
-			text = font.render(str(animateString), 1, (255, 0, 0))
-			textpos = text.get_rect()
-			if textpos.width >= scaledW:
-				#if we have reach the width of the scaledImage, break the animation
-				break
-			textpos.centerx = scaledImage.get_rect().centerx
-			textpos.centery = scaledImage.get_rect().centery
-			screen.blit(text, textpos)
-			pygame.display.flip()
-			pygame.time.delay(1)
+		renderer.animate(fullImage,title,scale,animateString)
 	
-def writeResult(outfile,images,i,score):
+def writeResult(results,images,i,score):
 	images[i]['score'] = score
-
-	if os.path.exists(outfile):
-		mode = 'a' # append if already exists
-	else:
-		mode = 'w' # make a new file if not
-	
-	# there are some 2 v. 3 differences here to avoid extra blank lines
-	if (sys.version_info > (3, 0)):	
-		f = open(outfile,mode,newline='\n')
-	else:
-		f = open(outfile,mode+'b')
-	fieldnames = ['image_file','ensg_id','tissue_or_cancer','antibody','score','image_url']
-	writer = csv.DictWriter(f, dialect='excel',fieldnames=fieldnames,extrasaction='ignore')
-	if mode == 'w':
-		writer.writeheader()
-	writer.writerow(images[i]) 
-	f.close()
+	results.write(images[i])
 		
-def nextImage(images,i):
+def nextImage(images,i,prefetcher):
 	print('nextImage   -> %s' % images[i]['image_file'])
 	i += 1
 	if i > len(images) - 1: 
 		i = len(images) - 1
-	fullImage = pygame.image.load(images[i]['image_path']).convert()
+	fullImage = prefetcher.get(i)
 	return fullImage,i
 	
-def prevImage(images,i):
+def prevImage(images,i,prefetcher):
 	print('prevImage   -> %s' % images[i]['image_file'])
 	i -= 1
 	if i < 0: 
 		i = 0
-	fullImage = pygame.image.load(images[i]['image_path']).convert()
+	fullImage = prefetcher.get(i)
 	return fullImage,i
 			
-def scaleTuple(tup,scale):
-	return tuple([int(round(scale*i)) for i in tup])
-
 def reset_screen(res):
 	screen = pygame.display.set_mode(res)
 	pygame.display.set_caption("pyview")
@@ -216,45 +205,43 @@ def getImageFiles(dir,exts):
 			files.append(os.path.join(dir,file))
 	return files
 	
+def loadScores(outfile,images):
+	'''sets the score of each image from the rows already in outfile; returns how many were scored'''
+	scores = readResults(outfile)
+	numScored = 0
+	for image in images:
+		row = scores.get(image['image_file'])
+		# a row without a score (e.g. a file written by image_viewer.py) leaves the image unscored
+		if row is not None and row.get('score',''):
+			image['score'] = row['score']
+			numScored += 1
+	return numScored
+
+def firstUnscored(images):
+	for i,image in enumerate(images):
+		if image['score'] == '':
+			return i
+	return 0 # all scored; start over at the beginning
+
 def readAllImageMetadata(files):
-	images = []
 	print('Reading image file metadata...')
-	for filePath in files:
-		image = readExifUserComment(filePath)
-		print(image)
+	images = readMetadata(files)
+	for image,filePath in zip(images,files):
 		image['image_path'] = filePath
+		if not image['image_file']:
+			image['image_file'] = os.path.basename(filePath) # no metadata; the file name is still needed to resume
 		image['score'] = ''
-		images.append(image)
 	print('  done.')
 	return images
 		
-def readExifUserComment(imagePath):
-	# read in the exif data, convert the user comment from json to dict, return it
-	# use empty values if the data isn't found
-	userComment = {	'ensg_id' : '',
-									'tissue_or_cancer' : '',
-									'protein_url' : '',
-									'image_url' : '',
-									'antibody' : '',
-									'image_file' : '',
-								}
-	try:
-		exif_dict = piexif.load(imagePath)
-		#fix exiv encoding issue if found; for python 2 only
-		if sys.version_info[0] == 2 and '\x00\x00\x00\x00\x00\x00\x00\x00' in exif_dict['Exif'][37510]:
-			s = exif_dict['Exif'][37510].replace('\x00\x00\x00\x00\x00\x00\x00\x00','')
-			userComment = json.loads(s)
-		else:
-			userComment = json.loads(piexif.helper.UserComment.load(exif_dict["Exif"][piexif.ExifIFD.UserComment]))
+def parse_args():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('in_dir', help='Folder of images to score', type=str)
+	parser.add_argument('out_file', help='CSV file for the scores; scores already in it are kept and skipped', type=str)
+	parser.add_argument("--hide_scored", help='Leave out the images that already have a score in out_file',
+		action='store_true')
+	return parser.parse_args()
 
-	except Exception as e:
-		# the tag or exif isn't there, return the empty one
-		pass
-	return userComment
-	
 if __name__ == '__main__':
-	if len(sys.argv) != 3:
-		print('usage: %s <input dir> <output file>' % os.path.basename(sys.argv[0]))
-		exit()
-	else:
-		main(sys.argv[1],sys.argv[2])
+	args = parse_args()
+	main(args.in_dir,args.out_file,args.hide_scored)
@@ -0,0 +1,124 @@
+"""image_store.py: a content-addressed store of downloaded images, shared by download runs
+
+Runs of download_images_from_gene_list.py for overlapping tissues, or for more than one HPA version, download many of the same images again and keep a copy of each in every output directory. With --store, each image written by a run is also kept in an ImageStore, named by the sha1 of its bytes (objects/ab/cd/abcd...jpg, so no folder holds too many files), and the file in the output directory is a hard link to it. An index (index.db) maps each image url to the image stored for it, so a later run takes an image it has already seen from the store instead of downloading it again.
+
+Each image file carries its metadata (see download_images_from_gene_list.py) in its Exif, so the same image downloaded for two HPA versions (or two genes) is two different files; the second is made from the stored copy without a download, but is added to the store as well. The store saves downloads; it only saves disk space when a file is written again exactly as before, e.g. for runs with overlapping tissues.
+
+The store should be on the same filesystem as the output directories; otherwise the images are copied into it instead of linked.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+# 10-18-2026 TC uses replaceFile from image_writer.py
+# 10-18-2026 TC corrected the description of what is stored once
+# 10-18-2026 TC no longer says each image is stored once
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import os
+import time
+import shutil
+import sqlite3
+import threading
+
+from image_writer import replaceFile
+
+objectsDir = 'objects'
+indexFile = 'index.db'
+
+class ImageStore(object):
+	'''images named by their sha1, with an index of the url each was downloaded from;
+	safe to share between the threads of a pool'''
+
+	def __init__(self,root):
+		self.root = root
+		if not os.path.exists(os.path.join(root,objectsDir)):
+			os.makedirs(os.path.join(root,objectsDir))
+		self.lock = threading.Lock()
+		self.db = sqlite3.connect(os.path.join(root,indexFile),check_same_thread=False)
+		self.db.execute('PRAGMA journal_mode=WAL')
+		self.db.execute('PRAGMA synchronous=NORMAL')
+		self.db.execute('''CREATE TABLE IF NOT EXISTS urls (
+			image_url TEXT PRIMARY KEY,
+			checksum TEXT,
+			bytes INTEGER,
+			updated REAL)''')
+		self.db.commit()
+		self.linked = 0 # files replaced by a link to an image already in the store
+		self.added = 0 # images new to the store
+		self.copied = 0 # images copied in, because a link could not be made
+		self.bytesSaved = 0
+
+	def blobPath(self,checksum):
+		return os.path.join(self.root,objectsDir,checksum[0:2],checksum[2:4],checksum + '.jpg')
+
+	def find(self,imageUrl):
+		'''the path of the image stored for imageUrl, or None'''
+		with self.lock:
+			row = self.db.execute('SELECT checksum,bytes FROM urls WHERE image_url=?',(imageUrl,)).fetchone()
+		if row is None:
+			return None
+		path = self.blobPath(row[0])
+		try:
+			if os.path.getsize(path) == row[1]:
+				return path
+		except OSError: # removed from the store
+			pass
+		return None
+
+	def add(self,path,checksum,imageUrl=None):
+		'''stores the image at path (whose sha1 is checksum), leaving path a link to the stored image'''
+		blob = self.blobPath(checksum)
+		size = os.path.getsize(path)
+		if os.path.exists(blob) and os.path.getsize(blob) == size:
+			if not os.path.samefile(blob,path) and self._link(blob,path):
+				with self.lock:
+					self.linked += 1
+					self.bytesSaved += size
+		else:
+			directory = os.path.dirname(blob)
+			if not os.path.isdir(directory):
+				try:
+					os.makedirs(directory)
+				except OSError: # another thread made it first
+					pass
+			# link (or copy) to a temporary name and rename it, so a stored image is always whole
+			tmp = '%s.%s.tmp' % (blob,threading.current_thread().ident)
+			copied = False
+			try:
+				os.link(path,tmp)
+			except (OSError, AttributeError): # another filesystem, or no hard links
+				shutil.copyfile(path,tmp)
+				copied = True
+			replaceFile(tmp,blob)
+			with self.lock:
+				self.added += 1
+				self.copied += copied
+		if imageUrl is not None:
+			with self.lock:
+				self.db.execute('INSERT OR REPLACE INTO urls (image_url,checksum,bytes,updated) VALUES (?,?,?,?)',
+					(imageUrl,checksum,size,time.time()))
+				self.db.commit()
+
+	def _link(self,blob,path):
+		'''replaces path with a link to blob; returns False if a link can not be made'''
+		tmp = path + '.link'
+		try:
+			os.link(blob,tmp)
+		except (OSError, AttributeError): # another filesystem: keep the file as it is
+			return False
+		replaceFile(tmp,path)
+		return True
+
+	def close(self):
+		with self.lock:
+			self.db.close()
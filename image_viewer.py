@@ -22,7 +22,9 @@ The score will be displayed in an animation, this can be shut off by setting ani
 
 Finally, if the default zoom level (33% or 0.33) is not appropriate for your monitor, you can change that setting in this file as well.
 
-usage: image_viewer.py <input_dir> <output_file>
+With --grid, the images are shown as a contact sheet of gridColumns x gridRows thumbnails per page (see image_grid.py), for a quick first pass through many images. The arrow keys move the cursor, SPACE BAR (or a mouse click) selects or unselects an image, and PAGE DOWN and PAGE UP flip pages. The selections on a page are written to the output file when the page is left. Images already in the output file are shown as selected, and stay selected.
+
+usage: image_viewer.py <input_dir> <output_file> [--grid]
 """
 from __future__ import print_function
 from __future__ import division
@@ -36,6 +38,15 @@ from __future__ import unicode_literals
 # 07-23-2014 TC refactor code
 # 08-05-2014 TC added exif metadata reading and handling
 # 03-26-2018 TC changed from pvexiv2 to piexif
+# 10-18-2026 TC images are decoded ahead of time in a background thread (image_cache)
+# 10-18-2026 TC only redraw when something changed (image_render); wait for events instead of polling
+# 10-18-2026 TC image metadata is read in parallel and kept in an index in the input dir (image_metadata)
+# 10-18-2026 TC the output file is kept open for the session, with a journal (result_writer)
+# 10-18-2026 TC the score/selected animation is drawn by the renderer from cached frames
+# 10-18-2026 TC optional tiled image pyramids (image_pyramid) for zooming and panning large images
+# 10-18-2026 TC show the previews made by the download script, if there are any (image_preview)
+# 10-18-2026 TC added the contact sheet mode (--grid, image_grid); changed argument parsing to use argparse
+# 10-18-2026 TC removed the clock.tick(10) from the main loop, which waits for events anyway
 
 from builtins import str
 from builtins import range
@@ -52,12 +63,16 @@ __email__ = "tcornish@gmail.com"
 
 import os
 import sys
+import atexit
+import argparse
 import pygame
 import math
-import csv
 import json
-import piexif
-import piexif.helper
+from image_metadata import readMetadata
+from result_writer import ResultWriter, readResults
+from image_cache import ImagePrefetcher
+from image_render import ImageRenderer, waitForEvents, exposeEvents
+from image_grid import ThumbnailLoader, ContactSheet, thumbnailEvent
 
 import time
 
@@ -68,6 +83,17 @@ prevKey = pygame.K_LEFT
 exitKey = pygame.K_ESCAPE
 zoomInKey = pygame.K_MINUS
 zoomOutKey = pygame.K_EQUALS
+#grid mode only
+upKey = pygame.K_UP
+downKey = pygame.K_DOWN
+nextPageKey = pygame.K_PAGEDOWN
+prevPageKey = pygame.K_PAGEUP
+#pan keys move the view of an image that is larger than the window (with usePyramid); dragging with the mouse does too
+panKeys = {	pygame.K_w : (0,-200),
+			pygame.K_s : (0,200),
+			pygame.K_a : (-200,0),
+			pygame.K_d : (200,0),
+		}
 
 # BUTTON_BINDINGS
 # joy/pad left and right are next and prev, respectively
@@ -80,6 +106,18 @@ zoomOutButton = 1
 defaultScale = 0.33
 imageExtensions = ['.jpg','.JPG',]
 animate = True
+cacheMegabytes = 512 # memory used for decoded images; each full size HPA image is roughly 25-35 MB
+prefetchAhead = 3 # number of images after the current one to decode in the background
+prefetchBehind = 1 # number of images before the current one to keep decoded
+usePyramid = False # view images through tiled pyramids of downsampled levels, made on first view and kept in .hpasubc_pyramid in the input dir
+usePreviews = True # show the previews made by the download script (--previews) until zoomed in past them
+fieldnames = ['image_file','ensg_id','tissue_or_cancer','antibody','image_url'] # columns of the output file
+flushRows = 20 # the output file is synced to disk every flushRows results...
+flushSeconds = 5 # ...or flushSeconds seconds after a result, whichever comes first
+gridColumns = 6 # thumbnails across a page in grid mode
+gridRows = 4 # thumbnails down a page in grid mode
+thumbnailSize = 200 # width/height of a thumbnail in pixels
+thumbnailWorkers = 4 # threads decoding thumbnails
 
 def main(indir,outfile):
 	#initialize pygame and controller if present
@@ -95,23 +133,30 @@ def main(indir,outfile):
 		sys.exit()
 
 	images = readAllImageMetadata(files)
+	results = ResultWriter(outfile,fieldnames,flushRows,flushSeconds)
+	atexit.register(results.close) # sys.exit() is used to quit, so close it on the way out
 
 
 	#initialize variables
 	scale = defaultScale
 	i = 0
 	screen = reset_screen((200,200)) #to initialize the pygame screen
-	fullImage = pygame.image.load(images[i]['image_path']).convert()
-
-# Initialise clock
-	clock = pygame.time.Clock()
+	renderer = ImageRenderer("HPASubC image_viewer")
+	prefetcher = ImagePrefetcher([x['image_path'] for x in images],prefetchAhead,prefetchBehind,cacheMegabytes*1024*1024,
+		usePyramid,scale,renderer.maxSize,usePreviews)
+	fullImage = prefetcher.get(i)
 
 	while True: #pygame loop
-		clock.tick(10)
+		prefetcher.scale = scale # so the tiles for the current zoom are prefetched
 		title = '%s of %s : %s : %.2f%%' % (i+1,numImages,images[i]['image_file'],scale*100)
-		for e in pygame.event.get(): #check the event loop
+		showImage(renderer,fullImage,title,scale) # only draws if something changed
+		for e in waitForEvents(): #sleep until something happens
 			if e.type == pygame.QUIT:
 				sys.exit()
+			if e.type in exposeEvents:
+				renderer.invalidate()
+			if e.type == pygame.MOUSEMOTION and e.buttons[0]: #drag to pan
+				renderer.pan(-e.rel[0],-e.rel[1])
 			if e.type == pygame.KEYDOWN:
 				if e.key == exitKey:
 					sys.exit()
@@ -119,21 +164,25 @@ def main(indir,outfile):
 					scale = scale / 1.5
 				if e.key == zoomOutKey: #zoom in
 					scale = scale * 1.5
+				if e.key in panKeys:
+					renderer.pan(*panKeys[e.key])
 				if e.key == selectKey: #save and advance
-					selectImage(outfile,images,i)
-					animateText(fullImage,title,scale,'Selected')
-					fullImage,i = nextImage(images,i)
+					selectImage(results,images,i)
+					animateText(renderer,fullImage,title,scale,'Selected')
+					renderer.invalidate()
+					fullImage,i = nextImage(images,i,prefetcher)
 				if e.key == nextKey: #advance
-					fullImage,i = nextImage(images,i)
+					fullImage,i = nextImage(images,i,prefetcher)
 				if e.key == prevKey: #previous
-					fullImage,i = prevImage(images,i)
+					fullImage,i = prevImage(images,i,prefetcher)
 
 			if e.type == pygame.JOYBUTTONDOWN:
 				print("Joystick button % s pressed." % e.dict['button'])
 				if e.dict['button'] == selectButton and i < numImages-1: #save and advance
-					selectImage(outfile,images,i)
-					animateText(fullImage,title,scale,'Selected')
-					fullImage,i = nextImage(images,i)
+					selectImage(results,images,i)
+					animateText(renderer,fullImage,title,scale,'Selected')
+					renderer.invalidate()
+					fullImage,i = nextImage(images,i,prefetcher)
 				if e.dict['button'] == zoomInButton: #zoom in
 					scale = scale * 1.5
 				if e.dict['button'] == zoomOutButton: #zoom out
@@ -146,9 +195,9 @@ def main(indir,outfile):
 				value = int(round(e.dict['value']))
 				if e.dict['axis'] == 0:
 					if value > 0 and i < numImages-1:
-						fullImage,i = nextImage(images,i)
+						fullImage,i = nextImage(images,i,prefetcher)
 					elif value < 0 and i > 0:
-						fullImage,i = prevImage(images,i)
+						fullImage,i = prevImage(images,i,prefetcher)
 				#axis: Y = 1
 				if e.dict['axis'] == 1:
 					if value < 0:
@@ -164,100 +213,129 @@ def main(indir,outfile):
 				y = e.dict['value'][1]
 				#right-left axis:
 				if x > 0 and i < numImages-1:
-						fullImage,i = nextImage(images,i)
+						fullImage,i = nextImage(images,i,prefetcher)
 				elif x < 0 and i > 0:
-						fullImage,i = prevImage(images,i)
-
-		showImage(fullImage,'%s of %s : %s : %.2f%%' % (i+1,numImages,images[i]['image_file'],scale*100),scale)
-		pygame.display.flip()
-		pygame.time.delay(25)
-
-def showImage(fullImage,title,scale):
-	scaledImage = scaleImage(fullImage,scale)
-	screen = reset_screen((scaledImage.get_width(), scaledImage.get_height()))
-	addTextToImage(scaledImage,title)
-	screen.blit(scaledImage, (0,0))
-
-def scaleImage(fullImage,scale):
-	(w,h) = fullImage.get_rect().size
-	(w,h) = scaleTuple(fullImage.get_rect().size,scale)
-	scaledImage = pygame.transform.scale(fullImage, (w,h))
-	return scaledImage
-
-def addTextToImage(surf,s):
-	font = pygame.font.Font(None, 36)
-	text = font.render(s, 1, (255, 0, 0))
-	textpos = text.get_rect()
-	textpos.centerx = surf.get_rect().centerx
-	surf.blit(text, textpos)
-
-def selectImage(outfile,images,i):
+						fullImage,i = prevImage(images,i,prefetcher)
+
+def gridMain(indir,outfile):
+	#initialize pygame
+	pygame.init()
+
+	#identify files; quit if no image files found
+	files = getImageFiles(indir,imageExtensions)
+	numImages = len(files)
+	if numImages < 1:
+		print('No image files found in input directory.')
+		sys.exit()
+
+	images = readAllImageMetadata(files)
+	results = ResultWriter(outfile,fieldnames,flushRows,flushSeconds)
+	atexit.register(results.close) # sys.exit() is used to quit, so close it on the way out
+
+	#images already in the output file are selected, and are not written again
+	recorded = readResults(outfile)
+	written = set(i for i,image in enumerate(images) if image['image_file'] in recorded)
+	selected = set(written)
+
+	reset_screen((200,200)) #to initialize the pygame screen
+	sheet = ContactSheet("HPASubC image_viewer",gridColumns,gridRows,thumbnailSize)
+	loader = ThumbnailLoader([x['image_path'] for x in images],thumbnailSize,thumbnailWorkers,cacheMegabytes*1024*1024)
+	perPage = sheet.perPage()
+	numPages = (numImages + perPage - 1) // perPage
+	cursor = 0
+
+	while True: #pygame loop
+		page = cursor // perPage
+		first = page * perPage
+		count = min(perPage,numImages - first)
+		#the current page first, then the pages either side of it
+		loader.request(range(first,first+count))
+		loader.request(range(first+count,min(numImages,first+count+perPage)))
+		loader.request(range(max(0,first-perPage),first))
+		title = 'page %s of %s : %s selected' % (page+1,numPages,len(selected))
+		sheet.show(loader,first,count,cursor,selected,title) # only draws if something changed
+		for e in waitForEvents(): #sleep until something happens
+			if e.type == pygame.QUIT:
+				recordPage(results,images,selected,written,first,count)
+				sys.exit()
+			if e.type in exposeEvents:
+				sheet.invalidate()
+			if e.type == thumbnailEvent and first <= e.index < first + count:
+				sheet.invalidate()
+			if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
+				k = sheet.cellAt(e.pos)
+				if k is not None and k < count:
+					cursor = first + k
+					toggleSelection(selected,written,cursor)
+				sheet.invalidate()
+			if e.type == pygame.KEYDOWN:
+				if e.key == exitKey:
+					recordPage(results,images,selected,written,first,count)
+					sys.exit()
+				if e.key == selectKey:
+					toggleSelection(selected,written,cursor)
+				if e.key == nextKey:
+					cursor += 1
+				if e.key == prevKey:
+					cursor -= 1
+				if e.key == downKey:
+					cursor += gridColumns
+				if e.key == upKey:
+					cursor -= gridColumns
+				if e.key == nextPageKey:
+					cursor += perPage
+				if e.key == prevPageKey:
+					cursor -= perPage
+				cursor = max(0,min(numImages-1,cursor))
+				sheet.invalidate()
+		if cursor // perPage != page: #leaving the page
+			recordPage(results,images,selected,written,first,count)
+
+def toggleSelection(selected,written,i):
+	if i in written:
+		print('already in the output file -> %s' % i)
+	elif i in selected:
+		selected.discard(i)
+	else:
+		selected.add(i)
+
+def recordPage(results,images,selected,written,first,count):
+	'''writes the new selections on a page to the output file'''
+	for i in range(first,first+count):
+		if i in selected and i not in written:
+			selectImage(results,images,i)
+			written.add(i)
+
+def showImage(renderer,fullImage,title,scale):
+	return renderer.show(fullImage,title,scale)
+
+def selectImage(results,images,i):
 	print('selectImage -> %s' % images[i]['image_file'])
-	writeResult(outfile,images,i)
+	writeResult(results,images,i)
 
-def animateText(fullImage,title,scale,animateString):
+def animateText(renderer,fullImage,title,scale,animateString):
 	if animate:
-		scaledImage = scaleImage(fullImage,scale)
-		scaledH = scaledImage.get_height()
-		scaledW = scaledImage.get_width()
-		addTextToImage(scaledImage,title)
-		#do some calculations to better fit the fontsize to the image size
-		startSize = int(round(36*scale))
-		endSize = int(round(scaledH))
-		stepSize = int(round((endSize - startSize)/20)) #divide into 20 steps
-		for size in range(startSize,endSize,stepSize): # animate the text
-			screen = reset_screen((scaledImage.get_width(), scaledImage.get_height()))
-			screen.blit(scaledImage, (0,0))
-			font = pygame.font.Font(None, size)
-			text = font.render(str(animateString), 1, (255, 0, 0))
-			textpos = text.get_rect()
-			if textpos.width >= scaledW:
-				#if we have reach the width of the scaledImage, break the animation
-				break
-			textpos.centerx = scaledImage.get_rect().centerx
-			textpos.centery = scaledImage.get_rect().centery
-			screen.blit(text, textpos)
-			pygame.display.flip()
-			pygame.time.delay(1)
-
-def writeResult(outfile,images,i):
-	if os.path.exists(outfile):
-		mode = 'a' # append if already exists
-	else:
-		mode = 'w' # make a new file if not
+		renderer.animate(fullImage,title,scale,animateString)
 
-	# there are some 2 v. 3 differences here to avoid extra blank lines
-	if (sys.version_info > (3, 0)):	
-		f = open(outfile,mode,newline='\n')
-	else:
-		f = open(outfile,mode+'b')
-	#open with a+ mode, read at beginning, write at the end
-	fieldnames = ['image_file','ensg_id','tissue_or_cancer','antibody','image_url']
-	writer = csv.DictWriter(f, dialect='excel',fieldnames=fieldnames,extrasaction='ignore')
-	if mode == 'w':
-		writer.writeheader()
-	writer.writerow(images[i])
-	f.close()
-
-def nextImage(images,i):
+def writeResult(results,images,i):
+	results.write(images[i])
+
+def nextImage(images,i,prefetcher):
 	print('nextImage   -> %s' % images[i]['image_file'])
 	i += 1
 	if i > len(images) - 1:
 		i = len(images) - 1
-	fullImage = pygame.image.load(images[i]['image_path']).convert()
+	fullImage = prefetcher.get(i)
 	return fullImage,i
 
-def prevImage(images,i):
+def prevImage(images,i,prefetcher):
 	print('prevImage   -> %s' % images[i]['image_file'])
 	i -= 1
 	if i < 0:
 		i = 0
-	fullImage = pygame.image.load(images[i]['image_path']).convert()
+	fullImage = prefetcher.get(i)
 	return fullImage,i
 
-def scaleTuple(tup,scale):
-	return tuple([int(round(scale*i)) for i in tup])
-
 def reset_screen(res) :
 	screen = pygame.display.set_mode(res)
 	pygame.display.set_caption("HPASubC image_viewer")
@@ -272,40 +350,15 @@ def getImageFiles(dir,exts):
 	return files
 
 def readAllImageMetadata(files):
-	images = []
 	print('Reading image file metadata...')
-	for filePath in files:
-		image = readExifUserComment(filePath)
+	images = readMetadata(files)
+	for image,filePath in zip(images,files):
 		image['image_path'] = filePath
-		images.append(image)
+		if not image['image_file']:
+			image['image_file'] = os.path.basename(filePath) # no metadata; the file name is still needed
 	print('  done.')
 	return images
 
-def readExifUserComment(imagePath):
-	# read in the exif data, convert the user comment from json to dict, return it
-	# use empty values if the data isn't found
-	userComment = {	'ensg_id' : '',
-									'tissue_or_cancer' : '',
-									'protein_url' : '',
-									'image_url' : '',
-									'antibody' : '',
-									'image_file' : '',
-								}
-	try:
-		exif_dict = piexif.load(imagePath)
-		#fix exiv encoding issue if found
-		if sys.version_info[0] == 2 and '\x00\x00\x00\x00\x00\x00\x00\x00' in exif_dict['Exif'][37510]:
-			s = exif_dict['Exif'][37510].replace('\x00\x00\x00\x00\x00\x00\x00\x00','')
-			userComment = json.loads(s)
-		else:
-			userComment = json.loads(piexif.helper.UserComment.load(exif_dict["Exif"][piexif.ExifIFD.UserComment]))
-
-
-	except Exception as e:
-		# the tag or exif isn't there, return the empty one
-		pass
-	return userComment
-
 def identifyGamepad():
 	if pygame.joystick.get_count() > 0:
 		print('found %s gamepad(s).' % pygame.joystick.get_count())
@@ -322,9 +375,17 @@ def identifyGamepad():
 	else:
 		print('No joysticks found!')
 
+def parse_args():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('in_dir', help='Folder of images to view', type=str)
+	parser.add_argument('out_file', help='CSV file for the selected images', type=str)
+	parser.add_argument("--grid", help='Show pages of thumbnails (a contact sheet) instead of one image at a time',
+		action='store_true')
+	return parser.parse_args()
+
 if __name__ == '__main__':
-	if len(sys.argv) != 3:
-		print('usage: %s <input dir> <output file>' % os.path.basename(sys.argv[0]))
-		exit()
+	args = parse_args()
+	if args.grid:
+		gridMain(args.in_dir,args.out_file)
 	else:
-		main(sys.argv[1],sys.argv[2])
+		main(args.in_dir,args.out_file)
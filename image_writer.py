@@ -0,0 +1,161 @@
+"""image_writer.py: writes downloaded JPEG images to disk, for download_images_from_gene_list.py and verify_images.py
+
+An ImageWriter streams an image to a temporary file (<image>.part) as it is downloaded, adds the image's metadata to the Exif user comment on the way, and renames the file to its final name once it is complete and has passed the checks in check(). The JPEG helpers it uses (findStartOfScan, hasEndOfImage) are also used by verify_images.py to check images already on disk, and replaceFile is the rename used by every module that replaces a file in one step.
+
+Importing this module has no side effects (no logging is configured and no files are created), unlike importing the download script.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC moved here from download_images_from_gene_list.py
+# 10-18-2026 TC added ImageWriter.check, so the asyncio engine can retry an image that is not whole
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import os
+import io
+import json
+import struct
+import hashlib
+import piexif
+import piexif.helper
+
+partialSuffix = '.part' # suffix of images that are still being downloaded
+maxHeaderSize = 1024*1024 # a JPEG header (Exif, tables, etc.) larger than this is treated as corrupt
+tailSize = 64 # bytes kept from the end of a download to find the JPEG end of image marker
+
+class ImageWriter(object):
+	'''writes an image to a temporary file as it is downloaded, and renames it to imagePath
+	once it is complete, so that an image under its final name is always a whole image.
+
+	If a userComment dict is given, the start of the JPEG is held back until the whole
+	header has arrived, and the user comment is added to its Exif before it is written.
+
+	check() (and so commit()) fails unless the data received starts and ends with the JPEG
+	start and end of image markers.'''
+
+	def __init__(self,imagePath,userComment=None):
+		self.imagePath = imagePath
+		self.partialPath = imagePath + partialSuffix
+		self.userComment = userComment
+		self.header = b'' if userComment is not None else None
+		self.bytes = 0
+		self.received = 0 # bytes received, before the Exif is changed
+		self.start = b''
+		self.tail = b''
+		self.sha1 = hashlib.sha1()
+		self.f = open(self.partialPath,'wb')
+
+	def write(self,chunk):
+		self.received += len(chunk)
+		if len(self.start) < 2:
+			self.start = (self.start + chunk)[:2]
+		self.tail = (self.tail + chunk)[-tailSize:]
+		if self.header is not None:
+			self.header += chunk
+			sos = findStartOfScan(self.header)
+			if sos is None:
+				if len(self.header) > maxHeaderSize:
+					raise ValueError('%s does not have a valid JPEG header' % self.imagePath)
+				return # wait for the rest of the header
+			chunk = spliceExifUserComment(self.header[:sos],self.userComment) + self.header[sos:]
+			self.header = None
+		self.f.write(chunk)
+		self.bytes += len(chunk)
+		self.sha1.update(chunk)
+
+	def checksum(self):
+		'''the sha1 of the image as written'''
+		return self.sha1.hexdigest()
+
+	def check(self):
+		'''raises ValueError unless the data received so far is a whole JPEG image'''
+		problem = None
+		if self.header is not None:
+			problem = 'is not a complete JPEG image'
+		elif self.start != b'\xff\xd8':
+			problem = 'is not a JPEG image'
+		elif not hasEndOfImage(self.tail):
+			problem = 'is truncated (no JPEG end of image marker)'
+		if problem:
+			raise ValueError('%s %s' % (self.imagePath,problem))
+
+	def commit(self):
+		self.f.close()
+		try:
+			self.check()
+		except ValueError:
+			os.remove(self.partialPath)
+			raise
+		replaceFile(self.partialPath,self.imagePath)
+		return self.imagePath
+
+	def abort(self):
+		self.f.close()
+		if os.path.exists(self.partialPath):
+			os.remove(self.partialPath)
+
+def hasEndOfImage(tail):
+	'''True if the end of a JPEG is the end of image marker (ignoring padding after it)'''
+	return tail.rstrip(b'\x00\r\n ').endswith(b'\xff\xd9')
+
+def checkContentLength(response,received):
+	'''raises IOError if fewer (or more) bytes were received than the server said it sent'''
+	expected = response.headers.get('Content-Length')
+	# with a Content-Encoding the length is that of the encoded body
+	if expected is not None and not response.headers.get('Content-Encoding') and int(expected) != received:
+		raise IOError('received %s of %s bytes' % (received,expected))
+
+def replaceFile(src,dst):
+	# os.replace is atomic and overwrites dst; python 2 only has os.rename
+	if hasattr(os,'replace'):
+		os.replace(src,dst)
+	else:
+		if os.path.exists(dst):
+			os.remove(dst)
+		os.rename(src,dst)
+
+def writeExifUserComment(imagePath,userCommentAsDict):
+	# read in the exif data, add the user comment as json, and write it
+	exif_dict = piexif.load(imagePath)
+	# insert the modified exif_bytes
+	piexif.insert(dumpExifUserComment(exif_dict,userCommentAsDict), imagePath)
+
+def dumpExifUserComment(exif_dict,userCommentAsDict):
+	# convert the jason to proper encoding	
+	user_comment = piexif.helper.UserComment.dump(json.dumps(userCommentAsDict))
+	# pop it into the exif_dict
+	exif_dict["Exif"][piexif.ExifIFD.UserComment] = user_comment
+	# get the exif as bytes
+	return piexif.dump(exif_dict)
+
+def findStartOfScan(data):
+	'''returns the offset of the JPEG SOS marker (where the image data starts), or None if
+	data does not reach it yet. Everything before it is the header holding the Exif.'''
+	if len(data) >= 2 and data[0:2] != b'\xff\xd8':
+		raise ValueError('Image data is not a JPEG')
+	head = 2
+	while head + 4 <= len(data):
+		if data[head:head+2] == b'\xff\xda':
+			return head
+		length = struct.unpack('>H',data[head+2:head+4])[0]
+		head += length + 2
+	return None
+
+def spliceExifUserComment(header,userCommentAsDict):
+	'''adds the user comment to the Exif of a JPEG header, in memory, exactly as
+	writeExifUserComment does for a whole file.'''
+	# piexif wants a whole JPEG; the SOS marker stands in for the image data
+	data = header + b'\xff\xda'
+	exif_bytes = dumpExifUserComment(piexif.load(data),userCommentAsDict)
+	out = io.BytesIO()
+	piexif.insert(exif_bytes,data,out)
+	return out.getvalue()[:-2]
@@ -2,16 +2,18 @@
 
 """move_images_by_selected.py: move images in a folder have a particular value of selected (TRUE,FALSE,None) in a provided csv file.
 
-This is meant to be used on the output of the image_viewer.py script
+This is meant to be used on the output of the image_viewer.py script, or (with --column score) of the image_scorer.py script
 
 The input file is a CSV file (with header) with at least these columns:
 
 	image_file: the name of the image file
 	selected: TRUE or FALSE (or something else?
 
-This script will move images in the input_dir to the output_dir a value
+This script will move images in the input_dir to the output_dir a value. With the value ALL, every image is moved to a folder in the output_dir named for its value (TRUE, FALSE, OTHER and NONE, or each score), reading the csv file and the input_dir only once.
 
-usage: move_images_by_selected.py <input_dir> <output_dir> <value>
+The moves are made together by a BulkMover (see file_mover.py): a rename within a filesystem, or copy threads to another filesystem, with a move log in the input_dir so that an interrupted run can be finished (--resume) or undone (--rollback).
+
+usage: move_images_by_selected.py <input_dir> <output_dir> <input_file> <value> [-c column] [-w workers] [--resume] [--rollback]
 """
 from __future__ import print_function
 from __future__ import division
@@ -19,6 +21,10 @@ from __future__ import absolute_import
 
 # CHANGE LOG:
 # 11-09-2014 TC created, re-used bits of image_viewer.py code
+# 10-18-2026 TC move the files in bulk with a BulkMover, with a move log to resume or roll back an
+#               interrupted run; report throughput; changed argument parsing to use argparse
+# 10-18-2026 TC added the value ALL, to sort every image into a folder per value in one pass, and
+#               --column, to sort by another column such as score
 
 __author__ = "Marc Halushka, Toby Cornish"
 __copyright__ = "Copyright 2014-2017, Johns Hopkins University"
@@ -30,70 +36,114 @@ __email__ = "tcornish@gmail.com"
 
 import os
 import sys
-import csv
-import shutil
+import argparse
+
+from file_mover import BulkMover, moveLogPath
+from result_writer import readResults
 
-def main(indir,outdir,inputFile,value):
+def main(indir,outdir,inputFile,value,workers=8,resume=False,column='selected'):
 
 	imageExtensions = ['.jpg','.JPG',]
-	images = getImageFiles(indir,imageExtensions)
+	mover = BulkMover(moveLogPath(indir),workers)
+	if mover.hasLog():
+		if not resume:
+			print('\nAn earlier run in %s did not finish. Use --resume to finish it, or --rollback to undo it.\n' % indir)
+			sys.exit()
+		print('\nFinishing the moves of an earlier run...')
+		mover.resume()
+		reportMoves(mover)
+		if mover.failed:
+			sys.exit()
 
-	imagesTrue = []
-	imagesFalse = []
-	imagesOther = []
-	imagesAll = []
+	images = set(getImageFiles(indir,imageExtensions))
 
+	# the file and the folder are each read once, and every image is given its bucket
+	rows = {}
 	try:
-		with open(inputFile,'r') as f:
-			reader = csv.DictReader(f)
-			for row in reader:
-				imagesAll.append(row['image_file'])
-				if row['selected'].lower() == 'true':
-					imagesTrue.append(row['image_file'])
-				elif row['selected'].lower() == 'false':
-					imagesFalse.append(row['image_file'])
-				else:
-					imagesOther.append(row['image_file'])
+		rows = readResults(inputFile)
 	except Exception as e:
 		#catch error reading the file
 		print('\nAn error occurred reading the input file %s :\n' % inputFile)
 		print(e)
 
-	print('\nFound %s images in file %s total' % (len(imagesAll),inputFile))
-	print('Found %s images in file %s with value TRUE' % (len(imagesTrue),inputFile))
-	print('Found %s images in file %s with value FALSE' % (len(imagesFalse),inputFile))
-	print('Found %s images in file %s with some other value' % (len(imagesOther),inputFile))
-
-	trueIntersection = set(images).intersection(imagesTrue)
-	falseIntersection = set(images).intersection(imagesFalse)
-	otherIntersection = set(images).intersection(imagesOther)
-	noneIntersection = set(images).difference(imagesAll)
-
-	print('\nFound %s images in directory %s with value TRUE' % (len(trueIntersection),indir))
-	print('Found %s images in directory %s with value FALSE' % (len(falseIntersection),indir))
-	print('Found %s images in directory %s with some other value' % (len(otherIntersection),indir))
-	print('Found %s images in directory %s not in file %s\n' % (len(noneIntersection),indir,inputFile))
-
-	if value == "TRUE":
-		moveFileList(indir,outdir,trueIntersection)
-	elif value == "FALSE":
-		moveFileList(indir,outdir,falseIntersection)
-	elif value == "OTHER":
-		moveFileList(indir,outdir,otherIntersection)
-	elif value == "NONE":
-		moveFileList(indir,outdir,noneIntersection)
+	inFile = {}
+	for row in rows.values():
+		bucket = bucketFor(row,column)
+		inFile[bucket] = inFile.get(bucket,0) + 1
+	buckets = {}
+	for image in images:
+		buckets.setdefault(bucketFor(rows.get(image),column),[]).append(image)
+
+	print('\nFound %s images in file %s total' % (len(rows),inputFile))
+	for bucket in sorted(inFile):
+		print('Found %s images in file %s with %s %s' % (inFile[bucket],inputFile,column,bucket))
+	print('')
+	for bucket in sorted(buckets):
+		if bucket == 'NONE':
+			print('Found %s images in directory %s not in file %s' % (len(buckets[bucket]),indir,inputFile))
+		else:
+			print('Found %s images in directory %s with %s %s' % (len(buckets[bucket]),indir,column,bucket))
+	print('')
+
+	if value == 'ALL':
+		# every bucket to its own folder, in one pass
+		moves = []
+		for bucket,files in buckets.items():
+			bucketDir = os.path.join(outdir,bucket)
+			if not os.path.exists(bucketDir):
+				os.makedirs(bucketDir)
+			moves.extend((os.path.join(indir,file),os.path.join(bucketDir,file)) for file in sorted(files))
+		print('Moving %s images from %s to %s folders in %s ...' % (len(moves),indir,len(buckets),outdir))
+		mover.move(moves)
+		reportMoves(mover)
+	else:
+		moveFileList(mover,indir,outdir,buckets.get(value,[]))
 
 	sys.exit()
 
-def moveFileList(inDir,outDir,fileList):
-	for file in fileList:
-		sourcepath = os.path.join(inDir,file)
-		destpath = os.path.join(outDir,file)
-		print('Moving %s to %s ...' % (sourcepath,destpath))
-		try:
-			shutil.move(sourcepath, destpath)
-		except (OSError, IOError) as e:
-			print('  Error moving %s to %s: %s' % (sourcepath, destpath, e))
+def bucketFor(row,column):
+	'''the bucket of an image: for selected, TRUE, FALSE or OTHER; for any other column (e.g. score),
+	the value itself; NONE if the image is not in the input file'''
+	if row is None:
+		return 'NONE'
+	value = (row.get(column) or '').strip()
+	if column == 'selected':
+		if value.lower() == 'true':
+			return 'TRUE'
+		elif value.lower() == 'false':
+			return 'FALSE'
+		return 'OTHER'
+	if not value:
+		return 'BLANK'
+	# the bucket is also a folder name
+	return ''.join(c if c.isalnum() or c in '.-_' else '_' for c in value).lstrip('.') or 'OTHER'
+
+def moveFileList(mover,inDir,outDir,fileList):
+	print('Moving %s images from %s to %s ...' % (len(fileList),inDir,outDir))
+	mover.move([(os.path.join(inDir,file),os.path.join(outDir,file)) for file in sorted(fileList)])
+	reportMoves(mover)
+
+def reportMoves(mover):
+	counts = mover.counts
+	print('  Moved %s images in %.2f s, %.0f images/sec (%s renamed, %s copied, %s already done; %.1f MB/sec copied)' % (
+		sum(counts.values()),mover.elapsed,mover.rate(),counts['renamed'],counts['copied'],counts['finished'],
+		mover.bytesCopied/1024/1024/max(mover.elapsed,1e-6)))
+	for src,dest in mover.skipped:
+		print('  Not moved, %s already exists' % dest)
+	for src,dest,message in mover.failed:
+		print('  Error moving %s to %s: %s' % (src,dest,message))
+	if mover.failed:
+		print('  The moves that failed are in %s; fix the errors and run again with --resume, or use --rollback to undo the run.' % mover.logPath)
+
+def rollback(indir,workers=8):
+	mover = BulkMover(moveLogPath(indir),workers)
+	if not mover.hasLog():
+		print('\nThere is no unfinished run in %s to roll back.\n' % indir)
+		sys.exit()
+	print('\nPutting back the images moved by the earlier run...')
+	mover.rollback()
+	reportMoves(mover)
+	sys.exit()
 
 def getImageFiles(dir,exts):
 	files = []
@@ -102,19 +152,36 @@ def getImageFiles(dir,exts):
 			files.append(file)
 	return files
 
+def parse_args():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('input_dir', help='Folder of images to move', type=str)
+	parser.add_argument('output_dir', help='Folder to move the images to', type=str)
+	parser.add_argument('input_file', help='CSV file with image_file and selected columns', type=str)
+	parser.add_argument('value', help='TRUE, FALSE, OTHER, NONE or ALL; or a value of --column, or ALL', type=str)
+	parser.add_argument("-c", "--column", help='Column of the input file to sort by (e.g. score), defaults to selected',
+		type=str, default='selected')
+	parser.add_argument("-w", "--workers", help='Number of copy threads when moving to another filesystem, defaults to 8',
+		type=int, default=8)
+	parser.add_argument("--resume", help='Finish the moves of an interrupted run first', action='store_true')
+	parser.add_argument("--rollback", help='Undo the moves of an interrupted run, then exit', action='store_true')
+	return parser.parse_args()
+
 if __name__ == '__main__':
-	if len(sys.argv) != 5:
-		print('\nusage: %s <input dir> <output dir> <input file> <value>' % os.path.basename(sys.argv[0]))
-		print('\n       <value> can be: TRUE, FALSE, OTHER or NONE\n')
-		sys.exit()
+	args = parse_args()
+	inputDir = args.input_dir
+	outputDir = args.output_dir
+	inputFile = args.input_file
+	column = args.column
+	if column == 'selected' or args.value.upper() in ['ALL','NONE']:
+		value = args.value.upper()
 	else:
-		inputDir = sys.argv[1]
-		outputDir = sys.argv[2]
-		inputFile = sys.argv[3]
-		value = sys.argv[4].upper()
-		if value not in ['TRUE','FALSE','OTHER','NONE']:
-			print('\n%s is not a valid value!\n\n<value> can be: TRUE, FALSE, OTHER or NONE' % value)
-			sys.exit()
+		value = bucketFor({column : args.value},column)
+	if column == 'selected' and value not in ['TRUE','FALSE','OTHER','NONE','ALL']:
+		print('\n%s is not a valid value!\n\n<value> can be: TRUE, FALSE, OTHER, NONE or ALL' % value)
+		sys.exit()
+
+	if args.rollback:
+		rollback(inputDir,args.workers)
 
 	if not os.path.isfile(inputFile):
 		print('The input file %s does not exist.' % inputFile)
@@ -130,4 +197,4 @@ if __name__ == '__main__':
 		print('Error creating directory %s' % outputDir)
 		sys.exit()
 
-	main(inputDir,outputDir,inputFile,value)
+	main(inputDir,outputDir,inputFile,value,args.workers,args.resume,column)
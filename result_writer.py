@@ -0,0 +1,171 @@
+"""result_writer.py: the output csv of image_viewer.py and image_scorer.py
+
+A ResultWriter keeps the output csv open for the whole session instead of opening and closing it for every image. Rows are buffered and the csv is flushed to disk (fsync) every flushRows rows or flushSeconds seconds, whichever comes first. So that a crash never loses a result, each row is first appended to a small journal next to the csv (<output file>.journal). The journal is written straight through to the operating system, which keeps it if the script crashes or is killed, but it is only synced with the csv, so a power failure or a crash of the computer can lose the rows since the last flush; with syncEachRow the journal is synced after every row instead, which costs several times as long per row. The first line of the journal is the size of the csv at its last flush; if the journal is still there when the csv is next opened, the csv is cut back to that size and the rows in the journal are written again.
+
+readResults loads the rows already in an output csv, so that a session can pick up where the last one stopped.
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+# 10-18-2026 TC added readResults
+# 10-18-2026 TC the journal is synced with the csv rather than after every row, unless syncEachRow
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import os
+import sys
+import csv
+import json
+import threading
+
+journalSuffix = '.journal'
+
+def openCsv(path):
+	# there are some 2 v. 3 differences here to avoid extra blank lines
+	if (sys.version_info > (3, 0)):
+		return open(path,'a',newline='\n')
+	else:
+		return open(path,'ab')
+
+# fdatasync skips updating the file times, which we do not need; it is not on every platform
+sync = getattr(os,'fdatasync',os.fsync)
+
+def readResults(path,key='image_file'):
+	'''returns {row[key] : row} for the rows of an output csv, in one pass; if a key
+	appears more than once (e.g. an image that was scored again), the last row wins'''
+	results = {}
+	if not os.path.exists(path):
+		return results
+	if (sys.version_info > (3, 0)):
+		f = open(path,'r',newline='')
+	else:
+		f = open(path,'rb')
+	try:
+		for row in csv.DictReader(f):
+			results[row[key]] = row
+	finally:
+		f.close()
+	return results
+
+def syncFile(f):
+	f.flush()
+	sync(f.fileno())
+
+def readJournal(journalPath):
+	'''returns (csv size, rows) from a journal; a line cut short by a crash is ignored'''
+	with open(journalPath,'rb') as f:
+		lines = f.read().split(b'\n')[:-1] # the last piece has no newline: empty, or a torn write
+	if not lines:
+		return None,[]
+	rows = []
+	for line in lines[1:]:
+		try:
+			rows.append(json.loads(line.decode('utf-8')))
+		except ValueError:
+			pass
+	return int(lines[0]),rows
+
+def recoverResults(path,fieldnames):
+	'''replays the journal left by a session that did not close its ResultWriter; returns the number of rows recovered'''
+	journalPath = path + journalSuffix
+	if not os.path.exists(journalPath):
+		return 0
+	size,rows = readJournal(journalPath)
+	if size is not None:
+		# anything after the last flush may be a partial row; the journal has all of it
+		if os.path.exists(path) and os.path.getsize(path) > size:
+			with open(path,'r+b') as f:
+				f.truncate(size)
+		f = openCsv(path)
+		try:
+			writer = csv.DictWriter(f, dialect='excel',fieldnames=fieldnames,extrasaction='ignore')
+			if f.tell() == 0:
+				writer.writeheader()
+			writer.writerows(rows)
+			syncFile(f)
+		finally:
+			f.close()
+		if rows:
+			print('Recovered %s results from %s' % (len(rows),journalPath))
+	os.remove(journalPath)
+	return len(rows)
+
+class ResultWriter(object):
+	'''appends result rows to a csv file that stays open, with a journal so that no row is lost.
+	Call close() at the end of the session.'''
+
+	def __init__(self,path,fieldnames,flushRows=20,flushSeconds=5.0,syncEachRow=False):
+		self.path = path
+		self.fieldnames = fieldnames
+		self.flushRows = flushRows
+		self.flushSeconds = flushSeconds
+		self.syncEachRow = syncEachRow
+		self.journalPath = path + journalSuffix
+		self.lock = threading.Lock()
+		self.timer = None
+		self.pending = 0
+
+		recoverResults(path,fieldnames)
+		self.file = openCsv(path)
+		self.writer = csv.DictWriter(self.file, dialect='excel',fieldnames=fieldnames,extrasaction='ignore')
+		if self.file.tell() == 0:
+			self.writer.writeheader()
+		self.journal = open(self.journalPath,'wb')
+		with self.lock:
+			self._checkpoint()
+
+	def write(self,row):
+		line = json.dumps(dict((x,row.get(x,'')) for x in self.fieldnames)) + '\n'
+		with self.lock:
+			# the journal is written first, so the row survives even if the csv buffer is lost
+			self.journal.write(line.encode('utf-8'))
+			if self.syncEachRow:
+				syncFile(self.journal)
+			else:
+				self.journal.flush()
+			self.writer.writerow(row)
+			self.pending += 1
+			if self.pending >= self.flushRows:
+				self._checkpoint()
+			elif self.timer is None:
+				self.timer = threading.Timer(self.flushSeconds,self.flush)
+				self.timer.daemon = True
+				self.timer.start()
+
+	def flush(self):
+		'''writes any buffered rows to the csv now'''
+		with self.lock:
+			if self.file is not None and self.pending:
+				self._checkpoint()
+
+	def close(self):
+		with self.lock:
+			if self.file is None:
+				return
+			self._checkpoint()
+			self.file.close()
+			self.journal.close()
+			self.file = None
+			os.remove(self.journalPath)
+
+	def _checkpoint(self):
+		'''syncs the csv and starts a new journal from its size; the lock must be held'''
+		if self.timer is not None:
+			self.timer.cancel()
+			self.timer = None
+		syncFile(self.file)
+		size = os.fstat(self.file.fileno()).st_size
+		self.journal.seek(0)
+		self.journal.truncate()
+		self.journal.write(('%d\n' % size).encode('ascii'))
+		syncFile(self.journal)
+		self.pending = 0
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+"""verify_images.py: checks the images downloaded by download_images_from_gene_list.py, and downloads the bad ones again
+
+Every JPEG in the output_dir is checked, in parallel, for:
+
+	the JPEG start of image marker, a readable header and the end of image marker (a truncated download has no end marker)
+	the size and sha1 recorded in the download manifest (see download_manifest.py), if there is one
+	the sha1 in the output file, if it was written with --checksums
+
+Images in the manifest that are missing from the output_dir are reported as well. Bad images are moved to a folder in the output_dir (.hpasubc_bad) and marked failed in the manifest, so the next run of the download script (appending to the same output file) downloads them again. With --refetch, they are downloaded again straight away, using the image url and metadata in the output file.
+
+usage: verify_images.py <output_file> <output_dir> [-w workers] [--refetch]
+"""
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+# CHANGE LOG:
+# 10-18-2026 TC created
+# 10-18-2026 TC uses image_writer.py, so checking images does not set up the download log
+
+__author__ = "Marc Halushka, Toby Cornish"
+__copyright__ = "Copyright 2014-2026"
+__credits__ = ["Marc Halushka", "Toby Cornish"]
+__license__ = "GPL"
+__version__ = "1.3.0"
+__maintainer__ = "Toby C. Cornish"
+__email__ = "tcornish@gmail.com"
+
+import os
+import sys
+import time
+import hashlib
+import argparse
+from multiprocessing.dummy import Pool as ThreadPool
+
+from image_writer import findStartOfScan, hasEndOfImage, replaceFile, maxHeaderSize, tailSize
+from download_manifest import DownloadManifest, manifestPath, DONE
+from result_writer import readResults
+
+badDir = '.hpasubc_bad'
+readSize = 1024*1024
+imageExtensions = ['.jpg','.JPG',]
+
+def main(outfile,outdir,numWorkers=8,refetch=False):
+	rows = readResults(outfile)
+	manifest = None
+	entries = {}
+	if os.path.exists(manifestPath(outfile)):
+		manifest = DownloadManifest(manifestPath(outfile))
+		entries = manifest.load()
+	else:
+		print('There is no download manifest for %s; only the images themselves will be checked.' % outfile)
+
+	names = [x for x in os.listdir(outdir)
+		if os.path.splitext(x)[1] in imageExtensions and os.path.isfile(os.path.join(outdir,x))]
+	print('Checking %s images in %s with %s workers...' % (len(names),outdir,numWorkers))
+	start = time.time()
+	pool = ThreadPool(numWorkers)
+	jobs = [(os.path.join(outdir,x),entries.get(x),rows.get(x)) for x in names]
+	problems = dict((name,problem) for name,problem in pool.imap_unordered(checkImage,jobs,chunksize=16) if problem)
+	elapsed = time.time() - start
+	print('Checked %s images in %.1f s (%.0f images/sec)' % (len(names),elapsed,len(names)/max(elapsed,1e-6)))
+
+	present = set(names)
+	missing = [x for x,entry in entries.items() if entry.state == DONE and x not in present]
+
+	for name in sorted(problems):
+		print('  %s: %s' % (name,problems[name]))
+	for name in sorted(missing):
+		print('  %s: missing' % name)
+	print('%s bad images, %s missing' % (len(problems),len(missing)))
+
+	bad = sorted(problems) + sorted(missing)
+	if problems:
+		moveAside(outdir,sorted(problems))
+		print('The bad images were moved to %s' % os.path.join(outdir,badDir))
+	if manifest:
+		for name in bad:
+			manifest.failed(name)
+
+	if refetch and bad:
+		fetched = refetchImages(outdir,bad,rows,manifest,pool)
+		print('Downloaded %s of %s images again' % (fetched,len(bad)))
+	elif bad:
+		print('Run the download again (appending to %s), or this script with --refetch, to download them again.' % outfile)
+
+	pool.close()
+	if manifest:
+		manifest.close()
+
+def checkImage(job):
+	'''returns (image file name, a description of the problem or None)'''
+	path,entry,row = job
+	name = os.path.basename(path)
+	try:
+		size = os.path.getsize(path)
+		sha1 = hashlib.sha1()
+		with open(path,'rb') as f:
+			first = f.read(readSize)
+			if first[0:2] != b'\xff\xd8':
+				return name,'not a JPEG (no start of image marker)'
+			if findStartOfScan(first[:maxHeaderSize]) is None:
+				return name,'no image data after the header'
+			sha1.update(first)
+			tail = first[-tailSize:]
+			for chunk in iter(lambda: f.read(readSize),b''):
+				sha1.update(chunk)
+				tail = (tail + chunk)[-tailSize:]
+		if not hasEndOfImage(tail):
+			return name,'truncated (no end of image marker)'
+		if entry is not None and entry.state == DONE:
+			if entry.bytes is not None and entry.bytes != size:
+				return name,'%s bytes, the manifest says %s' % (size,entry.bytes)
+			if entry.checksum and entry.checksum != sha1.hexdigest():
+				return name,'sha1 does not match the manifest'
+		if row is not None and row.get('sha1') and row['sha1'] != sha1.hexdigest():
+			return name,'sha1 does not match the output file'
+	except ValueError as e: # from findStartOfScan
+		return name,str(e)
+	except (IOError, OSError) as e:
+		return name,'could not be read: %s' % e
+	return name,None
+
+def moveAside(outdir,names):
+	directory = os.path.join(outdir,badDir)
+	if not os.path.exists(directory):
+		os.makedirs(directory)
+	for name in names:
+		replaceFile(os.path.join(outdir,name),os.path.join(directory,name))
+
+def refetchImages(outdir,names,rows,manifest,pool):
+	'''downloads the images again, using their rows in the output file; returns the number downloaded'''
+	# only imported to download: importing it sets up the download log
+	import download_images_from_gene_list as downloader
+	def fetch(name):
+		row = rows.get(name)
+		if row is None:
+			print('  %s is not in the output file; it can not be downloaded again from here' % name)
+			return False
+		try:
+			if manifest:
+				manifest.downloading(name)
+			imageWriter = downloader.downloadImage(row['image_url'],name,outdir,downloader.buildResult(imageRecord(row)))
+		except Exception as e:
+			print('  %s could not be downloaded: %s' % (name,e))
+			return False
+		if row.get('sha1') and row['sha1'] != imageWriter.checksum():
+			print('  %s was downloaded again, but its sha1 still does not match the output file' % name)
+		if manifest:
+			manifest.done(name,imageWriter.bytes,imageWriter.checksum())
+		return True
+	return sum(pool.map(fetch,names))
+
+def imageRecord(row):
+	'''the api image record of a row of the output file, so the Exif is written as it was the first time'''
+	version = row['hpa_version']
+	return {	'version' : int(version) if version.isdigit() else version,
+				'ensg_id' : row['ensg_id'],
+				'tissue_or_cancer' : row['tissue_or_cancer'],
+				'image_url' : row['image_url'],
+				'antibody_id' : row['antibody'],
+				'image_file' : row['image_file'],
+			}
+
+def parse_args():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('out_file', help='CSV file written by the download', type=str)
+	parser.add_argument('out_dir', help='Directory of the downloaded images', type=str)
+	parser.add_argument("-w", "--workers", help='Number of images to check (or download) at once, defaults to 8',
+						type=int, default=8)
+	parser.add_argument("--refetch", help='Download the bad and missing images again now', action='store_true')
+	return parser.parse_args()
+
+if __name__ == '__main__':
+	args = parse_args()
+	if not os.path.isfile(args.out_file):
+		print('The output file %s does not exist.' % args.out_file)
+		sys.exit()
+	if not os.path.isdir(args.out_dir):
+		print('The output directory %s does not exist.' % args.out_dir)
+		sys.exit()
+	main(args.out_file,args.out_dir,args.workers,args.refetch)